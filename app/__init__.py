@@ -12,17 +12,20 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Engine options from the selected performance profile
+    from app.optimization.engine_profiles import apply_performance_profile, init_engine_profile
+    apply_performance_profile(app)
+    
     # Initialize extensions
     db.init_app(app)
+    init_engine_profile(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'  # Changed from 'auth.login' to 'main.login'
     
-    # User loader for Flask-Login
-    @login_manager.user_loader
-    def load_user(user_id):
-        from app.models.crm import User
-        return User.query.get(int(user_id))
+    # User loader for Flask-Login, served from a process-local user cache
+    from app.services.identity_cache import load_user
+    login_manager.user_loader(load_user)
     
     # Register main blueprint first
     from app.routes import main
@@ -49,4 +52,37 @@ def create_app(config_class=Config):
     security_headers = SecurityHeaders()
     security_headers.init_app(app)
     
+    # Initialize materialized dashboard counters
+    from app.analytics.counters import init_counters
+    init_counters(app)
+    
+    # Initialize time-bucketed rollups
+    from app.analytics.rollups import init_rollups
+    init_rollups(app)
+    
+    # Initialize background import jobs
+    from app.services.import_job_service import init_import_jobs
+    init_import_jobs(app)
+    
+    # Initialize compiled lead scoring rules
+    from app.services.scoring_service import init_scoring
+    init_scoring(app)
+    
+    # Initialize the user cache and request-scoped identity map
+    from app.services.identity_cache import init_identity_cache
+    init_identity_cache(app)
+    
+    # Initialize the two-tier application cache
+    from app.optimization.caching import init_cache
+    init_cache(app)
+    
+    # Initialize the entity cache
+    from app.services.entity_cache import init_entity_cache
+    init_entity_cache(app)
+    
+    # Initialize per-endpoint statement profiling
+    if app.config.get('QUERY_PROFILING_ENABLED', False):
+        from app.optimization.performance_optimizer import init_query_profiling
+        init_query_profiling(app)
+    
     return app 
\ No newline at end of file
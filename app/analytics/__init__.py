@@ -0,0 +1,16 @@
+"""
+Analytics Module for CRM System
+Handles materialized counters backing the CRM dashboards, time-bucketed rollups and vectorized reports
+"""
+
+from .counters import CounterService, init_counters
+from .rollups import RollupService, init_rollups
+from .vectorized import VectorizedReportEngine
+
+__all__ = [
+    'CounterService',
+    'init_counters',
+    'RollupService',
+    'init_rollups',
+    'VectorizedReportEngine'
+]
@@ -0,0 +1,341 @@
+"""
+Materialized Counters for CRM System
+Keeps dashboard totals in the crm_counters table up to date from ORM flush events
+"""
+
+from collections import defaultdict
+from datetime import datetime, date
+from decimal import Decimal
+
+import click
+from sqlalchemy import event, func, inspect, select, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.crm import Lead, Account, Contact, Opportunity, Activity, Quote
+from app.models.crm_analytics import CRMCounter
+
+# Marker row written by a full rebuild; until it exists the counters are not trusted
+INITIALIZED_COUNTER = ('counters.initialized', '')
+
+SESSION_DELTAS_KEY = 'crm_counter_deltas'
+
+class CounterDefinition:
+    """Describes one counter family derived from a model's rows"""
+    
+    def __init__(self, name, model, key=None, by_day=False, where=None, amount=None):
+        self.name = name
+        self.model = model
+        self.key = key  # Attribute whose value becomes the counter key
+        self.by_day = by_day  # Bucket a datetime key by UTC day
+        self.where = where  # (attribute, value) equality a row must satisfy
+        self.amount = amount  # Numeric attribute summed into the counter amount
+    
+    @property
+    def attributes(self):
+        """Model attributes this counter depends on"""
+        attributes = set()
+        if self.key:
+            attributes.add(self.key)
+        if self.where:
+            attributes.add(self.where[0])
+        if self.amount:
+            attributes.add(self.amount)
+        return attributes
+    
+    def contribution(self, values):
+        """Return (name, key, amount) a row with the given values adds, or None"""
+        if self.where and values.get(self.where[0]) != self.where[1]:
+            return None
+        
+        key = ''
+        if self.key:
+            key = normalize_key(values.get(self.key), self.by_day)
+        
+        amount = Decimal('0')
+        if self.amount and values.get(self.amount) is not None:
+            amount = Decimal(str(values[self.amount]))
+        
+        return self.name, key, amount
+    
+    def aggregate_query(self):
+        """Build the GROUP BY query that recomputes this counter from scratch"""
+        amount = func.sum(getattr(self.model, self.amount)) if self.amount else func.sum(0)
+        columns = [func.count().label('count'), amount.label('amount')]
+        
+        key_column = None
+        if self.key:
+            key_column = getattr(self.model, self.key)
+            if self.by_day:
+                key_column = func.date(key_column)
+            columns.insert(0, key_column.label('key'))
+        
+        query = select(*columns).select_from(self.model)
+        if self.where:
+            query = query.where(getattr(self.model, self.where[0]) == self.where[1])
+        if key_column is not None:
+            query = query.group_by(key_column)
+        return query
+
+COUNTER_DEFINITIONS = [
+    CounterDefinition('leads', Lead),
+    CounterDefinition('leads.status', Lead, key='status'),
+    CounterDefinition('leads.created', Lead, key='created_at', by_day=True),
+    CounterDefinition('leads.converted', Lead, key='created_at', by_day=True, where=('status', 'Converted')),
+    CounterDefinition('accounts', Account),
+    CounterDefinition('contacts', Contact),
+    CounterDefinition('opportunities', Opportunity, amount='amount'),
+    CounterDefinition('opportunities.stage', Opportunity, key='stage', amount='amount'),
+    CounterDefinition('activities', Activity),
+    CounterDefinition('activities.status', Activity, key='status'),
+    CounterDefinition('quotes', Quote)
+]
+
+def normalize_key(value, by_day=False):
+    """Convert an attribute value into the string stored in crm_counters.key"""
+    if value is None:
+        return ''
+    if by_day:
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+        return str(value)[:10]
+    return str(value)
+
+def definitions_for(model):
+    """Counter definitions that depend on a model"""
+    return [definition for definition in COUNTER_DEFINITIONS if definition.model is model]
+
+def tracked_attributes(model):
+    """Union of attributes any counter on this model depends on"""
+    attributes = set()
+    for definition in definitions_for(model):
+        attributes |= definition.attributes
+    return attributes
+
+def row_contributions(model, values):
+    """All counter contributions of a single row"""
+    contributions = []
+    for definition in definitions_for(model):
+        contribution = definition.contribution(values)
+        if contribution:
+            contributions.append(contribution)
+    return contributions
+
+def add_row_deltas(deltas, model, values, sign):
+    """Add (sign=1) or remove (sign=-1) a row's contributions to a delta map"""
+    for name, key, amount in row_contributions(model, values):
+        delta = deltas[(name, key)]
+        delta[0] += sign
+        delta[1] += amount * sign
+
+def new_delta_map():
+    """Delta map of (name, key) -> [count, amount]"""
+    return defaultdict(lambda: [0, Decimal('0')])
+
+def apply_counter_deltas(connection, deltas):
+    """Upsert accumulated (name, key) -> [count, amount] deltas in one statement"""
+    rows = [
+        {'name': name, 'key': key, 'count': count, 'amount': amount, 'updated_at': datetime.utcnow()}
+        for (name, key), (count, amount) in deltas.items()
+        if count or amount
+    ]
+    if not rows:
+        return
+    
+    table = CRMCounter.__table__
+    dialect = connection.dialect.name
+    
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.name, table.c.key],
+            set_={
+                'count': table.c.count + stmt.excluded.count,
+                'amount': table.c.amount + stmt.excluded.amount,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+        connection.execute(stmt, rows)
+    else:
+        for row in rows:
+            result = connection.execute(
+                table.update()
+                .where(table.c.name == row['name'], table.c.key == row['key'])
+                .values(count=table.c.count + row['count'],
+                        amount=table.c.amount + row['amount'],
+                        updated_at=row['updated_at'])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+
+def apply_row_deltas(connection, model, rows, sign=1):
+    """Apply counter contributions of rows written with Core statements, which bypass the flush hooks"""
+    deltas = new_delta_map()
+    for values in rows:
+        add_row_deltas(deltas, model, values, sign)
+    apply_counter_deltas(connection, deltas)
+
+def _previous_values(target, attributes):
+    """Attribute values as they were before the pending changes"""
+    state = inspect(target)
+    values = {}
+    for attribute in attributes:
+        history = state.attrs[attribute].history
+        if history.deleted:
+            values[attribute] = history.deleted[0]
+        elif history.added:
+            values[attribute] = None  # History omits a previous value of None
+        else:
+            values[attribute] = state.attrs[attribute].value
+    return values
+
+def _session_deltas(target):
+    """Delta map pending on the session that is flushing target"""
+    session = inspect(target).session
+    deltas = session.info.get(SESSION_DELTAS_KEY)
+    if deltas is None:
+        deltas = session.info[SESSION_DELTAS_KEY] = new_delta_map()
+    return deltas
+
+def _after_insert(mapper, connection, target):
+    model = mapper.class_
+    attributes = tracked_attributes(model)
+    values = {attribute: getattr(target, attribute) for attribute in attributes}
+    add_row_deltas(_session_deltas(target), model, values, 1)
+
+def _after_update(mapper, connection, target):
+    model = mapper.class_
+    attributes = tracked_attributes(model)
+    state = inspect(target)
+    if not any(state.attrs[attribute].history.has_changes() for attribute in attributes):
+        return
+    
+    deltas = _session_deltas(target)
+    add_row_deltas(deltas, model, _previous_values(target, attributes), -1)
+    add_row_deltas(deltas, model, {attribute: getattr(target, attribute) for attribute in attributes}, 1)
+
+def _before_delete(mapper, connection, target):
+    # Load any expired counted attributes while the row still exists
+    for attribute in tracked_attributes(mapper.class_):
+        getattr(target, attribute)
+
+def _after_delete(mapper, connection, target):
+    model = mapper.class_
+    values = {attribute: getattr(target, attribute) for attribute in tracked_attributes(model)}
+    add_row_deltas(_session_deltas(target), model, values, -1)
+
+def _after_flush(session, flush_context):
+    deltas = session.info.pop(SESSION_DELTAS_KEY, None)
+    if deltas:
+        apply_counter_deltas(session.connection(), deltas)
+
+def _discard_deltas(session):
+    session.info.pop(SESSION_DELTAS_KEY, None)
+
+def _track_old_value(target, value, oldvalue, initiator):
+    # No-op listener; registering it with active_history makes SQLAlchemy load
+    # the previous value before a change so _after_update can subtract it
+    pass
+
+def register_counter_hooks():
+    """Attach flush listeners to every counted model (idempotent)"""
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    
+    for model in {definition.model for definition in COUNTER_DEFINITIONS}:
+        event.listen(model, 'after_insert', _after_insert)
+        event.listen(model, 'after_update', _after_update)
+        event.listen(model, 'before_delete', _before_delete)
+        event.listen(model, 'after_delete', _after_delete)
+        for attribute in tracked_attributes(model):
+            event.listen(getattr(model, attribute), 'set', _track_old_value, active_history=True)
+    
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_rollback', _discard_deltas)
+
+class CounterService:
+    """Service for reading and repairing materialized CRM counters"""
+    
+    def get_counters(self, names):
+        """Get {(name, key): (count, amount)} for the given counter names"""
+        rows = self._read_counters(names)
+        return {(name, key): (count, amount) for name, key, count, amount in rows}
+    
+    def get_counter_range(self, names, key_from):
+        """Get {(name, key): (count, amount)} for keys >= key_from of the given counters"""
+        rows = self._read_counters(names, key_from)
+        return {(name, key): (count, amount) for name, key, count, amount in rows}
+    
+    def _read_counters(self, names, key_from=None):
+        """Read counter rows, aggregated from the source tables while the counters were never built
+        
+        Only rebuild_counters (`flask rebuild-counters`) populates the table, so reads never write.
+        """
+        criterion = CRMCounter.name.in_(names)
+        if key_from is not None:
+            criterion = and_(criterion, CRMCounter.key >= key_from)
+        rows = db.session.query(
+            CRMCounter.name, CRMCounter.key, CRMCounter.count, CRMCounter.amount
+        ).filter(or_(
+            criterion,
+            and_(CRMCounter.name == INITIALIZED_COUNTER[0], CRMCounter.key == INITIALIZED_COUNTER[1])
+        )).all()
+        
+        if not any((name, key) == INITIALIZED_COUNTER for name, key, _, _ in rows):
+            return [row for row in self._aggregate_counters(names) if key_from is None or row[1] >= key_from]
+        
+        return [row for row in rows if (row[0], row[1]) != INITIALIZED_COUNTER]
+    
+    def _aggregate_counters(self, names=None):
+        """(name, key, count, amount) of the counters, computed from the source tables"""
+        rows = []
+        for definition in COUNTER_DEFINITIONS:
+            if names is not None and definition.name not in names:
+                continue
+            for row in db.session.execute(definition.aggregate_query()):
+                mapping = row._mapping
+                rows.append((
+                    definition.name,
+                    normalize_key(mapping['key'], definition.by_day) if definition.key else '',
+                    mapping['count'],
+                    Decimal(str(mapping['amount'] or 0))
+                ))
+        return rows
+    
+    def rebuild_counters(self):
+        """Recompute every counter from the source tables, repairing drift"""
+        try:
+            now = datetime.utcnow()
+            rows = [
+                {'name': name, 'key': key, 'count': count, 'amount': amount, 'updated_at': now}
+                for name, key, count, amount in self._aggregate_counters()
+            ]
+            rows.append({'name': INITIALIZED_COUNTER[0], 'key': INITIALIZED_COUNTER[1],
+                         'count': 1, 'amount': Decimal('0'), 'updated_at': now})
+            
+            db.session.execute(CRMCounter.__table__.delete())
+            db.session.execute(CRMCounter.__table__.insert(), rows)
+            db.session.commit()
+            
+            return {'success': True, 'data': {'counters': len(rows) - 1}}
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+
+@click.command('rebuild-counters')
+def rebuild_counters_command():
+    """Recompute materialized CRM counters from the source tables"""
+    result = CounterService().rebuild_counters()
+    if result['success']:
+        click.echo(f"Rebuilt {result['data']['counters']} counters")
+    else:
+        raise click.ClickException(result['error'])
+
+def init_counters(app):
+    """Register counter hooks and the rebuild-counters CLI command"""
+    register_counter_hooks()
+    app.cli.add_command(rebuild_counters_command)
@@ -0,0 +1,475 @@
+"""
+Time-Bucketed Rollups for CRM System
+Keeps daily and monthly aggregates per dimension in crm_rollups, recomputed
+incrementally from a queue of dirty days by the refresh-rollups job
+"""
+
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+import click
+from sqlalchemy import Date, event, func, inspect, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.crm import Lead, Opportunity, Activity
+from app.models.crm_analytics import CRMRollup, CRMRollupQueue
+from app.analytics.counters import normalize_key
+
+# Marker row whose period is the first day not yet served from rollups; later days are read live
+REFRESHED_MARKER = 'rollups.refreshed'
+
+SESSION_DIRTY_KEY = 'crm_rollup_dirty'
+
+# Days per IN (...) list when recomputing queued days
+DAY_BATCH_SIZE = 500
+
+class RollupDefinition:
+    """Describes one rollup metric bucketed by the day of a date attribute"""
+    
+    def __init__(self, metric, model, date_attribute, dimensions, where=None, amount=None):
+        self.metric = metric
+        self.model = model
+        self.date_attribute = date_attribute
+        self.dimensions = dimensions  # Dimension name -> model attribute
+        self.where = where or []  # SQL criteria a row must satisfy
+        self.amount = amount  # Numeric attribute summed into the rollup amount
+    
+    @property
+    def date_column(self):
+        return getattr(self.model, self.date_attribute)
+    
+    def bound(self, value):
+        """Convert a midnight datetime bound to what the date column compares against"""
+        if isinstance(self.date_column.type, Date):
+            return value.date()
+        return value
+    
+    def aggregate_query(self, dimension, criteria):
+        """Build the per-day GROUP BY query for one dimension ('' for totals)"""
+        day = func.date(self.date_column)
+        amount = func.sum(getattr(self.model, self.amount)) if self.amount else func.sum(0)
+        columns = [day.label('day')]
+        group_by = [day]
+        
+        if dimension:
+            key_column = getattr(self.model, self.dimensions[dimension])
+            columns.append(key_column.label('key'))
+            group_by.append(key_column)
+        columns += [func.count().label('count'), amount.label('amount')]
+        
+        return (select(*columns).select_from(self.model)
+                .where(self.date_column.isnot(None), *self.where, *criteria)
+                .group_by(*group_by))
+    
+    def day_criteria(self, days):
+        """Criteria selecting rows dated on the given sorted YYYY-MM-DD days"""
+        low = _midnight(date.fromisoformat(days[0]))
+        high = _midnight(date.fromisoformat(days[-1])) + timedelta(days=1)
+        return [
+            self.date_column >= self.bound(low),
+            self.date_column < self.bound(high),
+            func.date(self.date_column).in_(days)
+        ]
+
+ROLLUP_DEFINITIONS = [
+    RollupDefinition('leads.created', Lead, 'created_at', {
+        'status': 'status', 'source': 'source', 'owner': 'assigned_to'
+    }),
+    RollupDefinition('opportunities.created', Opportunity, 'created_at', {
+        'stage': 'stage', 'type': 'type', 'source': 'source', 'owner': 'assigned_to'
+    }, amount='amount'),
+    RollupDefinition('opportunities.won', Opportunity, 'actual_close_date', {
+        'type': 'type', 'source': 'source', 'owner': 'assigned_to'
+    }, where=[
+        Opportunity.stage == 'Closed Won',
+        Opportunity.amount.isnot(None),
+        Opportunity.amount != 0
+    ], amount='amount'),
+    RollupDefinition('activities.created', Activity, 'created_at', {
+        'type': 'type', 'status': 'status', 'owner': 'assigned_to'
+    })
+]
+
+ROLLUPS_BY_METRIC = {definition.metric: definition for definition in ROLLUP_DEFINITIONS}
+
+def _midnight(value):
+    """Datetime for a date, or a datetime unchanged"""
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
+
+def _ceil_day(value):
+    """First midnight at or after value"""
+    value = _midnight(value)
+    day = datetime(value.year, value.month, value.day)
+    return day if day == value else day + timedelta(days=1)
+
+def _floor_day(value):
+    """Last midnight at or before value"""
+    value = _midnight(value)
+    return datetime(value.year, value.month, value.day)
+
+def _month_start(value, after=False):
+    """First day of value's month, or of the following month unless value already starts one"""
+    start = value.replace(day=1)
+    if after and start != value:
+        start = (start + timedelta(days=32)).replace(day=1)
+    return start
+
+def _queue_days(session, definition, days):
+    dirty = session.info.get(SESSION_DIRTY_KEY)
+    if dirty is None:
+        dirty = session.info[SESSION_DIRTY_KEY] = set()
+    for day in days:
+        if day is not None:
+            dirty.add((definition.metric, normalize_key(day, by_day=True)))
+
+def _rollups_for(model):
+    return [definition for definition in ROLLUP_DEFINITIONS if definition.model is model]
+
+def _previous_date(target, attribute):
+    history = inspect(target).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None  # History omits a previous value of None
+    return getattr(target, attribute)
+
+def _after_insert(mapper, connection, target):
+    for definition in _rollups_for(mapper.class_):
+        _queue_days(inspect(target).session, definition, [getattr(target, definition.date_attribute)])
+
+def _after_update(mapper, connection, target):
+    # Any change can move a row between keys or in/out of the where criteria, so
+    # queue both the day it was counted under and the day it is counted under now
+    for definition in _rollups_for(mapper.class_):
+        _queue_days(inspect(target).session, definition, [
+            _previous_date(target, definition.date_attribute),
+            getattr(target, definition.date_attribute)
+        ])
+
+def _before_delete(mapper, connection, target):
+    # Load expired date attributes while the row still exists
+    for definition in _rollups_for(mapper.class_):
+        getattr(target, definition.date_attribute)
+
+def _after_delete(mapper, connection, target):
+    for definition in _rollups_for(mapper.class_):
+        _queue_days(inspect(target).session, definition, [getattr(target, definition.date_attribute)])
+
+def _after_flush(session, flush_context):
+    dirty = session.info.pop(SESSION_DIRTY_KEY, None)
+    if dirty:
+        queue_rollup_days(session.connection(), dirty)
+
+def _discard_dirty(session):
+    session.info.pop(SESSION_DIRTY_KEY, None)
+
+def _track_old_value(target, value, oldvalue, initiator):
+    # No-op listener; active_history makes the previous date available to _after_update
+    pass
+
+def queue_rollup_days(connection, days):
+    """Queue (metric, YYYY-MM-DD) pairs for the next refresh, ignoring ones already queued"""
+    now = datetime.utcnow()
+    rows = [{'metric': metric, 'period': period, 'queued_at': now} for metric, period in sorted(days)]
+    table = CRMRollupQueue.__table__
+    dialect = connection.dialect.name
+    
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        connection.execute(insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.metric, table.c.period]
+        ), rows)
+    else:
+        for row in rows:
+            exists = connection.execute(
+                select(table.c.id).where(table.c.metric == row['metric'], table.c.period == row['period'])
+            ).first()
+            if exists is None:
+                connection.execute(table.insert().values(**row))
+
+def queue_row_days(connection, model, rows):
+    """Queue the days of rows written with Core statements, which bypass the flush hooks"""
+    days = set()
+    for definition in _rollups_for(model):
+        for values in rows:
+            if values.get(definition.date_attribute) is not None:
+                days.add((definition.metric, normalize_key(values[definition.date_attribute], by_day=True)))
+    if days:
+        queue_rollup_days(connection, days)
+
+def register_rollup_hooks():
+    """Attach listeners queueing the days touched by each flush (idempotent)"""
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    
+    for model in {definition.model for definition in ROLLUP_DEFINITIONS}:
+        event.listen(model, 'after_insert', _after_insert)
+        event.listen(model, 'after_update', _after_update)
+        event.listen(model, 'before_delete', _before_delete)
+        event.listen(model, 'after_delete', _after_delete)
+        for definition in _rollups_for(model):
+            event.listen(definition.date_column, 'set', _track_old_value, active_history=True)
+    
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_rollback', _discard_dirty)
+
+class RollupService:
+    """Service for refreshing and querying time-bucketed CRM rollups"""
+    
+    def get_rollup(self, metric, dimension='', start=None, end=None, grain='month'):
+        """Get {period: {key: (count, amount)}} for rows dated in [start, end)"""
+        definition = ROLLUPS_BY_METRIC[metric]
+        if isinstance(definition.date_column.type, Date):
+            # Date columns have no time of day; include the whole day of each bound
+            start = _ceil_day(start) if start is not None else None
+            end = _ceil_day(end) if end is not None else None
+        
+        series = defaultdict(lambda: defaultdict(lambda: [0, Decimal('0')]))
+        
+        def add(period, key, count, amount):
+            bucket = series[period[:7] if grain == 'month' else period][key]
+            bucket[0] += count
+            bucket[1] += Decimal(str(amount or 0))
+        
+        # Whole days before the refresh cutoff come from rollups, unless queued as changed since;
+        # everything else is read live
+        cutoff = self._cutoff()
+        rolled_from = _ceil_day(start) if start is not None else None
+        rolled_to = None
+        if cutoff is not None:
+            rolled_to = min(_floor_day(end), cutoff) if end is not None else cutoff
+        
+        if rolled_to is None or (rolled_from is not None and rolled_from >= rolled_to):
+            self._read_live(definition, dimension, start, end, add)
+        else:
+            self._read_rolled(definition, dimension, rolled_from, rolled_to, grain, add)
+            self._read_queued(definition, dimension, rolled_from, rolled_to, add)
+            if start is not None and start < rolled_from:
+                self._read_live(definition, dimension, start, rolled_from, add)
+            if end is None or rolled_to < end:
+                self._read_live(definition, dimension, rolled_to, end, add)
+        
+        # Keys left without rows once queued days were read live are dropped
+        series = {
+            period: {key: (count, amount) for key, (count, amount) in keys.items() if count}
+            for period, keys in sorted(series.items())
+        }
+        return {period: keys for period, keys in series.items() if keys}
+    
+    def get_totals(self, metric, dimension='', start=None, end=None):
+        """Get {key: (count, amount)} summed over rows dated in [start, end)"""
+        totals = defaultdict(lambda: [0, Decimal('0')])
+        for keys in self.get_rollup(metric, dimension, start, end).values():
+            for key, (count, amount) in keys.items():
+                totals[key][0] += count
+                totals[key][1] += amount
+        return {key: (count, amount) for key, (count, amount) in totals.items()}
+    
+    def refresh_rollups(self, full=False):
+        """Recompute rollups for the days queued since the last run, or for everything"""
+        try:
+            now = datetime.utcnow()
+            rollups = CRMRollup.__table__
+            queue = CRMRollupQueue.__table__
+            full = full or self._cutoff() is None
+            
+            if full:
+                db.session.execute(queue.delete())
+                db.session.execute(rollups.delete())
+                dirty = {definition.metric: None for definition in ROLLUP_DEFINITIONS}
+            else:
+                dirty = defaultdict(set)
+                last_id = None
+                for queue_id, metric, period in db.session.execute(select(queue.c.id, queue.c.metric, queue.c.period)):
+                    dirty[metric].add(period)
+                    last_id = max(queue_id, last_id or queue_id)
+                # Dequeue before recomputing so days dirtied meanwhile are queued again
+                if last_id is not None:
+                    db.session.execute(queue.delete().where(queue.c.id <= last_id))
+            
+            days = 0
+            for metric, periods in dirty.items():
+                if metric in ROLLUPS_BY_METRIC:
+                    days += self._recompute(ROLLUPS_BY_METRIC[metric], periods, now)
+            
+            db.session.execute(rollups.delete().where(rollups.c.metric == REFRESHED_MARKER))
+            db.session.execute(rollups.insert().values(
+                metric=REFRESHED_MARKER, grain='day', period=now.date().isoformat(),
+                dimension='', key='', count=0, amount=0, updated_at=now
+            ))
+            db.session.commit()
+            
+            return {'success': True, 'data': {'days': days, 'full': full}}
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+    
+    def _recompute(self, definition, periods, now):
+        """Rebuild day rows for the given periods (None for all) and their months; returns day count"""
+        rollups = CRMRollup.__table__
+        metric_rows = rollups.c.metric == definition.metric
+        months = set()
+        days = set()
+        
+        if periods is None:
+            batches = [None]
+        else:
+            periods = sorted(periods)
+            batches = [periods[i:i + DAY_BATCH_SIZE] for i in range(0, len(periods), DAY_BATCH_SIZE)]
+        
+        for batch in batches:
+            day_rows = [metric_rows, rollups.c.grain == 'day']
+            criteria = []
+            if batch is not None:
+                day_rows.append(rollups.c.period.in_(batch))
+                criteria = definition.day_criteria(batch)
+                months.update(period[:7] for period in batch)
+                days.update(batch)
+            db.session.execute(rollups.delete().where(*day_rows))
+            
+            rows = []
+            for dimension in [''] + list(definition.dimensions):
+                for row in db.session.execute(definition.aggregate_query(dimension, criteria)):
+                    mapping = row._mapping
+                    period = normalize_key(mapping['day'], by_day=True)
+                    rows.append({
+                        'metric': definition.metric,
+                        'grain': 'day',
+                        'period': period,
+                        'dimension': dimension,
+                        'key': normalize_key(mapping['key']) if dimension else '',
+                        'count': mapping['count'],
+                        'amount': Decimal(str(mapping['amount'] or 0)),
+                        'updated_at': now
+                    })
+                    if batch is None:
+                        months.add(period[:7])
+                        days.add(period)
+            if rows:
+                db.session.execute(rollups.insert(), rows)
+        
+        # Month rows are summed from the freshly written day rows
+        month = func.substr(rollups.c.period, 1, 7)
+        months = sorted(months)
+        if periods is None:
+            db.session.execute(rollups.delete().where(metric_rows, rollups.c.grain == 'month'))
+        for i in range(0, len(months), DAY_BATCH_SIZE):
+            batch = months[i:i + DAY_BATCH_SIZE]
+            if periods is not None:
+                db.session.execute(rollups.delete().where(
+                    metric_rows, rollups.c.grain == 'month', rollups.c.period.in_(batch)
+                ))
+            db.session.execute(rollups.insert().from_select(
+                ['metric', 'grain', 'period', 'dimension', 'key', 'count', 'amount', 'updated_at'],
+                select(
+                    rollups.c.metric, literal('month'), month, rollups.c.dimension, rollups.c.key,
+                    func.sum(rollups.c.count), func.sum(rollups.c.amount), literal(now)
+                ).where(metric_rows, rollups.c.grain == 'day', month.in_(batch))
+                .group_by(rollups.c.metric, month, rollups.c.dimension, rollups.c.key)
+            ))
+        
+        return len(days)
+    
+    def _read_rolled(self, definition, dimension, rolled_from, rolled_to, grain, add):
+        """Read stored rollups covering whole days in [rolled_from, rolled_to)"""
+        rollups = CRMRollup.__table__
+        
+        def read(row_grain, low, high):
+            query = select(rollups.c.period, rollups.c.key, rollups.c.count, rollups.c.amount).where(
+                rollups.c.metric == definition.metric,
+                rollups.c.grain == row_grain,
+                rollups.c.dimension == dimension
+            )
+            if low is not None:
+                query = query.where(rollups.c.period >= low)
+            if high is not None:
+                query = query.where(rollups.c.period < high)
+            for period, key, count, amount in db.session.execute(query):
+                add(period, key, count, amount)
+        
+        if grain != 'month':
+            read('day', rolled_from and rolled_from.date().isoformat(), rolled_to.date().isoformat())
+            return
+        
+        # Whole months use month rows; the partial months at either edge use day rows
+        first_month = _month_start(rolled_from, after=True) if rolled_from is not None else None
+        last_month = _month_start(rolled_to)
+        if first_month is not None and first_month >= last_month:
+            read('day', rolled_from.date().isoformat(), rolled_to.date().isoformat())
+            return
+        
+        if rolled_from is not None and rolled_from < first_month:
+            read('day', rolled_from.date().isoformat(), first_month.date().isoformat())
+        read('month', first_month and first_month.strftime('%Y-%m'), last_month.strftime('%Y-%m'))
+        if last_month < rolled_to:
+            read('day', last_month.date().isoformat(), rolled_to.date().isoformat())
+    
+    def _read_queued(self, definition, dimension, rolled_from, rolled_to, add):
+        """Read days in [rolled_from, rolled_to) queued since the last refresh live instead of from rollups
+        
+        Their stored day rows, which the month rows were summed from, are subtracted again.
+        """
+        rollups = CRMRollup.__table__
+        queue = CRMRollupQueue.__table__
+        query = select(queue.c.period).where(queue.c.metric == definition.metric,
+                                             queue.c.period < rolled_to.date().isoformat())
+        if rolled_from is not None:
+            query = query.where(queue.c.period >= rolled_from.date().isoformat())
+        periods = sorted(db.session.execute(query).scalars())
+        
+        for i in range(0, len(periods), DAY_BATCH_SIZE):
+            batch = periods[i:i + DAY_BATCH_SIZE]
+            stored = select(rollups.c.period, rollups.c.key, rollups.c.count, rollups.c.amount).where(
+                rollups.c.metric == definition.metric,
+                rollups.c.grain == 'day',
+                rollups.c.dimension == dimension,
+                rollups.c.period.in_(batch)
+            )
+            for period, key, count, amount in db.session.execute(stored):
+                add(period, key, -count, -(amount or 0))
+            self._read_aggregate(definition, dimension, definition.day_criteria(batch), add)
+    
+    def _read_live(self, definition, dimension, start, end, add):
+        """Aggregate source rows dated in [start, end) directly"""
+        criteria = []
+        if start is not None:
+            criteria.append(definition.date_column >= definition.bound(start))
+        if end is not None:
+            criteria.append(definition.date_column < definition.bound(end))
+        
+        self._read_aggregate(definition, dimension, criteria, add)
+    
+    def _read_aggregate(self, definition, dimension, criteria, add):
+        for row in db.session.execute(definition.aggregate_query(dimension, criteria)):
+            mapping = row._mapping
+            add(normalize_key(mapping['day'], by_day=True),
+                normalize_key(mapping['key']) if dimension else '',
+                mapping['count'], mapping['amount'])
+    
+    def _cutoff(self):
+        """Midnight of the day rollups were last refreshed, or None if never"""
+        period = db.session.query(CRMRollup.period).filter(CRMRollup.metric == REFRESHED_MARKER).scalar()
+        if period is None:
+            return None
+        return _midnight(date.fromisoformat(period))
+
+@click.command('refresh-rollups')
+@click.option('--full', is_flag=True, help='Recompute every day instead of only queued ones')
+def refresh_rollups_command(full):
+    """Recompute CRM rollups for days changed since the last run (schedule via cron)"""
+    result = RollupService().refresh_rollups(full=full)
+    if result['success']:
+        mode = 'full' if result['data']['full'] else 'incremental'
+        click.echo(f"Refreshed {result['data']['days']} rollup days ({mode})")
+    else:
+        raise click.ClickException(result['error'])
+
+def init_rollups(app):
+    """Register rollup hooks and the refresh-rollups CLI command"""
+    register_rollup_hooks()
+    app.cli.add_command(refresh_rollups_command)
@@ -3,8 +3,19 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from flask_login import UserMixin
 from app import db
 
-class Lead(db.Model):
+class ColumnsMixin:
+    def to_dict(self):
+        """Column values by name, for JSON responses"""
+        return {column.key: getattr(self, column.key) for column in self.__table__.columns}
+
+class Lead(db.Model, ColumnsMixin):
     __tablename__ = 'leads'
+    __table_args__ = (
+        db.Index('ix_leads_status_created_at', 'status', 'created_at'),
+        db.Index('ix_leads_assigned_to_status', 'assigned_to', 'status'),
+        db.Index('ix_leads_source', 'source'),
+        db.Index('ix_leads_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
@@ -25,8 +36,8 @@ class Lead(db.Model):
     assigned_to = db.Column(db.Integer, db.ForeignKey('users.id'))
     
     # Relationships
-    activities = db.relationship('Activity', backref='lead', lazy='dynamic')
-    opportunities = db.relationship('Opportunity', backref='lead', lazy='dynamic')
+    activities = db.relationship('Activity', backref='lead', lazy='select')
+    opportunities = db.relationship('Opportunity', backref='lead', lazy='select')
     
     def __repr__(self):
         return f'<Lead {self.first_name} {self.last_name}>'
@@ -35,8 +46,15 @@ class Lead(db.Model):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
-class Account(db.Model):
+class Account(db.Model, ColumnsMixin):
     __tablename__ = 'accounts'
+    __table_args__ = (
+        db.Index('ix_accounts_name', 'name'),
+        db.Index('ix_accounts_assigned_to_status', 'assigned_to', 'status'),
+        db.Index('ix_accounts_parent_account_id', 'parent_account_id'),
+        db.Index('ix_accounts_territory_id', 'territory_id'),
+        db.Index('ix_accounts_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -60,16 +78,21 @@ class Account(db.Model):
     assigned_to = db.Column(db.Integer, db.ForeignKey('users.id'))
     
     # Relationships
-    contacts = db.relationship('Contact', backref='account', lazy='dynamic')
-    opportunities = db.relationship('Opportunity', backref='account', lazy='dynamic')
-    activities = db.relationship('Activity', backref='account', lazy='dynamic')
+    contacts = db.relationship('Contact', backref='account', lazy='select')
+    opportunities = db.relationship('Opportunity', backref='account', lazy='select')
+    activities = db.relationship('Activity', backref='account', lazy='select')
     child_accounts = db.relationship('Account', backref=db.backref('parent', remote_side=[id]))
     
     def __repr__(self):
         return f'<Account {self.name}>'
 
-class Contact(db.Model):
+class Contact(db.Model, ColumnsMixin):
     __tablename__ = 'contacts'
+    __table_args__ = (
+        db.Index('ix_contacts_account_id', 'account_id'),
+        db.Index('ix_contacts_assigned_to_status', 'assigned_to', 'status'),
+        db.Index('ix_contacts_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
@@ -89,8 +112,8 @@ class Contact(db.Model):
     assigned_to = db.Column(db.Integer, db.ForeignKey('users.id'))
     
     # Relationships
-    activities = db.relationship('Activity', backref='contact', lazy='dynamic')
-    opportunities = db.relationship('Opportunity', backref='contact', lazy='dynamic')
+    activities = db.relationship('Activity', backref='contact', lazy='select')
+    opportunities = db.relationship('Opportunity', backref='contact', lazy='select')
     
     def __repr__(self):
         return f'<Contact {self.first_name} {self.last_name}>'
@@ -99,8 +122,17 @@ class Contact(db.Model):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
-class Opportunity(db.Model):
+class Opportunity(db.Model, ColumnsMixin):
     __tablename__ = 'opportunities'
+    __table_args__ = (
+        db.Index('ix_opportunities_stage_expected_close_date', 'stage', 'expected_close_date', 'amount'),
+        db.Index('ix_opportunities_stage_actual_close_date', 'stage', 'actual_close_date'),
+        db.Index('ix_opportunities_assigned_to_stage', 'assigned_to', 'stage'),
+        db.Index('ix_opportunities_account_id', 'account_id'),
+        db.Index('ix_opportunities_contact_id', 'contact_id'),
+        db.Index('ix_opportunities_lead_id', 'lead_id'),
+        db.Index('ix_opportunities_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -121,14 +153,22 @@ class Opportunity(db.Model):
     assigned_to = db.Column(db.Integer, db.ForeignKey('users.id'))
     
     # Relationships
-    activities = db.relationship('Activity', backref='opportunity', lazy='dynamic')
-    quotes = db.relationship('Quote', backref='opportunity', lazy='dynamic')
+    activities = db.relationship('Activity', backref='opportunity', lazy='select')
+    quotes = db.relationship('Quote', backref='opportunity', lazy='select')
     
     def __repr__(self):
         return f'<Opportunity {self.name}>'
 
-class Activity(db.Model):
+class Activity(db.Model, ColumnsMixin):
     __tablename__ = 'activities'
+    __table_args__ = (
+        db.Index('ix_activities_lead_id', 'lead_id'),
+        db.Index('ix_activities_account_id', 'account_id'),
+        db.Index('ix_activities_contact_id', 'contact_id'),
+        db.Index('ix_activities_opportunity_id', 'opportunity_id'),
+        db.Index('ix_activities_assigned_to_status', 'assigned_to', 'status'),
+        db.Index('ix_activities_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(200), nullable=False)
@@ -174,7 +214,7 @@ class Quote(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     
     # Relationships
-    quote_items = db.relationship('QuoteItem', backref='quote', lazy='dynamic', cascade='all, delete-orphan')
+    quote_items = db.relationship('QuoteItem', backref='quote', lazy='select', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Quote {self.quote_number}>'
@@ -0,0 +1,51 @@
+from app import db
+from datetime import datetime
+
+class CRMCounter(db.Model):
+    __tablename__ = 'crm_counters'
+    __table_args__ = (
+        db.UniqueConstraint('name', 'key', name='uq_crm_counters_name_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # leads, leads.status, opportunities.stage, etc.
+    key = db.Column(db.String(200), nullable=False, default='')  # Dimension value, '' for table totals
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CRMCounter {self.name}[{self.key}]={self.count}>'
+
+class CRMRollup(db.Model):
+    __tablename__ = 'crm_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'grain', 'period', 'dimension', 'key', name='uq_crm_rollups_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(100), nullable=False)  # opportunities.won, activities.created, etc.
+    grain = db.Column(db.String(10), nullable=False)  # day, month
+    period = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD or YYYY-MM
+    dimension = db.Column(db.String(50), nullable=False, default='')  # stage, type, source, owner, '' for totals
+    key = db.Column(db.String(200), nullable=False, default='')  # Dimension value
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CRMRollup {self.metric}[{self.grain} {self.period} {self.dimension}={self.key}]={self.count}>'
+
+class CRMRollupQueue(db.Model):
+    __tablename__ = 'crm_rollup_queue'
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'period', name='uq_crm_rollup_queue_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(100), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # Day whose rollups must be recomputed
+    queued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CRMRollupQueue {self.metric}[{self.period}]>'
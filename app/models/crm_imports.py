@@ -0,0 +1,38 @@
+from app import db
+from datetime import datetime
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)  # leads, accounts, contacts
+    status = db.Column(db.String(20), nullable=False, default='Queued')  # Queued, Running, Completed, Failed
+    filename = db.Column(db.String(255))
+    source_path = db.Column(db.String(500), nullable=False)  # CSV being imported
+    total_bytes = db.Column(db.BigInteger, default=0)
+    processed_bytes = db.Column(db.BigInteger, default=0)
+    rows_processed = db.Column(db.Integer, default=0)  # Checkpoint: rows committed so far
+    imported_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text)  # Why a Failed job stopped
+    heartbeat_at = db.Column(db.DateTime)  # Refreshed by the worker at every checkpoint
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    errors = db.relationship('ImportJobError', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.entity} {self.status}>'
+
+class ImportJobError(db.Model):
+    __tablename__ = 'import_job_errors'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('import_jobs.id'), nullable=False, index=True)
+    row = db.Column(db.Integer, nullable=False)
+    error = db.Column(db.Text, nullable=False)
+    
+    def __repr__(self):
+        return f'<ImportJobError {self.job_id}:{self.row}>'
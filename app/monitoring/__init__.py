@@ -6,9 +6,11 @@ Handles application monitoring, performance tracking, and alerting
 from .app_monitor import ApplicationMonitor
 from .performance_tracker import PerformanceTracker
 from .alert_system import AlertSystem
+from .pool_monitor import PoolMonitor
 
 __all__ = [
     'ApplicationMonitor',
     'PerformanceTracker',
-    'AlertSystem'
+    'AlertSystem',
+    'PoolMonitor'
 ] 
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+Connection Pool Monitor for CRM System
+Connection pool usage and checkout wait times
+"""
+
+import threading
+import time
+from typing import Any, Dict
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_lock = threading.Lock()
+        self.wait_stats = {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0}
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.wait_lock:
+                self.wait_stats['timeouts'] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.wait_lock:
+                self.wait_stats['count'] += 1
+                self.wait_stats['total'] += waited
+                self.wait_stats['max'] = max(self.wait_stats['max'], waited)
+
+class PoolMonitor:
+    """Connection pool metrics for one engine: current usage, lifetime counts and checkout waits"""
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.counts = {'connects': 0, 'checkouts': 0, 'checkins': 0, 'invalidations': 0}
+        
+        # Pool events registered on the engine carry over to the pools it recreates
+        for name in ('connect', 'checkout', 'checkin', 'invalidate'):
+            event.listen(engine, name, self._counter(name))
+    
+    def _counter(self, name):
+        key = {'connect': 'connects', 'checkout': 'checkouts', 'checkin': 'checkins', 'invalidate': 'invalidations'}[name]
+        
+        def count(*args):
+            with self.lock:
+                self.counts[key] += 1
+        return count
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get pool usage now and since start-up"""
+        pool = self.engine.pool
+        with self.lock:
+            metrics = {
+                'pool_class': type(pool).__name__,
+                'status': pool.status(),
+                **self.counts
+            }
+        
+        if isinstance(pool, QueuePool):
+            overflow = pool.overflow()
+            metrics.update({
+                'pool_size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'timeout': pool.timeout(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                # Connections opened beyond pool_size (the pool's own counter is negative until it fills)
+                'overflow': max(overflow, 0),
+                'open_connections': pool.size() + overflow
+            })
+        
+        wait_stats = getattr(pool, 'wait_stats', None)
+        if wait_stats is not None:
+            with pool.wait_lock:
+                count = wait_stats['count']
+                metrics['wait'] = {
+                    'checkouts': count,
+                    'total_seconds': wait_stats['total'],
+                    'average_seconds': wait_stats['total'] / count if count else 0.0,
+                    'max_seconds': wait_stats['max'],
+                    'timeouts': wait_stats['timeouts']
+                }
+        
+        return metrics
@@ -0,0 +1,818 @@
+"""
+Two-tier cache for CRM System
+A bounded in-process LRU in front of Redis, invalidated through per-table version tags
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache, wraps
+from inspect import signature
+from typing import Callable, Dict, Iterable, Optional
+import redis
+from app import db
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import InstanceState, Session
+from sqlalchemy.sql.dml import UpdateBase
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_EXTENSION_KEY = 'crm_cache'
+DEFAULT_LOCAL_MAX_ENTRIES = 1024
+DEFAULT_LOCAL_TTL = 5
+
+# Redis key holding a tag's version; entries written under tag "leads" at version 42 carry "leads:v42"
+TAG_KEY_PREFIX = 'cache:tag:'
+
+# Seconds before a failed Redis connection is tried again, and socket timeout of each Redis call
+RECONNECT_INTERVAL = 30
+REDIS_SOCKET_TIMEOUT = 0.5
+
+# Lock held while one caller recomputes an entry: seconds before an abandoned lock expires,
+# seconds other callers wait for the result on a miss before computing it themselves, and their poll interval
+LOCK_KEY_PREFIX = 'cache:lock:'
+REFRESH_LOCK_SECONDS = 60
+LOCK_WAIT_SECONDS = 10
+LOCK_POLL_INTERVAL = 0.05
+
+# Deletes a lock only while it still holds the caller's token, in one atomic step
+UNLOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Keys deleted per command by clear_pattern
+CLEAR_BATCH_SIZE = 500
+
+# Tables written by a connection's current transaction, and by its committed ones not yet invalidated
+CONNECTION_PENDING_KEY = 'crm_cache_pending_tables'
+CONNECTION_COMMITTED_KEY = 'crm_cache_committed_tables'
+# Set while a session flushes through a connection, whose writes the ORM tracks row by row
+CONNECTION_FLUSHING_KEY = 'crm_cache_flushing'
+
+# Prefix of the tag retired only by writes other than ORM flushes (bulk UPDATE/DELETE, Core inserts)
+BULK_TAG_PREFIX = 'bulk:'
+
+# First byte of a payload names its encoding, so workers with and without msgpack share entries
+MSGPACK_FORMAT = b'm'
+JSON_FORMAT = b'j'
+
+# msgpack extension codes for values it has no native type for
+EXT_DECIMAL = 1
+EXT_DATETIME = 2
+EXT_DATE = 3
+
+_MISSING = object()
+
+def _plain(value):
+    """ORM instances and result rows as dicts of their columns, sets and tuples as lists"""
+    if isinstance(value, Row):
+        return value._asdict()
+    state = inspect(value, raiseerr=False)
+    if isinstance(state, InstanceState):
+        return {attribute.key: getattr(value, attribute.key) for attribute in state.mapper.column_attrs}
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f'Cannot cache a value of type {type(value).__name__}')
+
+def _msgpack_default(value):
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode('ascii'))
+    if isinstance(value, datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode('ascii'))
+    if isinstance(value, date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode('ascii'))
+    return _plain(value)
+
+def _msgpack_ext_hook(code, data):
+    if code == EXT_DECIMAL:
+        return Decimal(data.decode('ascii'))
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode('ascii'))
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode('ascii'))
+    return msgpack.ExtType(code, data)
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return {'__cache_type__': 'decimal', 'value': str(value)}
+    if isinstance(value, datetime):
+        return {'__cache_type__': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, date):
+        return {'__cache_type__': 'date', 'value': value.isoformat()}
+    return _plain(value)
+
+def _json_object_hook(value):
+    kind = value.get('__cache_type__')
+    if kind == 'decimal':
+        return Decimal(value['value'])
+    if kind == 'datetime':
+        return datetime.fromisoformat(value['value'])
+    if kind == 'date':
+        return date.fromisoformat(value['value'])
+    return value
+
+def serialize(value) -> bytes:
+    """Encode a value for either cache tier: msgpack when installed, JSON otherwise
+    
+    Decimal, datetime and date values round-trip; ORM instances and result rows are stored as
+    dicts of their column values. Only msgpack keeps non-string dict keys (such as None) as they are.
+    """
+    if msgpack is not None:
+        return MSGPACK_FORMAT + msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    return JSON_FORMAT + json.dumps(value, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+def deserialize(payload: bytes):
+    """Decode a value written by serialize"""
+    encoding, body = payload[:1], payload[1:]
+    if encoding == MSGPACK_FORMAT and msgpack is not None:
+        return msgpack.unpackb(body, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+    if encoding == JSON_FORMAT:
+        return json.loads(body, object_hook=_json_object_hook)
+    raise ValueError('Cache payload in an unreadable encoding')
+
+def _key_default(value):
+    if isinstance(value, Decimal):
+        return ['decimal', str(value)]
+    if isinstance(value, (datetime, date)):
+        return [type(value).__name__, value.isoformat()]
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    state = inspect(value, raiseerr=False)
+    if isinstance(state, InstanceState) and state.identity is not None:
+        return [state.mapper.class_.__name__, list(state.identity)]
+    raise TypeError(f'No stable cache key for a value of type {type(value).__name__}')
+
+@lru_cache(maxsize=None)
+def _signature(func):
+    return signature(func)
+
+def cache_key(prefix: str, func, args=(), kwargs=None) -> str:
+    """Key of one call: prefix:module.qualname:blake2b digest of its arguments
+    
+    The digest is the same in every process and after restarts, unlike hash(), which Python salts
+    per process. Arguments are bound to the signature first, so f(3) and f(months=3) share a key,
+    and self/cls are left out. Raises TypeError for arguments with no stable encoding.
+    """
+    bound = _signature(func).bind(*args, **(kwargs or {}))
+    bound.apply_defaults()
+    arguments = {name: value for name, value in bound.arguments.items() if name not in ('self', 'cls')}
+    encoded = json.dumps(arguments, default=_key_default, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+    return ':'.join(part for part in (prefix, f'{func.__module__}.{func.__qualname__}', digest) if part)
+
+class LocalCache:
+    """Bounded in-process LRU of serialized values with a per-entry expiry"""
+    
+    def __init__(self, max_entries: int = DEFAULT_LOCAL_MAX_ENTRIES, ttl: float = DEFAULT_LOCAL_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached payload, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+    
+    def set(self, key: str, payload: bytes, ttl: float = None):
+        """Store a payload for at most the tier's ttl, evicting the least recently used entries"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self.lock:
+            self.entries[key] = (payload, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def add(self, key: str, payload: bytes, ttl: float = None):
+        """Store a payload only if the key has no live entry"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return False
+        self.set(key, payload, ttl)
+        return True
+    
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def clear(self, pattern: str = None) -> int:
+        """Drop entries whose keys match a glob pattern, or all of them"""
+        with self.lock:
+            if pattern is None:
+                count = len(self.entries)
+                self.entries.clear()
+                return count
+            keys = [key for key in self.entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+    
+    def __len__(self):
+        return len(self.entries)
+
+class LocalRedis:
+    """In-process stand-in for the Redis commands CacheManager uses, for tests and single-process runs
+    
+    shared marks an instance handed to several managers, which then see one another's writes as
+    they would through a Redis server; otherwise it is private to its manager.
+    """
+    
+    def __init__(self, shared: bool = False):
+        self.shared = shared
+        self.values = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+    
+    def _live(self, name):
+        entry = self.values.get(name)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.values[name]
+            return None
+        return entry
+    
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf-8')
+    
+    def ping(self):
+        return True
+    
+    def get(self, name):
+        with self.lock:
+            self.commands += 1
+            entry = self._live(name)
+            return entry[0] if entry is not None else None
+    
+    def mget(self, names):
+        with self.lock:
+            self.commands += 1
+            return [entry[0] if entry is not None else None for entry in map(self._live, names)]
+    
+    def set(self, name, value, ex=None, px=None, nx=False):
+        with self.lock:
+            self.commands += 1
+            if nx and self._live(name) is not None:
+                return None
+            ttl = ex if ex is not None else (px / 1000.0 if px is not None else None)
+            self.values[name] = (self._encode(value), time.monotonic() + ttl if ttl is not None else None)
+            return True
+    
+    def setex(self, name, time_seconds, value):
+        return self.set(name, value, ex=time_seconds)
+    
+    def delete(self, *names):
+        with self.lock:
+            self.commands += 1
+            return sum(1 for name in names if self.values.pop(name, None) is not None)
+    
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.commands += 1
+            entry = self._live(name)
+            value = int(entry[0]) + amount if entry is not None else amount
+            self.values[name] = (self._encode(value), entry[1] if entry is not None else None)
+            return value
+    
+    def scan_iter(self, match=None, count=None):
+        with self.lock:
+            self.commands += 1
+            names = [name for name in list(self.values) if self._live(name) is not None]
+        return iter([name for name in names if match is None or fnmatch.fnmatchcase(name, match)])
+    
+    def info(self):
+        with self.lock:
+            return {'total_commands_processed': self.commands, 'db0': {'keys': len(self.values)}}
+    
+    def eval(self, script, numkeys, *keys_and_args):
+        """Run UNLOCK_SCRIPT, the one script CacheManager sends"""
+        if script != UNLOCK_SCRIPT:
+            raise NotImplementedError('LocalRedis only runs UNLOCK_SCRIPT')
+        name, token = keys_and_args
+        with self.lock:
+            self.commands += 1
+            entry = self._live(name)
+            if entry is None or entry[0] != self._encode(token):
+                return 0
+            del self.values[name]
+            return 1
+
+class CacheManager:
+    """Manage application caching: a bounded in-process LRU tier in front of Redis
+    
+    Entries may carry tags (table names). invalidate_tags increments each tag's version key, so
+    entries written under an older version are no longer addressed and age out, with no key scan.
+    Each process reuses the tag versions it read for up to local_ttl seconds, which bounds how
+    long it may serve an entry that another process invalidated. Without Redis (redis_url None, or
+    while it is unreachable) the in-process tier works alone.
+    """
+    
+    def __init__(self, redis_url: Optional[str] = "redis://localhost:6379/0",
+                 local_max_entries: int = DEFAULT_LOCAL_MAX_ENTRIES, local_ttl: float = DEFAULT_LOCAL_TTL,
+                 redis_client=None):
+        self.redis_url = redis_url
+        self.redis_client = redis_client
+        self.retry_at = 0.0
+        self.local_ttl = local_ttl
+        self.local = LocalCache(local_max_entries, local_ttl)
+        self.versions = {}
+        # Tags whose current version this process counted itself, while Redis was unreachable
+        self.local_versions = set()
+        self.lock = threading.Lock()
+        self.stats = {
+            'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'invalidations': 0,
+            'early_refreshes': 0, 'stale_refreshes': 0, 'lock_waits': 0
+        }
+        # Refresh locks held by this process, and background refreshes running, by storage key
+        self.local_locks = set()
+        self.refreshing = {}
+        # Connection info keys of this manager, apart from other managers attached to the same engine
+        self.pending_key = (CONNECTION_PENDING_KEY, id(self))
+        self.committed_key = (CONNECTION_COMMITTED_KEY, id(self))
+    
+    def connect(self):
+        """Redis client, connecting first if needed; None without Redis or until a failed connection is retried"""
+        if self.redis_client is not None or not self.redis_url or time.monotonic() < self.retry_at:
+            return self.redis_client
+        
+        try:
+            if self.redis_url.startswith('memory://'):
+                client = LocalRedis()
+            else:
+                client = redis.from_url(
+                    self.redis_url,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+                )
+            client.ping()
+            self.redis_client = client
+            logger.info("Redis connection established")
+        except Exception as e:
+            logger.error(f"Redis connection failed: {e}")
+            self._disconnect()
+        return self.redis_client
+    
+    def _disconnect(self):
+        self.redis_client = None
+        self.retry_at = time.monotonic() + RECONNECT_INTERVAL
+    
+    def _redis_failed(self, action: str, error: Exception):
+        logger.error(f"Cache {action} failed: {error}")
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            self._disconnect()
+    
+    def _count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+    
+    def tag_versions(self, tags: Iterable[str], local: bool = True) -> Dict[str, int]:
+        """Current version of each tag, read from Redis at most every local_ttl seconds (every time with local=False)"""
+        now = time.monotonic()
+        versions, stale = {}, []
+        with self.lock:
+            for tag in set(tags):
+                known = self.versions.get(tag)
+                if local and known is not None and now - known[1] < self.local_ttl:
+                    versions[tag] = known[0]
+                else:
+                    stale.append(tag)
+        
+        if stale:
+            values = None
+            client = self.connect()
+            if client is not None:
+                try:
+                    values = client.mget([TAG_KEY_PREFIX + tag for tag in stale])
+                except Exception as e:
+                    self._redis_failed('tag version read', e)
+            with self.lock:
+                for index, tag in enumerate(stale):
+                    if values is not None:
+                        version = int(values[index] or 0)
+                        self.local_versions.discard(tag)
+                    else:
+                        # Keep this process's own count while there is no shared one
+                        version = self.versions.get(tag, (0, 0))[0]
+                        self.local_versions.add(tag)
+                    self.versions[tag] = (version, now)
+                    versions[tag] = version
+        return versions
+    
+    def shares_versions(self, tags: Iterable[str]) -> bool:
+        """Whether every process reads these tags' versions from one Redis, so that commits anywhere move them
+        
+        Without Redis (or with an unshared LocalRedis) each process counts only its own commits.
+        """
+        client = self.connect()
+        with self.lock:
+            return (client is not None and getattr(client, 'shared', True)
+                    and not self.local_versions.intersection(tags))
+    
+    def versioned_key(self, key: str, tags: Optional[Iterable[str]] = None, local: bool = True) -> str:
+        """Storage key of an entry under its tags' current versions, e.g. dashboard|leads:v42"""
+        if not tags:
+            return key
+        versions = self.tag_versions(tags, local)
+        return key + ''.join(f'|{tag}:v{versions[tag]}' for tag in sorted(versions))
+    
+    def get(self, key: str, default=None, tags: Optional[Iterable[str]] = None, local: bool = True):
+        """Get value from cache, trying this process's tier before Redis
+        
+        local=False reads the entry and its tags' versions from Redis alone, so that what other
+        processes wrote or invalidated is seen at once.
+        """
+        value = self._read(self.versioned_key(key, tags, local), key, local)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        return value
+    
+    def _read(self, storage_key: str, key: str, local: bool = True):
+        payload = self.local.get(storage_key) if local else None
+        if payload is not None:
+            value = self._decode(key, payload)
+            if value is not _MISSING:
+                self._count('local_hits')
+                return value
+        
+        client = self.connect()
+        if client is not None:
+            try:
+                payload = client.get(storage_key)
+            except Exception as e:
+                self._redis_failed(f'get for key {key}', e)
+                payload = None
+            if payload is not None:
+                value = self._decode(key, payload)
+                if value is not _MISSING:
+                    if local:
+                        self.local.set(storage_key, payload)
+                    self._count('redis_hits')
+                    return value
+        return _MISSING
+    
+    def _decode(self, key: str, payload: bytes):
+        try:
+            return deserialize(payload)
+        except Exception as e:
+            logger.error(f"Cache decode failed for key {key}: {e}")
+            return _MISSING
+    
+    def set(self, key: str, value, expire: int = 3600, tags: Optional[Iterable[str]] = None, local: bool = True):
+        """Set value in both tiers (only Redis with local=False); the in-process copy lives at most local_ttl seconds"""
+        return self._write(self.versioned_key(key, tags, local), key, value, expire, local)
+    
+    def _write(self, storage_key: str, key: str, value, expire: int, local: bool = True):
+        try:
+            payload = serialize(value)
+        except Exception as e:
+            logger.error(f"Cache set failed for key {key}: {e}")
+            return False
+        
+        if local:
+            self.local.set(storage_key, payload, expire)
+        client = self.connect()
+        if client is not None:
+            try:
+                client.setex(storage_key, expire, payload)
+            except Exception as e:
+                self._redis_failed(f'set for key {key}', e)
+                return False
+        return True
+    
+    def add(self, key: str, value, expire: int = 3600, tags: Optional[Iterable[str]] = None, local: bool = True):
+        """Set value only if the key has none, so a reader's copy never replaces a writer's newer one (only in Redis with local=False)"""
+        try:
+            payload = serialize(value)
+        except Exception as e:
+            logger.error(f"Cache add failed for key {key}: {e}")
+            return False
+        
+        storage_key = self.versioned_key(key, tags, local)
+        client = self.connect()
+        if client is not None:
+            try:
+                if not client.set(storage_key, payload, ex=expire, nx=True):
+                    return False
+            except Exception as e:
+                self._redis_failed(f'add for key {key}', e)
+                return False
+        if not local:
+            return client is not None
+        return self.local.add(storage_key, payload, expire)
+    
+    def get_or_compute(self, key: str, compute: Callable, expire: int = 3600, tags: Optional[Iterable[str]] = None,
+                       stale_ttl: int = 0, beta: float = 1.0, cache_if: Optional[Callable] = None):
+        """Cached result of compute(), recomputed by one caller at a time across all processes
+        
+        A hit may be refreshed early, with a probability rising as expiry nears and scaled by how
+        long compute() took (beta > 1 refreshes earlier), so one caller usually replaces an entry
+        before it expires for everyone. For stale_ttl seconds after expiry the old result is still
+        served. Either way one background thread recomputes it while the others keep the current
+        value. On a miss, the caller holding the key's lock computes and the rest wait for its result.
+        """
+        storage_key = self.versioned_key(key, tags)
+        lock_key = LOCK_KEY_PREFIX + storage_key
+        
+        entry = self._read(storage_key, key)
+        if self._is_envelope(entry):
+            value, expires_at, delta = entry
+            now = time.time()
+            if now - delta * beta * math.log(1.0 - random.random()) < expires_at:
+                return value
+            
+            token = self._try_lock(lock_key)
+            if token is not None:
+                self._count('early_refreshes' if now < expires_at else 'stale_refreshes')
+                self._refresh_in_background(storage_key, lock_key, token, key, compute, expire, stale_ttl, cache_if)
+            return value
+        
+        self._count('misses')
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        token = self._try_lock(lock_key)
+        if token is None:
+            self._count('lock_waits')
+        while token is None and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = self._read(storage_key, key)
+            if self._is_envelope(entry):
+                return entry[0]
+            token = self._try_lock(lock_key)
+        
+        try:
+            # The previous holder may have stored the value between this caller's read and its lock
+            entry = self._read(storage_key, key) if token is not None else _MISSING
+            if self._is_envelope(entry):
+                return entry[0]
+            return self._compute(storage_key, key, compute, expire, stale_ttl, cache_if)
+        finally:
+            if token is not None:
+                self._unlock(lock_key, token)
+    
+    @staticmethod
+    def _is_envelope(entry) -> bool:
+        # [value, expires_at, compute seconds] as written by get_or_compute
+        return isinstance(entry, list) and len(entry) == 3
+    
+    def _compute(self, storage_key: str, key: str, compute: Callable, expire: int, stale_ttl: int,
+                 cache_if: Optional[Callable]):
+        start = time.perf_counter()
+        value = compute()
+        delta = time.perf_counter() - start
+        if cache_if is None or cache_if(value):
+            self._write(storage_key, key, [value, time.time() + expire, delta], expire + stale_ttl)
+        return value
+    
+    def _refresh_in_background(self, storage_key: str, lock_key: str, token: str, key: str, compute: Callable,
+                               expire: int, stale_ttl: int, cache_if: Optional[Callable]):
+        app = current_app._get_current_object() if has_app_context() else None
+        
+        def refresh():
+            try:
+                if app is not None:
+                    with app.app_context():
+                        self._compute(storage_key, key, compute, expire, stale_ttl, cache_if)
+                else:
+                    self._compute(storage_key, key, compute, expire, stale_ttl, cache_if)
+            except Exception as e:
+                logger.error(f"Cache refresh failed for key {key}: {e}")
+            finally:
+                self._unlock(lock_key, token)
+                with self.lock:
+                    self.refreshing.pop(storage_key, None)
+        
+        thread = threading.Thread(target=refresh, name=f'cache-refresh-{key}', daemon=True)
+        with self.lock:
+            self.refreshing[storage_key] = thread
+        thread.start()
+    
+    def _try_lock(self, lock_key: str) -> Optional[str]:
+        """Token of the key's refresh lock if this caller took it, held in this process and in Redis"""
+        with self.lock:
+            if lock_key in self.local_locks:
+                return None
+            self.local_locks.add(lock_key)
+        
+        token = uuid.uuid4().hex
+        client = self.connect()
+        if client is not None:
+            try:
+                if not client.set(lock_key, token, nx=True, px=REFRESH_LOCK_SECONDS * 1000):
+                    with self.lock:
+                        self.local_locks.discard(lock_key)
+                    return None
+            except Exception as e:
+                # Without Redis the process-local lock still keeps this process's callers to one
+                self._redis_failed(f'lock for key {lock_key}', e)
+        return token
+    
+    def _unlock(self, lock_key: str, token: str):
+        client = self.connect()
+        if client is not None:
+            try:
+                # Only the holder deletes the lock; one that expired and was retaken belongs to someone else
+                client.eval(UNLOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                self._redis_failed(f'unlock for key {lock_key}', e)
+        with self.lock:
+            self.local_locks.discard(lock_key)
+    
+    def delete(self, key: str, tags: Optional[Iterable[str]] = None):
+        """Delete value from cache"""
+        storage_key = self.versioned_key(key, tags)
+        self.local.delete(storage_key)
+        client = self.connect()
+        if client is not None:
+            try:
+                client.delete(storage_key)
+            except Exception as e:
+                self._redis_failed(f'delete for key {key}', e)
+                return False
+        return True
+    
+    def invalidate_tags(self, *tags: str):
+        """Move tags to a new version, retiring every entry written under the current one"""
+        client = self.connect()
+        now = time.monotonic()
+        for tag in tags:
+            version = None
+            if client is not None:
+                try:
+                    version = int(client.incr(TAG_KEY_PREFIX + tag))
+                except Exception as e:
+                    self._redis_failed(f'invalidation of tag {tag}', e)
+            with self.lock:
+                if version is None:
+                    version = self.versions.get(tag, (0, 0))[0] + 1
+                    self.local_versions.add(tag)
+                else:
+                    self.local_versions.discard(tag)
+                self.versions[tag] = (version, now)
+                self.stats['invalidations'] += 1
+    
+    def clear_pattern(self, pattern: str):
+        """Clear cache entries matching pattern, scanning Redis incrementally instead of with KEYS"""
+        cleared = self.local.clear(pattern)
+        client = self.connect()
+        if client is not None:
+            try:
+                batch = []
+                for key in client.scan_iter(match=pattern, count=CLEAR_BATCH_SIZE):
+                    batch.append(key)
+                    if len(batch) >= CLEAR_BATCH_SIZE:
+                        cleared += client.delete(*batch)
+                        batch = []
+                if batch:
+                    cleared += client.delete(*batch)
+            except Exception as e:
+                self._redis_failed('clear pattern', e)
+                return False
+        logger.info(f"Cleared {cleared} cache entries matching pattern: {pattern}")
+        return True
+    
+    def get_cache_stats(self) -> Dict:
+        """Get cache statistics"""
+        with self.lock:
+            stats = dict(self.stats, local_entries=len(self.local), redis_connected=self.redis_client is not None)
+        
+        client = self.connect()
+        if client is not None:
+            try:
+                info = client.info()
+                stats.update({
+                    'total_connections_received': info.get('total_connections_received', 0),
+                    'total_commands_processed': info.get('total_commands_processed', 0),
+                    'keyspace_hits': info.get('keyspace_hits', 0),
+                    'keyspace_misses': info.get('keyspace_misses', 0),
+                    'used_memory_human': info.get('used_memory_human', '0B'),
+                    'connected_clients': info.get('connected_clients', 0),
+                    'uptime_in_seconds': info.get('uptime_in_seconds', 0)
+                })
+            except Exception as e:
+                self._redis_failed('stats', e)
+        return stats
+    
+    def attach(self, engine):
+        """Invalidate the tags of tables written through the engine once their transaction commits"""
+        event.listen(engine, 'after_execute', self._after_execute)
+        event.listen(engine, 'commit', self._commit)
+        event.listen(engine, 'rollback', self._rollback)
+        event.listen(engine, 'checkin', self._checkin)
+    
+    def detach(self, engine):
+        """Stop invalidating from the engine's writes"""
+        event.remove(engine, 'after_execute', self._after_execute)
+        event.remove(engine, 'commit', self._commit)
+        event.remove(engine, 'rollback', self._rollback)
+        event.remove(engine, 'checkin', self._checkin)
+    
+    def _after_execute(self, conn, clauseelement, multiparams, params, execution_options, result):
+        if isinstance(clauseelement, UpdateBase):
+            tables = conn.info.setdefault(self.pending_key, set())
+            tables.add(clauseelement.table.name)
+            if not conn.info.get(CONNECTION_FLUSHING_KEY):
+                tables.add(bulk_tag(clauseelement.table.name))
+    
+    def _commit(self, conn):
+        # Fired before the database commits; the tags move once the connection returns to the pool,
+        # so no other process can cache pre-commit rows under the new versions
+        pending = conn.info.pop(self.pending_key, None)
+        if pending:
+            conn.info.setdefault(self.committed_key, set()).update(pending)
+    
+    def _rollback(self, conn):
+        conn.info.pop(self.pending_key, None)
+        conn.info.pop(CONNECTION_FLUSHING_KEY, None)
+    
+    def _checkin(self, dbapi_connection, connection_record):
+        connection_record.info.pop(self.pending_key, None)
+        connection_record.info.pop(CONNECTION_FLUSHING_KEY, None)
+        committed = connection_record.info.pop(self.committed_key, None)
+        if committed:
+            self.invalidate_tags(*sorted(committed))
+
+def bulk_tag(table_name: str) -> str:
+    """Tag of a table's rows as retired by writes that are not ORM flushes"""
+    return BULK_TAG_PREFIX + table_name
+
+def _before_flush(session, flush_context, instances):
+    session.connection().info[CONNECTION_FLUSHING_KEY] = True
+
+def _after_flush(session, flush_context):
+    session.connection().info.pop(CONNECTION_FLUSHING_KEY, None)
+
+def register_flush_hooks():
+    """Mark connections while sessions flush through them (idempotent)"""
+    if event.contains(Session, 'before_flush', _before_flush):
+        return
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'after_flush', _after_flush)
+
+def init_cache(app):
+    """Create the app's cache from CACHE_* settings and invalidate it from the app's database writes"""
+    cache = CacheManager(
+        app.config.get('CACHE_REDIS_URL'),
+        app.config.get('CACHE_LOCAL_MAX_ENTRIES', DEFAULT_LOCAL_MAX_ENTRIES),
+        app.config.get('CACHE_LOCAL_TTL', DEFAULT_LOCAL_TTL)
+    )
+    register_flush_hooks()
+    with app.app_context():
+        cache.attach(db.engine)
+    app.extensions[CACHE_EXTENSION_KEY] = app.cache_manager = cache
+
+def cache_decorator(expire: int = 3600, key_prefix: str = "", tags: Optional[Iterable[str]] = None,
+                    cache_if: Optional[Callable] = None, stale_ttl: int = 0):
+    """Decorator to cache function results in the app's cache, computing each one in one caller at a time
+    
+    tags name the tables the result is computed from, so committed writes to them retire it;
+    cache_if, when given, decides from a result whether it may be cached; for stale_ttl seconds
+    after expiry the previous result is served while it is recomputed in the background.
+    """
+    tags = tuple(tags) if tags else None
+    
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = getattr(current_app, 'cache_manager', None) if has_app_context() else None
+            if cache is None:
+                return func(*args, **kwargs)
+            
+            try:
+                key = cache_key(key_prefix, func, args, kwargs)
+            except TypeError:
+                # Arguments without a stable encoding (or not matching the signature) bypass the cache
+                return func(*args, **kwargs)
+            
+            return cache.get_or_compute(
+                key, lambda: func(*args, **kwargs), expire, tags, stale_ttl=stale_ttl, cache_if=cache_if
+            )
+        return wrapper
+    return decorator
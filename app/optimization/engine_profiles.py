@@ -0,0 +1,57 @@
+from app import db
+from app.monitoring.pool_monitor import PoolMonitor, TimedQueuePool
+from config import performance_profile
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+POOL_MONITOR_EXTENSION_KEY = 'crm_pool_monitor'
+
+# Pool sizing options only QueuePool accepts
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+def apply_performance_profile(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS from the selected performance profile, before the engine is created
+    
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS win over the profile's.
+    """
+    name, profile = performance_profile(app.config)
+    options = dict(profile.get('engine_options', {}))
+    
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite uses a single shared connection, not a sized pool
+        for option in QUEUE_POOL_OPTIONS:
+            options.pop(option, None)
+    else:
+        options.setdefault('poolclass', TimedQueuePool)
+    
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['PERFORMANCE_PROFILE'] = name
+
+def set_sqlite_pragmas(pragmas):
+    """Connect listener running PRAGMA statements on every new SQLite connection"""
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return connect
+
+def init_engine_profile(app):
+    """Apply the profile's SQLite pragmas to the app's engine and start monitoring its pool"""
+    name, profile = performance_profile(app.config)
+    with app.app_context():
+        engine = db.engine
+    
+    pragmas = profile.get('sqlite_pragmas')
+    if pragmas and engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_pragmas(pragmas))
+    
+    app.extensions[POOL_MONITOR_EXTENSION_KEY] = PoolMonitor(engine)
+
+def get_pool_metrics(app):
+    """Pool metrics of the app's engine"""
+    return app.extensions[POOL_MONITOR_EXTENSION_KEY].get_metrics()
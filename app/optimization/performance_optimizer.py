@@ -11,33 +11,68 @@ import psutil
 import sqlite3
 import hashlib
 import json
+import re
 import gzip
 import shutil
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-from functools import wraps
+from functools import lru_cache, wraps
+from collections import deque
 import threading
 from datetime import datetime, timedelta
-import redis
 from PIL import Image
 import requests
-from flask import Flask, request, g, current_app
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask import Flask, request, g, current_app, has_request_context
+from sqlalchemy import event
+try:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+except ImportError:  # only needed for PostgreSQL URLs
+    psycopg2 = None
+    RealDictCursor = None
+from app.optimization.caching import CacheManager, CACHE_EXTENSION_KEY, cache_decorator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# table.column <operator> inside a WHERE clause, and table.column inside an ORDER BY
+WHERE_COLUMN_PATTERN = re.compile(r'\b(\w+)\.(\w+)\s*(=|<=|>=|<|>|IN\b|IS\b|BETWEEN\b)', re.IGNORECASE)
+ORDER_COLUMN_PATTERN = re.compile(r'\b(\w+)\.(\w+)')
+
+# Literals and expanded IN lists, replaced so statements differing only in values share a fingerprint
+LITERAL_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?)')
+]
+
+# Upper bounds (seconds) of the per-endpoint statement latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+MAX_RECORDED_QUERIES = 10000
+MAX_RECORDED_RESPONSES = 10000
+QUERY_PROFILER_EXTENSION_KEY = 'crm_query_profiler'
+
+@lru_cache(maxsize=4096)
+def fingerprint_statement(statement: str) -> str:
+    """Normalize a SQL statement so executions that differ only in their values group together"""
+    statement = ' '.join(statement.split())
+    for pattern, replacement in LITERAL_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
 class PerformanceMonitor:
     """Monitor application performance metrics"""
     
     def __init__(self):
         self.metrics = {
-            'response_times': [],
+            'response_times': deque(maxlen=MAX_RECORDED_RESPONSES),
             'memory_usage': [],
             'cpu_usage': [],
-            'database_queries': [],
+            'database_queries': deque(maxlen=MAX_RECORDED_QUERIES),
+            'endpoint_queries': {},
+            'n_plus_one': {},
             'cache_hits': 0,
             'cache_misses': 0,
             'errors': []
@@ -55,14 +90,63 @@ class PerformanceMonitor:
                 'timestamp': datetime.now()
             })
     
-    def record_database_query(self, query: str, duration: float):
+    def record_database_query(self, query: str, duration: float, endpoint: str = None, fingerprint: str = None):
         """Record database query performance"""
+        fingerprint = fingerprint or fingerprint_statement(query)
         with self.lock:
             self.metrics['database_queries'].append({
                 'query': query,
+                'fingerprint': fingerprint,
+                'endpoint': endpoint,
                 'duration': duration,
                 'timestamp': datetime.now()
             })
+            if endpoint is not None:
+                stats = self._endpoint_query_stats(endpoint)
+                stats['queries'] += 1
+                stats['query_time'] += duration
+                bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if duration <= bound), len(LATENCY_BUCKETS))
+                stats['latency_histogram'][bucket] += 1
+    
+    def record_request_queries(self, endpoint: str, profile: Dict[str, List], n_plus_one_threshold: int = 10):
+        """Record the statements one request executed, as {fingerprint: [count, total time]}
+        
+        A fingerprint executed more than n_plus_one_threshold times in the request is flagged as
+        a likely N+1 pattern: a query per row where one query for all rows would do.
+        """
+        with self.lock:
+            stats = self._endpoint_query_stats(endpoint)
+            stats['requests'] += 1
+            stats['max_queries_per_request'] = max(
+                stats['max_queries_per_request'], sum(count for count, _ in profile.values())
+            )
+            
+            for fingerprint, (count, total_time) in profile.items():
+                if count <= n_plus_one_threshold:
+                    continue
+                flag = self.metrics['n_plus_one'].setdefault((endpoint, fingerprint), {
+                    'endpoint': endpoint,
+                    'fingerprint': fingerprint,
+                    'requests': 0,
+                    'max_executions': 0,
+                    'total_time': 0.0
+                })
+                flag['requests'] += 1
+                flag['max_executions'] = max(flag['max_executions'], count)
+                flag['total_time'] += total_time
+                flag['last_seen'] = datetime.now().isoformat()
+    
+    def _endpoint_query_stats(self, endpoint: str) -> Dict:
+        stats = self.metrics['endpoint_queries'].get(endpoint)
+        if stats is None:
+            stats = self.metrics['endpoint_queries'][endpoint] = {
+                'requests': 0,
+                'queries': 0,
+                'query_time': 0.0,
+                'max_queries_per_request': 0,
+                'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1)
+            }
+        return stats
     
     def record_cache_hit(self):
         """Record cache hit"""
@@ -112,6 +196,8 @@ class PerformanceMonitor:
                 'cpu_usage_percent': cpu_usage,
                 'slowest_endpoints': self.get_slowest_endpoints(),
                 'most_frequent_queries': self.get_most_frequent_queries(),
+                'endpoint_queries': self.get_endpoint_query_report(),
+                'n_plus_one_queries': self.get_n_plus_one_queries(),
                 'recent_errors': self.metrics['errors'][-10:]  # Last 10 errors
             }
     
@@ -139,13 +225,13 @@ class PerformanceMonitor:
         return sorted(slowest, key=lambda x: x['average_time'], reverse=True)[:limit]
     
     def get_most_frequent_queries(self, limit: int = 5) -> List[Dict]:
-        """Get most frequent database queries"""
+        """Get most frequent database queries, grouped by fingerprint"""
         if not self.metrics['database_queries']:
             return []
         
         query_counts = {}
         for record in self.metrics['database_queries']:
-            query = record['query'][:50] + '...' if len(record['query']) > 50 else record['query']
+            query = record.get('fingerprint') or fingerprint_statement(record['query'])
             if query not in query_counts:
                 query_counts[query] = {'count': 0, 'total_time': 0}
             query_counts[query]['count'] += 1
@@ -160,6 +246,149 @@ class PerformanceMonitor:
             })
         
         return sorted(frequent, key=lambda x: x['count'], reverse=True)[:limit]
+    
+    def get_endpoint_query_report(self, limit: int = 10) -> List[Dict]:
+        """Get the endpoints spending the most time in the database, with their query budgets"""
+        labels = [f"<={bound * 1000:g}ms" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1] * 1000:g}ms"]
+        report = []
+        for endpoint, stats in self.metrics['endpoint_queries'].items():
+            report.append({
+                'endpoint': endpoint,
+                'requests': stats['requests'],
+                'queries': stats['queries'],
+                'queries_per_request': stats['queries'] / stats['requests'] if stats['requests'] else None,
+                'max_queries_per_request': stats['max_queries_per_request'],
+                'query_time': stats['query_time'],
+                'latency_histogram': dict(zip(labels, stats['latency_histogram']))
+            })
+        
+        return sorted(report, key=lambda x: x['query_time'], reverse=True)[:limit]
+    
+    def get_n_plus_one_queries(self, limit: int = 10) -> List[Dict]:
+        """Get the statements flagged as N+1 patterns, most expensive first"""
+        flags = [dict(flag) for flag in self.metrics['n_plus_one'].values()]
+        return sorted(flags, key=lambda x: x['total_time'], reverse=True)[:limit]
+
+class QueryProfiler:
+    """Feed every statement an engine executes to a PerformanceMonitor, attributed to the Flask endpoint
+    
+    Statements are also counted per request so finish_request can flag N+1 patterns, and are
+    handed to a QueryLog when one is given, for the index advisor.
+    """
+    
+    def __init__(self, monitor: PerformanceMonitor, query_log: 'QueryLog' = None, n_plus_one_threshold: int = 10):
+        self.monitor = monitor
+        self.query_log = query_log
+        self.n_plus_one_threshold = n_plus_one_threshold
+        # Per-instance keys, so profilers attached to the same engine keep separate counts
+        self.start_key = f'query_profiler_start_{id(self)}'
+        self.profile_key = f'query_profile_{id(self)}'
+    
+    def attach(self, engine):
+        """Start profiling statements executed through an engine (idempotent)"""
+        if not event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def detach(self, engine):
+        """Stop profiling statements executed through an engine"""
+        if event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(self.start_key, []).append(time.perf_counter())
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info[self.start_key].pop()
+        fingerprint = fingerprint_statement(statement)
+        
+        endpoint = None
+        if has_request_context():
+            endpoint = request.endpoint
+            profile = g.setdefault(self.profile_key, {})
+            counts = profile.setdefault(fingerprint, [0, 0.0])
+            counts[0] += 1
+            counts[1] += duration
+        
+        self.monitor.record_database_query(statement, duration, endpoint, fingerprint)
+        if self.query_log is not None:
+            if executemany:
+                parameters = parameters[0] if parameters else None
+            self.query_log.record(statement, parameters, duration)
+    
+    def finish_request(self, endpoint: str):
+        """Record the current request's statements and flag its N+1 patterns"""
+        profile = g.pop(self.profile_key, None)
+        if profile is not None and endpoint is not None:
+            self.monitor.record_request_queries(endpoint, profile, self.n_plus_one_threshold)
+
+class QueryLog:
+    """Capture the statements an SQLAlchemy engine executes, grouped by fingerprint
+    
+    Each fingerprint keeps its call count, total time and the slowest call's statement and
+    parameters, which DatabaseOptimizer.advise_indexes re-runs under EXPLAIN.
+    """
+    
+    def __init__(self, max_fingerprints: int = 1000):
+        self.max_fingerprints = max_fingerprints
+        self.entries = {}
+        self.lock = threading.Lock()
+    
+    def attach(self, engine):
+        """Start capturing statements executed through an engine (idempotent)"""
+        if not event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def detach(self, engine):
+        """Stop capturing statements executed through an engine"""
+        if event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_log_start', []).append(time.perf_counter())
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_log_start'].pop()
+        if executemany:
+            parameters = parameters[0] if parameters else None
+        self.record(statement, parameters, duration)
+    
+    def record(self, statement: str, parameters, duration: float):
+        """Add one execution of a statement"""
+        key = fingerprint_statement(statement)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.max_fingerprints:
+                    return
+                entry = self.entries[key] = {
+                    'fingerprint': key,
+                    'count': 0,
+                    'total_time': 0.0,
+                    'max_time': 0.0,
+                    'query': statement,
+                    'parameters': parameters
+                }
+            entry['count'] += 1
+            entry['total_time'] += duration
+            if duration >= entry['max_time']:
+                entry['max_time'] = duration
+                entry['query'] = statement
+                entry['parameters'] = parameters
+    
+    def top(self, limit: int = 10) -> List[Dict]:
+        """The fingerprints with the most total time"""
+        with self.lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+        return sorted(entries, key=lambda entry: entry['total_time'], reverse=True)[:limit]
+    
+    def clear(self):
+        """Forget every captured statement"""
+        with self.lock:
+            self.entries = {}
 
 class DatabaseOptimizer:
     """Optimize database performance"""
@@ -174,6 +403,8 @@ class DatabaseOptimizer:
             if self.db_url.startswith('sqlite'):
                 self.connection = sqlite3.connect(self.db_url.replace('sqlite:///', ''))
             else:
+                if psycopg2 is None:
+                    raise ImportError("psycopg2 is required for PostgreSQL databases")
                 self.connection = psycopg2.connect(self.db_url)
             logger.info("Database connection established")
         except Exception as e:
@@ -271,51 +502,91 @@ class DatabaseOptimizer:
         indexes = cursor.fetchall()
         return [{'name': idx['indexname'], 'definition': idx['indexdef']} for idx in indexes]
     
-    def optimize_queries(self) -> List[str]:
-        """Generate query optimization recommendations"""
+    def get_index_columns(self, table_name: str) -> List[List[str]]:
+        """Get the column lists of every index on a table"""
+        if isinstance(self.connection, sqlite3.Connection):
+            cursor = self.connection.cursor()
+            columns = []
+            for index in cursor.execute(f"PRAGMA index_list({table_name})").fetchall():
+                info = cursor.execute(f"PRAGMA index_info({index[1]})").fetchall()
+                columns.append([column[2] for column in sorted(info)])
+            return columns
+        
+        columns = []
+        for index in self.get_postgresql_indexes(table_name):
+            match = re.search(r'\((.*)\)', index['definition'])
+            if match:
+                columns.append([column.strip().strip('"').split(' ')[0] for column in match.group(1).split(',')])
+        return columns
+    
+    def extract_query_patterns(self, query_log: List[Dict]) -> Dict[Tuple[str, Tuple[str, ...]], Dict]:
+        """Group recorded statements by the index each one could use
+        
+        Each statement contributes the columns its WHERE clause compares for equality, then its
+        ORDER BY columns, then one range-compared column: the order in which a composite index
+        serves all three. Returns {(table, columns): {'count', 'total_time'}}.
+        """
+        patterns = {}
+        for record in query_log:
+            statement = ' '.join(record['query'].split())
+            if not re.match(r'(SELECT|UPDATE|DELETE)\b', statement, re.IGNORECASE):
+                continue
+            
+            where = re.search(r'\bWHERE\b(.*?)(\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', statement, re.IGNORECASE)
+            order = re.search(r'\bORDER BY\b(.*?)(\bLIMIT\b|$)', statement, re.IGNORECASE)
+            
+            columns_by_table = {}
+            if where:
+                for table, column, operator in WHERE_COLUMN_PATTERN.findall(where.group(1)):
+                    kind = 'equality' if operator.upper() in ('=', 'IN', 'IS') else 'range'
+                    columns_by_table.setdefault(table, {'equality': [], 'order': [], 'range': []})[kind].append(column)
+            if order:
+                for table, column in ORDER_COLUMN_PATTERN.findall(order.group(1)):
+                    columns_by_table.setdefault(table, {'equality': [], 'order': [], 'range': []})['order'].append(column)
+            
+            for table, kinds in columns_by_table.items():
+                columns = []
+                for column in kinds['equality'] + kinds['order'] + kinds['range'][:1]:
+                    if column not in columns and column != 'id':
+                        columns.append(column)
+                if not columns:
+                    continue
+                
+                pattern = patterns.setdefault((table, tuple(columns[:3])), {'count': 0, 'total_time': 0.0})
+                pattern['count'] += record.get('count', 1)
+                pattern['total_time'] += record.get('total_time', record.get('duration', 0))
+        
+        return patterns
+    
+    def optimize_queries(self, query_log: Optional[List[Dict]] = None) -> List[str]:
+        """Generate query optimization recommendations
+        
+        Index recommendations come from recorded statements, such as
+        PerformanceMonitor.metrics['database_queries']: every filter/sort column combination
+        that no existing index starts with, most expensive first.
+        """
+        if not self.connection:
+            self.connect()
+        
         recommendations = []
         
         try:
-            if isinstance(self.connection, sqlite3.Connection):
-                # SQLite optimizations
-                cursor = self.connection.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = cursor.fetchall()
+            patterns = self.extract_query_patterns(query_log or [])
+            index_columns = {}
+            for (table, columns), usage in sorted(patterns.items(), key=lambda item: item[1]['total_time'], reverse=True):
+                if table not in index_columns:
+                    index_columns[table] = self.get_index_columns(table)
+                if any(index[:len(columns)] == list(columns) for index in index_columns[table]):
+                    continue
                 
-                for table in tables:
-                    table_name = table[0]
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    columns = cursor.fetchall()
-                    
-                    # Check for missing indexes on common query columns
-                    for column in columns:
-                        if column[1] in ['email', 'phone', 'created_at', 'updated_at', 'status']:
-                            recommendations.append(
-                                f"Consider adding index on {table_name}.{column[1]} for better query performance"
-                            )
-            else:
-                # PostgreSQL optimizations
+                recommendations.append(
+                    f"Consider adding index on {table} ({', '.join(columns)}): used by {usage['count']} recorded "
+                    f"queries taking {usage['total_time']:.3f}s in total"
+                )
+            
+            if not isinstance(self.connection, sqlite3.Connection):
                 cursor = self.connection.cursor(cursor_factory=RealDictCursor)
                 
-                # Check for missing indexes
-                cursor.execute("""
-                    SELECT 
-                        schemaname,
-                        tablename,
-                        attname,
-                        n_distinct
-                    FROM pg_stats 
-                    WHERE schemaname = 'public' 
-                    AND n_distinct > 100
-                    AND attname IN ('email', 'phone', 'created_at', 'updated_at', 'status')
-                """)
-                
-                for stat in cursor.fetchall():
-                    recommendations.append(
-                        f"Consider adding index on {stat['tablename']}.{stat['attname']} "
-                        f"(distinct values: {stat['n_distinct']})"
-                    )
-                
                 # Check for table bloat
                 cursor.execute("""
                     SELECT 
@@ -341,15 +612,141 @@ class DatabaseOptimizer:
         
         return recommendations
     
-    def create_indexes(self, indexes: List[Tuple[str, str, str]]):
-        """Create recommended indexes"""
+    def explain(self, statement: str, parameters=None) -> List[Dict]:
+        """Run a statement's plan and return its full table scans
+        
+        SQLite reports the plan from EXPLAIN QUERY PLAN without running the statement. PostgreSQL
+        runs it under EXPLAIN (ANALYZE, BUFFERS) inside a transaction that is rolled back, so
+        only SELECTs are explained there. Each scan is {'table', 'detail', 'filtered_fraction'},
+        where filtered_fraction is the share of scanned rows the filter threw away, if known.
+        """
+        if not self.connection:
+            self.connect()
+        
+        if isinstance(self.connection, sqlite3.Connection):
+            cursor = self.connection.cursor()
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+            scans = []
+            for row in rows:
+                detail = row[-1]
+                match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+                if match and 'COVERING INDEX' not in detail:
+                    scans.append({'table': match.group(1), 'detail': detail, 'filtered_fraction': None})
+            return scans
+        
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return []
+        
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters)
+            plan = cursor.fetchone()[0]
+        finally:
+            self.connection.rollback()
+        
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = []
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            if node.get('Node Type') != 'Seq Scan':
+                continue
+            
+            kept = node.get('Actual Rows', 0) * node.get('Actual Loops', 1)
+            removed = node.get('Rows Removed by Filter', 0) * node.get('Actual Loops', 1)
+            scans.append({
+                'table': node['Relation Name'],
+                'detail': (
+                    f"Seq Scan on {node['Relation Name']}: {kept} rows kept, {removed} removed, "
+                    f"{node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)} buffers"
+                ),
+                'filtered_fraction': removed / (kept + removed) if kept + removed else 0.0
+            })
+        return scans
+    
+    def advise_indexes(self, query_log: QueryLog, top_n: int = 10) -> List[Dict]:
+        """Ranked CREATE INDEX recommendations for the full scans among the slowest statements
+        
+        The top_n fingerprints by total time are explained; for each table they scan, the index
+        their filters and sort need (see extract_query_patterns) is recommended unless an existing
+        index already starts with it. estimated_benefit is the recorded time of those statements,
+        scaled by the share of scanned rows the filter discarded where the plan reports it: an
+        upper bound on the time the index saves. create_indexes accepts the result as is.
+        """
+        if not self.connection:
+            self.connect()
+        
+        candidates = {}
+        index_columns = {}
+        for entry in query_log.top(top_n):
+            try:
+                scans = self.explain(entry['query'], entry['parameters'])
+            except Exception as e:
+                logger.warning(f"Could not explain {entry['fingerprint'][:80]}: {e}")
+                continue
+            
+            patterns = self.extract_query_patterns([entry])
+            for scan in scans:
+                for (table, columns), usage in patterns.items():
+                    if table != scan['table']:
+                        continue
+                    if table not in index_columns:
+                        index_columns[table] = self.get_index_columns(table)
+                    if any(index[:len(columns)] == list(columns) for index in index_columns[table]):
+                        continue
+                    
+                    fraction = scan['filtered_fraction']
+                    candidate = candidates.setdefault((table, columns), {
+                        'estimated_benefit': 0.0, 'calls': 0, 'queries': [], 'plans': []
+                    })
+                    candidate['estimated_benefit'] += usage['total_time'] * (1.0 if fraction is None else fraction)
+                    candidate['calls'] += usage['count']
+                    candidate['queries'].append(entry['fingerprint'])
+                    candidate['plans'].append(scan['detail'])
+        
+        # An index also serves every candidate that is a prefix of its columns
+        for (table, columns), candidate in list(candidates.items()):
+            longer = [
+                key for key in candidates
+                if key[0] == table and len(key[1]) > len(columns) and key[1][:len(columns)] == columns
+            ]
+            if longer:
+                target = candidates[max(longer, key=lambda key: candidates[key]['estimated_benefit'])]
+                for field in ('estimated_benefit', 'calls', 'queries', 'plans'):
+                    target[field] += candidate[field]
+                del candidates[(table, columns)]
+        
+        recommendations = []
+        for (table, columns), candidate in candidates.items():
+            index_name = f"ix_{table}_{'_'.join(columns)}"
+            recommendations.append({
+                'table': table,
+                'columns': list(columns),
+                'index_name': index_name,
+                'statement': f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})",
+                'estimated_benefit': round(candidate['estimated_benefit'], 6),
+                'calls': candidate['calls'],
+                'queries': candidate['queries'],
+                'plans': candidate['plans']
+            })
+        
+        return sorted(recommendations, key=lambda item: item['estimated_benefit'], reverse=True)
+    
+    def create_indexes(self, indexes: List):
+        """Create recommended indexes, given as (table, columns, index name) or advise_indexes results"""
         if not self.connection:
             self.connect()
         
         try:
             cursor = self.connection.cursor()
             
-            for table, column, index_name in indexes:
+            for index in indexes:
+                if isinstance(index, dict):
+                    table, column, index_name = index['table'], ', '.join(index['columns']), index['index_name']
+                else:
+                    table, column, index_name = index
                 try:
                     cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})")
                     logger.info(f"Created index {index_name} on {table}.{column}")
@@ -379,101 +776,6 @@ class DatabaseOptimizer:
         except Exception as e:
             logger.error(f"Database vacuum failed: {e}")
 
-class CacheManager:
-    """Manage application caching"""
-    
-    def __init__(self, redis_url: str = "redis://localhost:6379/0"):
-        self.redis_url = redis_url
-        self.redis_client = None
-        self.monitor = PerformanceMonitor()
-    
-    def connect(self):
-        """Connect to Redis"""
-        try:
-            self.redis_client = redis.from_url(self.redis_url)
-            self.redis_client.ping()
-            logger.info("Redis connection established")
-        except Exception as e:
-            logger.error(f"Redis connection failed: {e}")
-            self.redis_client = None
-    
-    def get(self, key: str, default=None):
-        """Get value from cache"""
-        if not self.redis_client:
-            self.connect()
-        
-        try:
-            value = self.redis_client.get(key)
-            if value is not None:
-                self.monitor.record_cache_hit()
-                return json.loads(value)
-            else:
-                self.monitor.record_cache_miss()
-                return default
-        except Exception as e:
-            logger.error(f"Cache get failed for key {key}: {e}")
-            return default
-    
-    def set(self, key: str, value, expire: int = 3600):
-        """Set value in cache"""
-        if not self.redis_client:
-            self.connect()
-        
-        try:
-            serialized_value = json.dumps(value)
-            self.redis_client.setex(key, expire, serialized_value)
-            return True
-        except Exception as e:
-            logger.error(f"Cache set failed for key {key}: {e}")
-            return False
-    
-    def delete(self, key: str):
-        """Delete value from cache"""
-        if not self.redis_client:
-            self.connect()
-        
-        try:
-            self.redis_client.delete(key)
-            return True
-        except Exception as e:
-            logger.error(f"Cache delete failed for key {key}: {e}")
-            return False
-    
-    def clear_pattern(self, pattern: str):
-        """Clear cache entries matching pattern"""
-        if not self.redis_client:
-            self.connect()
-        
-        try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
-                logger.info(f"Cleared {len(keys)} cache entries matching pattern: {pattern}")
-            return True
-        except Exception as e:
-            logger.error(f"Cache clear pattern failed: {e}")
-            return False
-    
-    def get_cache_stats(self) -> Dict:
-        """Get cache statistics"""
-        if not self.redis_client:
-            self.connect()
-        
-        try:
-            info = self.redis_client.info()
-            return {
-                'total_connections_received': info.get('total_connections_received', 0),
-                'total_commands_processed': info.get('total_commands_processed', 0),
-                'keyspace_hits': info.get('keyspace_hits', 0),
-                'keyspace_misses': info.get('keyspace_misses', 0),
-                'used_memory_human': info.get('used_memory_human', '0B'),
-                'connected_clients': info.get('connected_clients', 0),
-                'uptime_in_seconds': info.get('uptime_in_seconds', 0)
-            }
-        except Exception as e:
-            logger.error(f"Cache stats failed: {e}")
-            return {}
-
 class ImageOptimizer:
     """Optimize images for web delivery"""
     
@@ -704,60 +1006,64 @@ def performance_decorator(func):
     
     return wrapper
 
-def cache_decorator(expire: int = 3600, key_prefix: str = ""):
-    """Decorator to cache function results"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
-            cache_key = f"{key_prefix}:{func.__name__}:{hash(str(args) + str(kwargs))}"
-            
-            # Try to get from cache
-            if hasattr(current_app, 'cache_manager'):
-                cached_result = current_app.cache_manager.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            
-            if hasattr(current_app, 'cache_manager'):
-                current_app.cache_manager.set(cache_key, result, expire)
-            
-            return result
-        return wrapper
-    return decorator
-
-def optimize_flask_app(app: Flask, db_url: str, redis_url: str = "redis://localhost:6379/0"):
-    """Optimize Flask application"""
+def init_query_profiling(app: Flask):
+    """Profile the statements and response times of every request served by the app (idempotent)
     
-    # Initialize performance monitoring
-    app.performance_monitor = PerformanceMonitor()
-    
-    # Initialize cache manager
-    app.cache_manager = CacheManager(redis_url)
+    Statements executed through the app's engine are attributed to the request's endpoint and
+    N+1 patterns are flagged when the request finishes; see PerformanceMonitor.get_performance_report.
+    They are also captured in app.query_log for DatabaseOptimizer.advise_indexes.
+    """
+    if QUERY_PROFILER_EXTENSION_KEY in app.extensions:
+        return app.extensions[QUERY_PROFILER_EXTENSION_KEY]
     
-    # Initialize database optimizer
-    app.db_optimizer = DatabaseOptimizer(db_url)
+    app.performance_monitor = PerformanceMonitor()
+    app.query_log = QueryLog()
+    app.query_profiler = QueryProfiler(
+        app.performance_monitor, app.query_log, app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 10)
+    )
+    if 'sqlalchemy' in app.extensions:
+        with app.app_context():
+            app.query_profiler.attach(app.extensions['sqlalchemy'].engine)
     
-    # Add performance monitoring middleware
     @app.before_request
-    def before_request():
+    def start_request_timer():
         g.start_time = time.time()
     
     @app.after_request
-    def after_request(response):
+    def record_request_profile(response):
         if hasattr(g, 'start_time'):
             duration = time.time() - g.start_time
             app.performance_monitor.record_response_time(
                 request.endpoint, request.method, duration
             )
+        app.query_profiler.finish_request(request.endpoint)
         return response
     
+    app.extensions[QUERY_PROFILER_EXTENSION_KEY] = app.query_profiler
+    return app.query_profiler
+
+def optimize_flask_app(app: Flask, db_url: str, redis_url: str = "redis://localhost:6379/0"):
+    """Optimize Flask application"""
+    
+    # Initialize performance monitoring and statement profiling, unless create_app already did
+    init_query_profiling(app)
+    
+    # Initialize cache manager, reusing the one create_app set up
+    app.cache_manager = app.extensions.get(CACHE_EXTENSION_KEY) or CacheManager(redis_url)
+    
+    # Initialize database optimizer
+    app.db_optimizer = DatabaseOptimizer(db_url)
+    
     # Add performance endpoint
     @app.route('/api/performance')
     def performance_metrics():
-        return json.dumps(app.performance_monitor.get_performance_report(), indent=2)
+        return json.dumps(app.performance_monitor.get_performance_report(), indent=2, default=str)
+    
+    # Add index advisor endpoint
+    @app.route('/api/performance/indexes')
+    def index_recommendations():
+        top_n = request.args.get('top', 10, type=int)
+        return json.dumps(app.db_optimizer.advise_indexes(app.query_log, top_n), indent=2)
     
     # Add cache stats endpoint
     @app.route('/api/cache/stats')
@@ -0,0 +1,91 @@
+from flask import current_app, request
+from functools import wraps
+from datetime import datetime, timezone
+import hashlib
+import json
+import time
+
+# Seconds the first time a validator was served is remembered; afterwards Last-Modified moves forward
+FIRST_SEEN_SECONDS = 24 * 60 * 60
+
+def data_validators(tables, period=None):
+    """(ETag, Last-Modified) of the current request's response, from the tables it is built from
+    
+    The ETag hashes the request with the cache's version of each table, which every committed
+    write moves on (see CacheManager.invalidate_tags). Last-Modified is when that ETag was first
+    served; it is left out for its first second, as HTTP dates cannot tell changes within a second
+    apart. period (seconds) is for responses that also depend on the time, such as rolling date
+    windows: the validators then change at least once per period. Returns (None, None) unless
+    the versions come from a Redis shared by every process, as otherwise commits made by other
+    workers would not change them.
+    """
+    cache = getattr(current_app, 'cache_manager', None)
+    if cache is None:
+        return None, None
+    
+    versions = cache.tag_versions(tables)
+    if not cache.shares_versions(tables):
+        return None, None
+    bucket = int(time.time() // period) if period else None
+    identity = json.dumps(
+        [request.path, sorted(request.args.items(multi=True)), sorted(versions.items()), bucket],
+        separators=(',', ':')
+    )
+    etag = hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest()
+    
+    now = time.time()
+    seen_key = f'conditional:seen:{etag}'
+    cache.add(seen_key, now, FIRST_SEEN_SECONDS)
+    first_seen = cache.get(seen_key)
+    if not isinstance(first_seen, (int, float)) or now - first_seen < 1:
+        return etag, None
+    return etag, datetime.fromtimestamp(int(first_seen), timezone.utc)
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def _succeeded(response):
+    body = response.get_json(silent=True)
+    return not (isinstance(body, dict) and body.get('success') is False)
+
+def conditional_json(*tables, period=None):
+    """Answer JSON GETs with 304 Not Modified while the tables their response is built from are unchanged
+    
+    Honors If-None-Match (then If-Modified-Since) before the view runs, so an unchanged poll costs
+    a few cache lookups instead of a query and a serialization.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or request.headers.get('Accept') != 'application/json':
+                return view(*args, **kwargs)
+            
+            try:
+                etag, last_modified = data_validators(tables, period)
+            except Exception as e:
+                current_app.logger.warning(f'Conditional request validators failed: {e}')
+                etag = None
+            if etag is None:
+                return view(*args, **kwargs)
+            
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                # Failures are reported with 200 and success: false; those must not validate later polls
+                if response.status_code != 200 or not _succeeded(response):
+                    return response
+            
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Cached copies must be revalidated, which the validators make cheap
+            response.cache_control.no_cache = True
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, render_template, flash, redirect, url_for
-from app.services.crm_service import CRMService
+from flask import Blueprint, request, jsonify, render_template, flash, redirect, url_for, Response, stream_with_context
+from app.services.crm_service import CRMService, ANALYTICS_CACHE_SECONDS
 from app.services.lead_service import LeadService
 from app.services.account_service import AccountService
 from app.services.contact_service import ContactService
 from app.services.opportunity_service import OpportunityService
 from app.services.activity_service import ActivityService
+from app.services.import_service import iter_csv_rows
+from app.services.upload_service import ChunkedUploadService
+from app.services.import_job_service import ImportJobService
+from app.services.bulk_service import BulkLeadService
+from app.services.export_service import ExportService, EXPORT_MIMETYPES, LEAD_EXPORT_FIELDS
+from app.services.loading import apply_load_profile
+from app.routes.conditional import conditional_json
 from app.models.crm import Lead, Account, Contact, Opportunity, Activity
 from app import db
 from datetime import datetime
@@ -12,6 +19,9 @@ import json
 
 bp = Blueprint('crm', __name__, url_prefix='/crm')
 
+# Tables the analytics dashboard is computed from
+ANALYTICS_TABLES = ('leads', 'accounts', 'contacts', 'opportunities', 'activities', 'quotes')
+
 # Initialize services
 crm_service = CRMService()
 lead_service = LeadService()
@@ -19,6 +29,8 @@ account_service = AccountService()
 contact_service = ContactService()
 opportunity_service = OpportunityService()
 activity_service = ActivityService()
+upload_service = ChunkedUploadService()
+import_job_service = ImportJobService()
 
 # Dashboard Routes
 @bp.route('/dashboard')
@@ -42,6 +54,7 @@ def dashboard():
 
 # Lead Routes
 @bp.route('/leads', methods=['GET'])
+@conditional_json('leads')
 def get_leads():
     """Get all leads with optional filtering"""
     try:
@@ -51,10 +64,10 @@ def get_leads():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = lead_service.get_leads(filters=filters_dict, page=page, per_page=per_page)
+        result = lead_service.get_leads(filters=filters_dict, page=page, per_page=per_page, load=_page_load('list'), **_keyset_args())
         
         if request.headers.get('Accept') == 'application/json':
-            return jsonify(result)
+            return jsonify(_rows_as_dicts(result, 'leads'))
         else:
             return render_template('crm/leads/list.html', leads_data=result['data'])
     except Exception as e:
@@ -70,7 +83,7 @@ def leads_list():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = lead_service.get_leads(filters=filters_dict, page=page, per_page=per_page)
+        result = lead_service.get_leads(filters=filters_dict, page=page, per_page=per_page, load='list')
         
         return render_template('crm/leads/list.html', leads_data=result['data'])
     except Exception as e:
@@ -186,6 +199,7 @@ def create_lead():
             return render_template('crm/leads/form.html', error=str(e))
 
 @bp.route('/leads/<int:lead_id>', methods=['GET'])
+@conditional_json('leads')
 def get_lead(lead_id):
     """Get a specific lead"""
     try:
@@ -293,6 +307,15 @@ def convert_lead(lead_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@bp.route('/leads/rescore', methods=['POST'])
+def rescore_leads():
+    """Recompute every lead's score from the active scoring rules"""
+    try:
+        result = lead_service.rescore_all()
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @bp.route('/leads/bulk-action', methods=['POST'])
 def bulk_action_leads():
     """Perform bulk actions on leads"""
@@ -304,24 +327,13 @@ def bulk_action_leads():
         if not lead_ids:
             return jsonify({'success': False, 'error': 'No leads selected'})
         
-        results = []
-        for lead_id in lead_ids:
-            if action == 'delete':
-                result = lead_service.delete_lead(lead_id)
-            elif action == 'qualify':
-                result = lead_service.qualify_lead(lead_id, {'status': 'Qualified'})
-            elif action == 'contact':
-                result = lead_service.qualify_lead(lead_id, {'status': 'Contacted'})
-            else:
-                result = {'success': False, 'error': f'Unknown action: {action}'}
-            results.append(result)
+        from flask_login import current_user
+        user_id = current_user.id if current_user.is_authenticated else None
         
-        success_count = sum(1 for r in results if r['success'])
-        return jsonify({
-            'success': True,
-            'message': f'{success_count} leads processed successfully',
-            'results': results
-        })
+        result = BulkLeadService().run(action, lead_ids, user_id)
+        if result['success']:
+            result['message'] = f"{result['data']['processed']} leads processed successfully"
+        return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -337,67 +349,108 @@ def import_leads():
             return jsonify({'success': False, 'error': 'No file selected'})
         
         if file and file.filename.endswith('.csv'):
-            # Parse CSV file
-            import csv
-            import io
-            
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.DictReader(stream)
-            
-            leads_data = []
-            for row in csv_reader:
-                leads_data.append(row)
-            
-            result = lead_service.import_leads(leads_data)
+            # Rows are parsed from the upload as the importer consumes them
+            result = lead_service.import_leads(iter_csv_rows(file.stream))
             return jsonify(result)
         else:
             return jsonify({'success': False, 'error': 'Only CSV files are supported'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@bp.route('/leads/import/uploads', methods=['POST'])
+def create_lead_import_upload():
+    """Start a chunked lead import upload for files larger than MAX_CONTENT_LENGTH"""
+    return jsonify(upload_service.create_upload())
+
+@bp.route('/leads/import/uploads/<upload_id>', methods=['PUT'])
+def append_lead_import_upload(upload_id):
+    """Append the request body to a chunked upload at ?offset="""
+    result = upload_service.append_chunk(upload_id, request.args.get('offset', 0, type=int), request.stream)
+    status = {'Offset mismatch': 409, 'Upload too large': 413}.get(result.get('error'), 200)
+    return jsonify(result), status
+
+@bp.route('/leads/import/uploads/<upload_id>/complete', methods=['POST'])
+def complete_lead_import_upload(upload_id):
+    """Import the leads in a fully received chunked upload"""
+    try:
+        upload = upload_service.open_upload(upload_id)
+        if upload is None:
+            return jsonify({'success': False, 'error': 'Upload not found'})
+        
+        with upload:
+            result = lead_service.import_leads(iter_csv_rows(upload))
+        upload_service.discard_upload(upload_id)
+        
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+# Background Import Job Routes
+@bp.route('/imports', methods=['POST'])
+def create_import_job():
+    """Queue a background import of leads, accounts or contacts"""
+    try:
+        from flask_login import current_user
+        created_by = current_user.id if current_user.is_authenticated else None
+        
+        data = request.form if request.form else (request.get_json(silent=True) or {})
+        entity = data.get('entity', 'leads')
+        
+        if 'file' in request.files:
+            file = request.files['file']
+            if not file.filename.endswith('.csv'):
+                return jsonify({'success': False, 'error': 'Only CSV files are supported'})
+            result = import_job_service.submit_file(entity, file, created_by)
+        elif data.get('upload_id'):
+            result = import_job_service.submit_upload(entity, data['upload_id'], created_by)
+        else:
+            return jsonify({'success': False, 'error': 'No file uploaded'})
+        
+        return jsonify(result), 202 if result['success'] else 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/imports/<int:job_id>')
+def get_import_job(job_id):
+    """Get import job progress"""
+    result = import_job_service.get_job(job_id)
+    return jsonify(result), 200 if result['success'] else 404
+
+@bp.route('/imports/<int:job_id>/errors')
+def get_import_job_errors(job_id):
+    """Get the row errors of an import job"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    result = import_job_service.get_job_errors(job_id, page, per_page)
+    return jsonify(result), 200 if result['success'] else 404
+
 @bp.route('/leads/export')
 def export_leads():
     """Export leads to CSV"""
     try:
-        from flask import send_file
-        import csv
-        import io
+        export_format = request.args.get('format', 'csv')
         
         # Get filters from query parameters
         filters = {}
         for key, value in request.args.items():
-            if value and key not in ['page', 'per_page']:
+            if value and key not in ['page', 'per_page', 'format', 'columns']:
                 filters[key] = value
         
-        result = lead_service.export_leads(filters)
-        
-        if not result['success']:
-            return jsonify(result)
-        
-        # Create CSV file
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=[
-            'id', 'first_name', 'last_name', 'email', 'phone', 'company',
-            'job_title', 'industry', 'source', 'status', 'score', 'budget',
-            'timeline', 'notes', 'created_at', 'updated_at'
-        ])
-        
-        writer.writeheader()
-        for lead in result['data']:
-            writer.writerow(lead)
-        
-        output.seek(0)
+        columns = LEAD_EXPORT_FIELDS
+        if request.args.get('columns'):
+            columns = request.args['columns'].split(',')
+            unknown = [name for name in columns if name not in LEAD_EXPORT_FIELDS]
+            if unknown:
+                return jsonify({'success': False, 'error': f"Unknown columns: {', '.join(unknown)}"})
         
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'leads_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        )
+        export_service = ExportService()
+        query, columns = export_service.build_query('leads', filters, columns)
+        return _export_response(export_service, query, columns, export_format, 'leads_export')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 @bp.route('/leads/reports')
+@conditional_json('leads')
 def lead_reports():
     """Generate lead reports"""
     try:
@@ -415,6 +468,7 @@ def lead_reports():
 
 # Account Routes
 @bp.route('/accounts', methods=['GET'])
+@conditional_json('accounts')
 def get_accounts():
     """Get all accounts"""
     try:
@@ -424,10 +478,10 @@ def get_accounts():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = account_service.get_accounts(filters=filters_dict, page=page, per_page=per_page)
+        result = account_service.get_accounts(filters=filters_dict, page=page, per_page=per_page, load=_page_load('list'), **_keyset_args())
         
         if request.headers.get('Accept') == 'application/json':
-            return jsonify(result)
+            return jsonify(_rows_as_dicts(result, 'accounts'))
         else:
             return render_template('crm/accounts/list.html', accounts_data=result['data'])
     except Exception as e:
@@ -455,6 +509,7 @@ def create_account():
         return jsonify({'success': False, 'error': str(e)})
 
 @bp.route('/accounts/<int:account_id>', methods=['GET'])
+@conditional_json('accounts')
 def get_account(account_id):
     """Get a specific account"""
     try:
@@ -510,7 +565,7 @@ def accounts_list():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = account_service.get_accounts(filters=filters_dict, page=page, per_page=per_page)
+        result = account_service.get_accounts(filters=filters_dict, page=page, per_page=per_page, load='list')
         
         return render_template('crm/accounts/list.html', accounts_data=result['data'])
     except Exception as e:
@@ -518,6 +573,7 @@ def accounts_list():
 
 # Contact Routes
 @bp.route('/contacts', methods=['GET'])
+@conditional_json('contacts')
 def get_contacts():
     """Get all contacts"""
     try:
@@ -527,10 +583,10 @@ def get_contacts():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = contact_service.get_contacts(filters=filters_dict, page=page, per_page=per_page)
+        result = contact_service.get_contacts(filters=filters_dict, page=page, per_page=per_page, load=_page_load('list'), **_keyset_args())
         
         if request.headers.get('Accept') == 'application/json':
-            return jsonify(result)
+            return jsonify(_rows_as_dicts(result, 'contacts'))
         else:
             return render_template('crm/contacts/list.html', contacts_data=result['data'])
     except Exception as e:
@@ -558,6 +614,7 @@ def create_contact():
         return jsonify({'success': False, 'error': str(e)})
 
 @bp.route('/contacts/<int:contact_id>', methods=['GET'])
+@conditional_json('contacts')
 def get_contact(contact_id):
     """Get a specific contact"""
     try:
@@ -613,7 +670,7 @@ def contacts_list():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = contact_service.get_contacts(filters=filters_dict, page=page, per_page=per_page)
+        result = contact_service.get_contacts(filters=filters_dict, page=page, per_page=per_page, load='list')
         
         return render_template('crm/contacts/list.html', contacts_data=result['data'])
     except Exception as e:
@@ -621,6 +678,7 @@ def contacts_list():
 
 # Opportunity Routes
 @bp.route('/opportunities', methods=['GET'])
+@conditional_json('opportunities')
 def get_opportunities():
     """Get all opportunities"""
     try:
@@ -630,10 +688,10 @@ def get_opportunities():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = opportunity_service.get_opportunities(filters=filters_dict, page=page, per_page=per_page)
+        result = opportunity_service.get_opportunities(filters=filters_dict, page=page, per_page=per_page, load=_page_load('list'), **_keyset_args())
         
         if request.headers.get('Accept') == 'application/json':
-            return jsonify(result)
+            return jsonify(_rows_as_dicts(result, 'opportunities'))
         else:
             return render_template('crm/opportunities/list.html', opportunities_data=result['data'])
     except Exception as e:
@@ -661,6 +719,7 @@ def create_opportunity():
         return jsonify({'success': False, 'error': str(e)})
 
 @bp.route('/opportunities/<int:opportunity_id>', methods=['GET'])
+@conditional_json('opportunities')
 def get_opportunity(opportunity_id):
     """Get a specific opportunity"""
     try:
@@ -716,7 +775,7 @@ def opportunities_list():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = opportunity_service.get_opportunities(filters=filters_dict, page=page, per_page=per_page)
+        result = opportunity_service.get_opportunities(filters=filters_dict, page=page, per_page=per_page, load='list')
         
         return render_template('crm/opportunities/list.html', opportunities_data=result['data'])
     except Exception as e:
@@ -724,6 +783,7 @@ def opportunities_list():
 
 # Activity Routes
 @bp.route('/activities', methods=['GET'])
+@conditional_json('activities')
 def get_activities():
     """Get all activities"""
     try:
@@ -733,10 +793,10 @@ def get_activities():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = activity_service.get_activities(filters=filters_dict, page=page, per_page=per_page)
+        result = activity_service.get_activities(filters=filters_dict, page=page, per_page=per_page, load=_page_load('list'), **_keyset_args())
         
         if request.headers.get('Accept') == 'application/json':
-            return jsonify(result)
+            return jsonify(_rows_as_dicts(result, 'activities'))
         else:
             return render_template('crm/activities/list.html', activities_data=result['data'])
     except Exception as e:
@@ -764,6 +824,7 @@ def create_activity():
         return jsonify({'success': False, 'error': str(e)})
 
 @bp.route('/activities/<int:activity_id>', methods=['GET'])
+@conditional_json('activities')
 def get_activity(activity_id):
     """Get a specific activity"""
     try:
@@ -819,7 +880,7 @@ def activities_list():
         
         filters_dict = json.loads(filters) if filters else {}
         
-        result = activity_service.get_activities(filters=filters_dict, page=page, per_page=per_page)
+        result = activity_service.get_activities(filters=filters_dict, page=page, per_page=per_page, load='list')
         
         return render_template('crm/activities/list.html', activities_data=result['data'])
     except Exception as e:
@@ -833,7 +894,7 @@ def quotes_list():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        quotes = Quote.query.paginate(page=page, per_page=per_page, error_out=False)
+        quotes = apply_load_profile(Quote.query, Quote, 'list').paginate(page=page, per_page=per_page, error_out=False)
         
         return render_template('crm/quotes/list.html', quotes=quotes)
     except Exception as e:
@@ -872,6 +933,7 @@ def workflows():
 
 # Analytics and Reports Routes
 @bp.route('/analytics')
+@conditional_json(*ANALYTICS_TABLES, period=ANALYTICS_CACHE_SECONDS)
 def analytics():
     """CRM Analytics Dashboard"""
     try:
@@ -898,6 +960,7 @@ def analytics():
         return jsonify({'success': False, 'error': str(e)})
 
 @bp.route('/reports')
+@conditional_json('leads', 'opportunities', 'activities', 'crm_rollups', period=ANALYTICS_CACHE_SECONDS)
 def reports():
     """Generate CRM reports"""
     try:
@@ -918,8 +981,57 @@ def export_data(data_type):
     try:
         filters = request.args.get('filters', '{}')
         filters_dict = json.loads(filters) if filters else {}
+        export_format = request.args.get('format', 'json')
+        columns = request.args.get('columns')
+        columns = columns.split(',') if columns else None
         
-        result = crm_service.export_crm_data(data_type, filters_dict)
-        return jsonify(result)
+        export_service = ExportService()
+        query, columns = export_service.build_query(data_type, filters_dict, columns)
+        return _export_response(export_service, query, columns, export_format, f'{data_type}_export')
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}) 
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)})
+
+def _keyset_args():
+    """Keyset paging options from ?cursor=&limit=&sort=&order=&total=; empty unless a cursor is given
+    
+    Only JSON responses page by cursor; rendered lists keep page/per_page paging, which their
+    templates expect.
+    """
+    if 'cursor' not in request.args or request.headers.get('Accept') != 'application/json':
+        return {}
+    
+    return {
+        'cursor': request.args.get('cursor', ''),
+        'limit': request.args.get('limit', type=int),
+        'sort': request.args.get('sort', 'created_at'),
+        'order': request.args.get('order', 'desc'),
+        'with_total': request.args.get('total', 'false').lower() in ('1', 'true', 'yes')
+    }
+
+def _rows_as_dicts(result, key):
+    """A list result with its rows under data[key] as dicts, so it can be sent as JSON"""
+    if result['success']:
+        result['data'][key] = [row.to_dict() for row in result['data'][key]]
+    return result
+
+def _page_load(profile):
+    """The load profile for a rendered page; JSON responses load no relationships up front"""
+    if request.headers.get('Accept') == 'application/json':
+        return None
+    return profile
+
+def _export_response(export_service, query, columns, export_format, name):
+    """Stream an export as it is read from the database"""
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'success': False, 'error': f'Unsupported export format: {export_format}'})
+    
+    headers = {}
+    if export_format != 'json':
+        filename = f'{name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
+        headers['Content-Disposition'] = f'attachment; filename={filename}'
+    
+    return Response(
+        stream_with_context(export_service.stream(query, columns, export_format)),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers=headers
+    )
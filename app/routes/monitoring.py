@@ -3,8 +3,10 @@ Monitoring Routes for CRM System
 Integration of application performance monitoring
 """
 
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, current_app
 from app.monitoring.app_monitor import ApplicationMonitor
+from app.optimization.engine_profiles import get_pool_metrics
+from app import db
 import logging
 
 bp = Blueprint('monitoring', __name__, url_prefix='/monitoring')
@@ -108,6 +110,64 @@ def health_check():
         logging.error(f"Health check failed: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@bp.route('/pool')
+def pool_metrics():
+    """Database connection pool metrics"""
+    try:
+        metrics = get_pool_metrics(current_app)
+        metrics['profile'] = current_app.config.get('PERFORMANCE_PROFILE')
+        
+        return jsonify({
+            'success': True,
+            'data': metrics
+        })
+            
+    except Exception as e:
+        logging.error(f"Pool metrics retrieval failed: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/performance')
+def performance_report():
+    """Response times, per-endpoint statement profiles and flagged N+1 patterns"""
+    try:
+        monitor = getattr(current_app, 'performance_monitor', None)
+        if monitor is None:
+            return jsonify({'success': False, 'error': 'Query profiling is disabled'})
+        
+        return jsonify({
+            'success': True,
+            'data': monitor.get_performance_report()
+        })
+            
+    except Exception as e:
+        logging.error(f"Performance report retrieval failed: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/performance/indexes')
+def index_recommendations():
+    """Indexes recommended for the slowest statements the app has executed"""
+    try:
+        query_log = getattr(current_app, 'query_log', None)
+        if query_log is None:
+            return jsonify({'success': False, 'error': 'Query profiling is disabled'})
+        
+        from app.optimization.performance_optimizer import DatabaseOptimizer
+        optimizer = DatabaseOptimizer(db.engine.url.render_as_string(hide_password=False))
+        try:
+            recommendations = optimizer.advise_indexes(query_log, request.args.get('top', 10, type=int))
+        finally:
+            if optimizer.connection is not None:
+                optimizer.connection.close()
+        
+        return jsonify({
+            'success': True,
+            'data': recommendations
+        })
+            
+    except Exception as e:
+        logging.error(f"Index recommendations failed: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @bp.route('/export')
 def export_metrics():
     """Export monitoring metrics"""
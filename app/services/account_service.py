@@ -2,6 +2,10 @@ from app import db
 from app.models.crm import Account, Contact, Opportunity, Activity, Territory, User
 from datetime import datetime
 from sqlalchemy import func, and_, or_
+from app.analytics.vectorized import VectorizedReportEngine
+from app.services.pagination import keyset_paginate
+from app.services.entity_cache import get_entity
+from app.services.loading import apply_load_profile, attach_counts
 import json
 
 class AccountService:
@@ -48,10 +52,13 @@ class AccountService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def get_account(self, account_id):
+    def get_account(self, account_id, load=None):
         """Get an account by ID"""
         try:
-            account = Account.query.get(account_id)
+            if load is None:
+                account = get_entity(Account, account_id)
+            else:
+                account = apply_load_profile(Account.query, Account, load).get(account_id)
             if not account:
                 return {'success': False, 'error': 'Account not found'}
             
@@ -59,21 +66,29 @@ class AccountService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_accounts(self, filters=None, page=1, per_page=20):
+    def get_accounts(self, filters=None, page=1, per_page=20, cursor=None, limit=None,
+                     sort='created_at', order='desc', with_total=False, load=None):
         """Get accounts with optional filtering and pagination"""
         try:
-            query = Account.query
+            query = apply_load_profile(Account.query, Account, load)
             
             # Apply filters
             if filters:
                 query = self._apply_filters(query, filters)
             
+            if cursor is not None:
+                data = keyset_paginate(query, Account, cursor, limit or per_page, sort, order, filters, with_total)
+                data['accounts'] = data.pop('items')
+                attach_counts(data['accounts'], Account, load)
+                return {'success': True, 'data': data}
+            
             # Apply pagination
             accounts = query.paginate(
                 page=page, 
                 per_page=per_page, 
                 error_out=False
             )
+            attach_counts(accounts.items, Account, load)
             
             return {
                 'success': True, 
@@ -187,32 +202,10 @@ class AccountService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def import_accounts(self, file_data):
+    def import_accounts(self, file_data, start_row=1):
         """Import accounts from file"""
-        try:
-            imported_count = 0
-            errors = []
-            
-            for row in file_data:
-                try:
-                    result = self.create_account(row)
-                    if result['success']:
-                        imported_count += 1
-                    else:
-                        errors.append(f"Row {row}: {result['error']}")
-                except Exception as e:
-                    errors.append(f"Row {row}: {str(e)}")
-            
-            return {
-                'success': True,
-                'data': {
-                    'imported_count': imported_count,
-                    'error_count': len(errors),
-                    'errors': errors
-                }
-            }
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        from app.services.import_service import AccountImportService
+        return AccountImportService().import_rows(file_data, start_row=start_row)
     
     def export_accounts(self, filters=None):
         """Export accounts to file"""
@@ -257,53 +250,7 @@ class AccountService:
     def generate_account_reports(self):
         """Generate account reports"""
         try:
-            accounts = Account.query.all()
-            
-            report = {
-                'total_accounts': len(accounts),
-                'by_industry': {},
-                'by_status': {},
-                'by_type': {},
-                'by_territory': {},
-                'total_revenue': 0,
-                'average_revenue': 0
-            }
-            
-            total_revenue = 0
-            accounts_with_revenue = 0
-            
-            for account in accounts:
-                # By industry
-                industry = account.industry or 'Unknown'
-                if industry not in report['by_industry']:
-                    report['by_industry'][industry] = 0
-                report['by_industry'][industry] += 1
-                
-                # By status
-                status = account.status
-                if status not in report['by_status']:
-                    report['by_status'][status] = 0
-                report['by_status'][status] += 1
-                
-                # By type
-                account_type = account.type or 'Unknown'
-                if account_type not in report['by_type']:
-                    report['by_type'][account_type] = 0
-                report['by_type'][account_type] += 1
-                
-                # By territory
-                territory = account.territory.name if account.territory else 'Unassigned'
-                if territory not in report['by_territory']:
-                    report['by_territory'][territory] = 0
-                report['by_territory'][territory] += 1
-                
-                # Revenue calculations
-                if account.annual_revenue:
-                    total_revenue += float(account.annual_revenue)
-                    accounts_with_revenue += 1
-            
-            report['total_revenue'] = total_revenue
-            report['average_revenue'] = total_revenue / accounts_with_revenue if accounts_with_revenue > 0 else 0
+            report = VectorizedReportEngine().account_report()
             
             return {'success': True, 'data': report}
         except Exception as e:
@@ -2,6 +2,9 @@ from app import db
 from app.models.crm import Activity, Account, Contact, Lead, Opportunity, User
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_
+from app.analytics.vectorized import VectorizedReportEngine
+from app.services.pagination import keyset_paginate
+from app.services.loading import apply_load_profile
 import json
 
 class ActivityService:
@@ -43,10 +46,10 @@ class ActivityService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def get_activity(self, activity_id):
+    def get_activity(self, activity_id, load=None):
         """Get an activity by ID"""
         try:
-            activity = Activity.query.get(activity_id)
+            activity = apply_load_profile(Activity.query, Activity, load).get(activity_id)
             if not activity:
                 return {'success': False, 'error': 'Activity not found'}
             
@@ -54,15 +57,21 @@ class ActivityService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_activities(self, filters=None, page=1, per_page=20):
+    def get_activities(self, filters=None, page=1, per_page=20, cursor=None, limit=None,
+                       sort='created_at', order='desc', with_total=False, load=None):
         """Get activities with optional filtering and pagination"""
         try:
-            query = Activity.query
+            query = apply_load_profile(Activity.query, Activity, load)
             
             # Apply filters
             if filters:
                 query = self._apply_filters(query, filters)
             
+            if cursor is not None:
+                data = keyset_paginate(query, Activity, cursor, limit or per_page, sort, order, filters, with_total)
+                data['activities'] = data.pop('items')
+                return {'success': True, 'data': data}
+            
             # Apply pagination
             activities = query.paginate(
                 page=page, 
@@ -247,54 +256,7 @@ class ActivityService:
     def generate_activity_reports(self):
         """Generate activity reports"""
         try:
-            activities = Activity.query.all()
-            
-            report = {
-                'total_activities': len(activities),
-                'by_type': {},
-                'by_status': {},
-                'by_priority': {},
-                'completed_activities': 0,
-                'pending_activities': 0,
-                'overdue_activities': 0,
-                'average_completion_time': 0
-            }
-            
-            total_completion_time = 0
-            completed_count = 0
-            
-            for activity in activities:
-                # By type
-                activity_type = activity.type
-                if activity_type not in report['by_type']:
-                    report['by_type'][activity_type] = 0
-                report['by_type'][activity_type] += 1
-                
-                # By status
-                status = activity.status
-                if status not in report['by_status']:
-                    report['by_status'][status] = 0
-                report['by_status'][status] += 1
-                
-                # By priority
-                priority = activity.priority
-                if priority not in report['by_priority']:
-                    report['by_priority'][priority] = 0
-                report['by_priority'][priority] += 1
-                
-                # Count by status
-                if activity.status == 'Completed':
-                    report['completed_activities'] += 1
-                    if activity.created_at and activity.completed_date:
-                        completion_time = (activity.completed_date - activity.created_at).days
-                        total_completion_time += completion_time
-                        completed_count += 1
-                elif activity.status == 'Planned':
-                    report['pending_activities'] += 1
-                elif activity.status == 'Overdue':
-                    report['overdue_activities'] += 1
-            
-            report['average_completion_time'] = total_completion_time / completed_count if completed_count > 0 else 0
+            report = VectorizedReportEngine().activity_report()
             
             return {'success': True, 'data': report}
         except Exception as e:
@@ -0,0 +1,125 @@
+from app import db
+from app.models.crm import Lead, Activity, Opportunity
+from app.analytics.counters import apply_row_deltas, tracked_attributes
+from app.analytics.rollups import queue_row_days
+from flask import current_app
+from datetime import datetime
+from sqlalchemy import select, update, delete
+
+DEFAULT_BULK_CHUNK_SIZE = 500
+
+class BulkLeadService:
+    """Set-based lead actions: one SELECT, one UPDATE or DELETE and one activity insert per chunk of ids"""
+    
+    # action -> lead status it sets; delete has none
+    ACTIONS = {
+        'delete': None,
+        'qualify': 'Qualified',
+        'contact': 'Contacted'
+    }
+    
+    def __init__(self, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = current_app.config.get('BULK_ACTION_CHUNK_SIZE', DEFAULT_BULK_CHUNK_SIZE)
+        self.chunk_size = chunk_size
+    
+    def run(self, action, lead_ids, user_id=None):
+        """Apply an action to many leads; returns the ids that succeeded and an error per failed id"""
+        try:
+            if action not in self.ACTIONS:
+                return {'success': False, 'error': f'Unknown action: {action}'}
+            
+            succeeded = []
+            failed = {}
+            ids = []
+            for lead_id in dict.fromkeys(lead_ids):
+                try:
+                    ids.append(int(lead_id))
+                except (TypeError, ValueError):
+                    failed[str(lead_id)] = 'Invalid lead id'
+            
+            for start in range(0, len(ids), self.chunk_size):
+                chunk = ids[start:start + self.chunk_size]
+                if action == 'delete':
+                    found = self._delete_chunk(chunk)
+                else:
+                    found = self._set_status_chunk(chunk, self.ACTIONS[action], user_id)
+                db.session.commit()
+                
+                for lead_id in chunk:
+                    if lead_id in found:
+                        succeeded.append(lead_id)
+                    else:
+                        failed[str(lead_id)] = 'Lead not found'
+            
+            # Rows changed behind the session's back; reload anything it still holds
+            db.session.expire_all()
+            
+            return {
+                'success': True,
+                'data': {
+                    'action': action,
+                    'processed': len(succeeded),
+                    'succeeded': succeeded,
+                    'failed': failed
+                }
+            }
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+    
+    def _load(self, chunk, columns):
+        """Current values of the given lead columns for the ids of a chunk that exist"""
+        table = Lead.__table__
+        rows = db.session.execute(
+            select(*[table.c[name] for name in sorted(columns | {'id'})]).where(table.c.id.in_(chunk))
+        )
+        return {row.id: dict(row._mapping) for row in rows}
+    
+    def _delete_chunk(self, chunk):
+        connection = db.session.connection()
+        leads = self._load(chunk, tracked_attributes(Lead) | {'created_at'})
+        if not leads:
+            return leads
+        
+        ids = list(leads)
+        # Detach children the way deleting through the ORM relationships does
+        connection.execute(update(Activity).where(Activity.lead_id.in_(ids)).values(lead_id=None))
+        connection.execute(update(Opportunity).where(Opportunity.lead_id.in_(ids)).values(lead_id=None))
+        connection.execute(delete(Lead).where(Lead.id.in_(ids)))
+        
+        apply_row_deltas(connection, Lead, leads.values(), sign=-1)
+        queue_row_days(connection, Lead, leads.values())
+        return leads
+    
+    def _set_status_chunk(self, chunk, status, user_id):
+        connection = db.session.connection()
+        leads = self._load(chunk, tracked_attributes(Lead) | {'created_at', 'first_name', 'last_name', 'score'})
+        if not leads:
+            return leads
+        
+        now = datetime.utcnow()
+        connection.execute(
+            update(Lead).where(Lead.id.in_(list(leads))).values(status=status, updated_at=now)
+        )
+        apply_row_deltas(connection, Lead, leads.values(), sign=-1)
+        apply_row_deltas(connection, Lead, [dict(values, status=status) for values in leads.values()])
+        # Status is a rollup dimension, so the days the leads were created under need refreshing
+        queue_row_days(connection, Lead, leads.values())
+        
+        # The audit trail qualify_lead writes, one executemany for the chunk
+        activities = [{
+            'subject': f"Lead Qualified: {values['first_name']} {values['last_name']}",
+            'type': 'Task',
+            'status': 'Completed',
+            'priority': 'Medium',
+            'description': f"Lead qualified with score: {values['score']}",
+            'lead_id': lead_id,
+            'created_by': user_id,
+            'created_at': now,
+            'updated_at': now
+        } for lead_id, values in leads.items()]
+        connection.execute(Activity.__table__.insert(), activities)
+        apply_row_deltas(connection, Activity, activities)
+        queue_row_days(connection, Activity, activities)
+        return leads
@@ -1,5 +1,8 @@
 from app import db
 from app.models.crm import Contact, Account, Activity, Opportunity, User
+from app.services.pagination import keyset_paginate
+from app.services.entity_cache import get_entity
+from app.services.loading import apply_load_profile
 from datetime import datetime
 from sqlalchemy import func, and_, or_
 import json
@@ -46,10 +49,13 @@ class ContactService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def get_contact(self, contact_id):
+    def get_contact(self, contact_id, load=None):
         """Get a contact by ID"""
         try:
-            contact = Contact.query.get(contact_id)
+            if load is None:
+                contact = get_entity(Contact, contact_id)
+            else:
+                contact = apply_load_profile(Contact.query, Contact, load).get(contact_id)
             if not contact:
                 return {'success': False, 'error': 'Contact not found'}
             
@@ -57,15 +63,21 @@ class ContactService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_contacts(self, filters=None, page=1, per_page=20):
+    def get_contacts(self, filters=None, page=1, per_page=20, cursor=None, limit=None,
+                     sort='created_at', order='desc', with_total=False, load=None):
         """Get contacts with optional filtering and pagination"""
         try:
-            query = Contact.query
+            query = apply_load_profile(Contact.query, Contact, load)
             
             # Apply filters
             if filters:
                 query = self._apply_filters(query, filters)
             
+            if cursor is not None:
+                data = keyset_paginate(query, Contact, cursor, limit or per_page, sort, order, filters, with_total)
+                data['contacts'] = data.pop('items')
+                return {'success': True, 'data': data}
+            
             # Apply pagination
             contacts = query.paginate(
                 page=page, 
@@ -186,32 +198,10 @@ class ContactService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def import_contacts(self, file_data):
+    def import_contacts(self, file_data, start_row=1):
         """Import contacts from file"""
-        try:
-            imported_count = 0
-            errors = []
-            
-            for row in file_data:
-                try:
-                    result = self.create_contact(row)
-                    if result['success']:
-                        imported_count += 1
-                    else:
-                        errors.append(f"Row {row}: {result['error']}")
-                except Exception as e:
-                    errors.append(f"Row {row}: {str(e)}")
-            
-            return {
-                'success': True,
-                'data': {
-                    'imported_count': imported_count,
-                    'error_count': len(errors),
-                    'errors': errors
-                }
-            }
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        from app.services.import_service import ContactImportService
+        return ContactImportService().import_rows(file_data, start_row=start_row)
     
     def export_contacts(self, filters=None):
         """Export contacts to file"""
@@ -1,39 +1,89 @@
 from app import db
 from app.models.crm import Lead, Account, Contact, Opportunity, Activity, Quote, User
 from app.models.crm_business_processes import Campaign, Workflow, AutomationRule
+from app.analytics.counters import CounterService, normalize_key
+from app.analytics.rollups import RollupService
+from app.optimization.caching import cache_decorator
+from flask import current_app
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, case
 import json
 
+ACTIVE_LEAD_STATUSES = ['New', 'Qualified', 'Nurturing']
+
+# Seconds an analytics result is cached (committed writes to the tables it reads retire it sooner),
+# and seconds after that it is still served while one worker recomputes it in the background
+ANALYTICS_CACHE_SECONDS = 300
+ANALYTICS_STALE_SECONDS = 300
+
+def _succeeded(result):
+    return result.get('success')
+
+def analytics_cache(*tables):
+    """Cache a successful analytics result, tagged with the tables it is computed from"""
+    return cache_decorator(
+        expire=ANALYTICS_CACHE_SECONDS, key_prefix='crm', tags=tables, cache_if=_succeeded,
+        stale_ttl=ANALYTICS_STALE_SECONDS
+    )
+
+# Dashboard counters grouped by table; a condition of None means a plain row count.
+# Each table is scanned once, with conditional sums computing the filtered counters.
+CRM_STATS_DEFINITIONS = [
+    (Lead, {
+        'total_leads': None,
+        'active_leads': Lead.status.in_(ACTIVE_LEAD_STATUSES)
+    }),
+    (Account, {'total_accounts': None}),
+    (Contact, {'total_contacts': None}),
+    (Opportunity, {
+        'total_opportunities': None,
+        'won_opportunities': Opportunity.stage == 'Closed Won'
+    }),
+    (Activity, {
+        'total_activities': None,
+        'pending_activities': Activity.status == 'Planned'
+    }),
+    (Quote, {'total_quotes': None})
+]
+
 class CRMService:
     """Main CRM service for handling core CRM operations"""
     
+    def __init__(self):
+        self.counter_service = CounterService()
+        self.rollup_service = RollupService()
+    
+    @analytics_cache('leads', 'accounts', 'contacts', 'opportunities', 'activities', 'quotes', 'crm_counters')
     def get_crm_stats(self):
         """Get overall CRM statistics"""
         try:
-            stats = {
-                'total_leads': Lead.query.count(),
-                'total_accounts': Account.query.count(),
-                'total_contacts': Contact.query.count(),
-                'total_opportunities': Opportunity.query.count(),
-                'total_activities': Activity.query.count(),
-                'total_quotes': Quote.query.count(),
-                'active_leads': Lead.query.filter(Lead.status.in_(['New', 'Qualified', 'Nurturing'])).count(),
-                'won_opportunities': Opportunity.query.filter(Opportunity.stage == 'Closed Won').count(),
-                'pending_activities': Activity.query.filter(Activity.status == 'Planned').count()
-            }
+            if self._counters_enabled():
+                stats = self._counter_crm_stats()
+            else:
+                stats = {}
+                for model, counters in CRM_STATS_DEFINITIONS:
+                    stats.update(self._aggregate_counters(model, counters))
             return {'success': True, 'data': stats}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @analytics_cache('opportunities', 'crm_counters')
     def get_sales_pipeline(self):
         """Get sales pipeline data"""
         try:
-            pipeline = db.session.query(
-                Opportunity.stage,
-                func.count(Opportunity.id).label('count'),
-                func.sum(Opportunity.amount).label('total_amount')
-            ).group_by(Opportunity.stage).all()
+            if self._counters_enabled():
+                counters = self.counter_service.get_counters(['opportunities.stage'])
+                pipeline = [
+                    (stage or None, count, amount)
+                    for (_, stage), (count, amount) in sorted(counters.items())
+                    if count
+                ]
+            else:
+                pipeline = db.session.query(
+                    Opportunity.stage,
+                    func.count(Opportunity.id).label('count'),
+                    func.sum(Opportunity.amount).label('total_amount')
+                ).group_by(Opportunity.stage).all()
             
             pipeline_data = []
             for stage, count, amount in pipeline:
@@ -47,18 +97,29 @@ class CRMService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @analytics_cache('leads', 'crm_counters')
     def get_lead_conversion_rate(self, days=30):
         """Calculate lead conversion rate"""
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
             
-            total_leads = Lead.query.filter(Lead.created_at >= start_date).count()
-            converted_leads = Lead.query.filter(
-                and_(
-                    Lead.created_at >= start_date,
-                    Lead.status == 'Converted'
+            if self._counters_enabled():
+                # Daily counters are keyed by the lead's creation day, so the window
+                # starts at the beginning of the UTC day containing start_date
+                counters = self.counter_service.get_counter_range(
+                    ['leads.created', 'leads.converted'],
+                    normalize_key(start_date, by_day=True)
                 )
-            ).count()
+                total_leads = sum(count for (name, _), (count, _) in counters.items() if name == 'leads.created')
+                converted_leads = sum(count for (name, _), (count, _) in counters.items() if name == 'leads.converted')
+            else:
+                total_leads = Lead.query.filter(Lead.created_at >= start_date).count()
+                converted_leads = Lead.query.filter(
+                    and_(
+                        Lead.created_at >= start_date,
+                        Lead.status == 'Converted'
+                    )
+                ).count()
             
             conversion_rate = (converted_leads / total_leads * 100) if total_leads > 0 else 0
             
@@ -73,6 +134,7 @@ class CRMService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @analytics_cache('opportunities')
     def get_customer_lifetime_value(self):
         """Calculate customer lifetime value"""
         try:
@@ -97,6 +159,7 @@ class CRMService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @analytics_cache('opportunities')
     def get_sales_forecast(self, months=3):
         """Generate sales forecast"""
         try:
@@ -123,31 +186,27 @@ class CRMService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @analytics_cache('activities', 'crm_rollups')
     def get_activity_summary(self, days=7):
         """Get activity summary for the last X days"""
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
             
-            activities = Activity.query.filter(Activity.created_at >= start_date).all()
+            by_status = self.rollup_service.get_totals('activities.created', 'status', start=start_date)
+            by_type = self.rollup_service.get_totals('activities.created', 'type', start=start_date)
             
             activity_summary = {
-                'total_activities': len(activities),
-                'completed_activities': len([a for a in activities if a.status == 'Completed']),
-                'pending_activities': len([a for a in activities if a.status == 'Planned']),
-                'by_type': {}
+                'total_activities': sum(count for count, _ in by_status.values()),
+                'completed_activities': by_status.get('Completed', (0, 0))[0],
+                'pending_activities': by_status.get('Planned', (0, 0))[0],
+                'by_type': {activity_type: count for activity_type, (count, _) in by_type.items()}
             }
             
-            # Group by activity type
-            for activity in activities:
-                activity_type = activity.type
-                if activity_type not in activity_summary['by_type']:
-                    activity_summary['by_type'][activity_type] = 0
-                activity_summary['by_type'][activity_type] += 1
-            
             return {'success': True, 'data': activity_summary}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @analytics_cache('leads', 'opportunities', 'activities', 'crm_rollups')
     def generate_crm_reports(self, report_type='all'):
         """Generate CRM reports"""
         try:
@@ -172,166 +231,149 @@ class CRMService:
     def export_crm_data(self, data_type, filters=None):
         """Export CRM data"""
         try:
-            if data_type == 'leads':
-                query = Lead.query
-            elif data_type == 'accounts':
-                query = Account.query
-            elif data_type == 'contacts':
-                query = Contact.query
-            elif data_type == 'opportunities':
-                query = Opportunity.query
-            elif data_type == 'activities':
-                query = Activity.query
-            else:
-                return {'success': False, 'error': 'Invalid data type'}
+            from app.services.export_service import ExportService
+            export_service = ExportService()
+            query, columns = export_service.build_query(data_type, filters)
             
-            # Apply filters if provided
-            if filters:
-                query = self._apply_filters(query, filters)
-            
-            data = query.all()
-            
-            # Convert to dictionary format
-            export_data = []
-            for item in data:
-                export_data.append(item.__dict__)
-            
-            return {'success': True, 'data': export_data}
+            return {'success': True, 'data': list(export_service.iter_records(query, columns))}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
     def _generate_lead_report(self):
         """Generate lead report"""
-        leads = Lead.query.all()
+        by_status = self._group_counts(Lead.status)
+        total_leads = sum(by_status.values())
         
         report = {
-            'total_leads': len(leads),
-            'by_status': {},
-            'by_source': {},
-            'by_industry': {},
+            'total_leads': total_leads,
+            'by_status': by_status,
+            'by_source': self._group_counts(Lead.source, default='Unknown'),
+            'by_industry': self._group_counts(Lead.industry, default='Unknown'),
             'conversion_rate': 0
         }
         
-        converted_count = 0
-        for lead in leads:
-            # By status
-            status = lead.status
-            if status not in report['by_status']:
-                report['by_status'][status] = 0
-            report['by_status'][status] += 1
-            
-            # By source
-            source = lead.source or 'Unknown'
-            if source not in report['by_source']:
-                report['by_source'][source] = 0
-            report['by_source'][source] += 1
-            
-            # By industry
-            industry = lead.industry or 'Unknown'
-            if industry not in report['by_industry']:
-                report['by_industry'][industry] = 0
-            report['by_industry'][industry] += 1
-            
-            # Conversion count
-            if lead.status == 'Converted':
-                converted_count += 1
-        
-        report['conversion_rate'] = (converted_count / len(leads) * 100) if leads else 0
+        converted_count = by_status.get('Converted', 0)
+        report['conversion_rate'] = (converted_count / total_leads * 100) if total_leads else 0
         
         return report
     
     def _generate_opportunity_report(self):
         """Generate opportunity report"""
-        opportunities = Opportunity.query.all()
+        stages = db.session.query(
+            Opportunity.stage,
+            func.count(),
+            func.sum(Opportunity.amount)
+        ).group_by(Opportunity.stage).all()
         
         report = {
-            'total_opportunities': len(opportunities),
+            'total_opportunities': 0,
             'by_stage': {},
             'total_pipeline_value': 0,
             'won_value': 0,
             'lost_value': 0
         }
         
-        for opp in opportunities:
-            # By stage
-            stage = opp.stage
-            if stage not in report['by_stage']:
-                report['by_stage'][stage] = {'count': 0, 'value': 0}
-            report['by_stage'][stage]['count'] += 1
-            if opp.amount:
-                report['by_stage'][stage]['value'] += float(opp.amount)
-                report['total_pipeline_value'] += float(opp.amount)
+        for stage, count, amount in stages:
+            value = float(amount) if amount else 0
+            report['by_stage'][stage] = {'count': count, 'value': value}
+            report['total_opportunities'] += count
+            report['total_pipeline_value'] += value
             
             # Won/Lost values
-            if opp.stage == 'Closed Won' and opp.amount:
-                report['won_value'] += float(opp.amount)
-            elif opp.stage == 'Closed Lost' and opp.amount:
-                report['lost_value'] += float(opp.amount)
+            if stage == 'Closed Won':
+                report['won_value'] = value
+            elif stage == 'Closed Lost':
+                report['lost_value'] = value
         
         return report
     
     def _generate_activity_report(self):
         """Generate activity report"""
-        activities = Activity.query.all()
+        by_type = self._group_counts(Activity.type)
         
         report = {
-            'total_activities': len(activities),
-            'by_type': {},
-            'by_status': {},
-            'by_priority': {}
+            'total_activities': sum(by_type.values()),
+            'by_type': by_type,
+            'by_status': self._group_counts(Activity.status),
+            'by_priority': self._group_counts(Activity.priority)
         }
         
-        for activity in activities:
-            # By type
-            activity_type = activity.type
-            if activity_type not in report['by_type']:
-                report['by_type'][activity_type] = 0
-            report['by_type'][activity_type] += 1
-            
-            # By status
-            status = activity.status
-            if status not in report['by_status']:
-                report['by_status'][status] = 0
-            report['by_status'][status] += 1
-            
-            # By priority
-            priority = activity.priority
-            if priority not in report['by_priority']:
-                report['by_priority'][priority] = 0
-            report['by_priority'][priority] += 1
-        
         return report
     
     def _generate_sales_report(self):
         """Generate sales report"""
-        opportunities = Opportunity.query.filter(
-            Opportunity.stage == 'Closed Won'
-        ).all()
+        total_sales, total_revenue = db.session.query(
+            func.count(),
+            func.sum(Opportunity.amount)
+        ).filter(Opportunity.stage == 'Closed Won').one()
         
         report = {
-            'total_sales': len(opportunities),
-            'total_revenue': 0,
+            'total_sales': total_sales,
+            'total_revenue': float(total_revenue) if total_revenue else 0,
             'average_deal_size': 0,
             'by_month': {}
         }
         
-        for opp in opportunities:
-            if opp.amount:
-                amount = float(opp.amount)
-                report['total_revenue'] += amount
-                
-                # By month
-                if opp.actual_close_date:
-                    month_key = opp.actual_close_date.strftime('%Y-%m')
-                    if month_key not in report['by_month']:
-                        report['by_month'][month_key] = {'count': 0, 'revenue': 0}
-                    report['by_month'][month_key]['count'] += 1
-                    report['by_month'][month_key]['revenue'] += amount
+        # By month, counting only closed deals with a non-zero amount
+        for month_key, keys in self.rollup_service.get_rollup('opportunities.won').items():
+            count, revenue = keys['']
+            report['by_month'][month_key] = {'count': count, 'revenue': float(revenue)}
         
-        report['average_deal_size'] = report['total_revenue'] / len(opportunities) if opportunities else 0
+        report['average_deal_size'] = report['total_revenue'] / total_sales if total_sales else 0
         
         return report
     
+    def _group_counts(self, column, default=None):
+        """Count rows per distinct column value; falsy values map to default when given"""
+        counts = {}
+        for value, count in db.session.query(column, func.count()).group_by(column).all():
+            if default is not None:
+                value = value or default
+            counts[value] = counts.get(value, 0) + count
+        return counts
+    
+    def _counters_enabled(self):
+        """Whether dashboard reads should use the materialized counters"""
+        return current_app.config.get('CRM_COUNTERS_ENABLED', False)
+    
+    def _counter_crm_stats(self):
+        """Read dashboard statistics from the materialized counters"""
+        counters = self.counter_service.get_counters([
+            'leads', 'accounts', 'contacts', 'opportunities', 'activities', 'quotes',
+            'leads.status', 'opportunities.stage', 'activities.status'
+        ])
+        
+        def value(name, key=''):
+            return int(counters.get((name, key), (0, 0))[0])
+        
+        return {
+            'total_leads': value('leads'),
+            'total_accounts': value('accounts'),
+            'total_contacts': value('contacts'),
+            'total_opportunities': value('opportunities'),
+            'total_activities': value('activities'),
+            'total_quotes': value('quotes'),
+            'active_leads': sum(value('leads.status', status) for status in ACTIVE_LEAD_STATUSES),
+            'won_opportunities': value('opportunities.stage', 'Closed Won'),
+            'pending_activities': value('activities.status', 'Planned')
+        }
+    
+    def _aggregate_counters(self, model, counters):
+        """Compute several counters for one table with a single aggregate query"""
+        supports_filter = db.engine.dialect.name in ('sqlite', 'postgresql')
+        
+        columns = []
+        for name, condition in counters.items():
+            if condition is None:
+                columns.append(func.count().label(name))
+            elif supports_filter:
+                columns.append(func.count().filter(condition).label(name))
+            else:
+                columns.append(func.sum(case((condition, 1), else_=0)).label(name))
+        
+        row = db.session.query(*columns).select_from(model).one()
+        return {name: int(value or 0) for name, value in row._mapping.items()}
+    
     def _apply_filters(self, query, filters):
         """Apply filters to query"""
         for field, value in filters.items():
@@ -0,0 +1,117 @@
+from app import db
+from app.models.crm import Lead, Account, Contact
+from app.optimization.caching import bulk_tag
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+DEFAULT_ENTITY_CACHE_TTL = 300
+SESSION_ENTITIES_CHANGED_KEY = 'crm_entities_changed'
+
+# Seconds a committed change keeps readers from caching the row again
+ENTITY_TOMBSTONE_SECONDS = 5
+
+# Models whose rows are read often enough by id to keep in the application cache
+CACHED_MODELS = (Lead, Account, Contact)
+
+def entity_key(model, entity_id):
+    return f'entity:{model.__tablename__}:{entity_id}'
+
+def _column_keys(model):
+    return [attribute.key for attribute in inspect(model).column_attrs]
+
+def _cache(model):
+    """The app's cache if it holds rows of this model: only with a Redis every process shares
+    
+    A process's own tier cannot see the commits of other processes (gunicorn workers, import
+    workers), so cached rows are read from and written to Redis alone.
+    """
+    if not has_app_context() or not current_app.config.get('ENTITY_CACHE_ENABLED', False):
+        return None
+    cache = getattr(current_app, 'cache_manager', None)
+    if cache is None or not cache.shares_versions([bulk_tag(model.__tablename__)]):
+        return None
+    return cache
+
+def _ttl():
+    return current_app.config.get('ENTITY_CACHE_TTL', DEFAULT_ENTITY_CACHE_TTL)
+
+def _row(instance):
+    """Column values in mapper order, or None if some are not loaded (server defaults, expired columns)"""
+    values = inspect(instance).dict
+    keys = _column_keys(type(instance))
+    if any(key not in values for key in keys):
+        return None
+    return [values[key] for key in keys]
+
+def get_entity(model, entity_id):
+    """The entity with this id in the current session, or None; repeat reads are served from the cache
+    
+    Rows are cached as lists of column values under entity:<table>:<id>. A hit is attached to the
+    session as an already-loaded instance; relationships still load from the database on access.
+    """
+    key = inspect(model).identity_key_from_primary_key((entity_id,))
+    instance = db.session.identity_map.get(key)
+    if instance is not None:
+        return instance
+    
+    cache = _cache(model) if model in CACHED_MODELS else None
+    if cache is None:
+        return db.session.get(model, entity_id)
+    
+    tags = [bulk_tag(model.__tablename__)]
+    values = cache.get(entity_key(model, entity_id), tags=tags, local=False)
+    keys = _column_keys(model)
+    if isinstance(values, list) and len(values) == len(keys):
+        instance = model(**dict(zip(keys, values)))
+        # Persistent and unmodified, as if just read from the database
+        make_transient_to_detached(instance)
+        db.session.add(instance)
+        return instance
+    
+    instance = db.session.get(model, entity_id)
+    if instance is not None:
+        values = _row(instance)
+        if values is not None:
+            # Added only if absent, so a reader never replaces what a concurrent commit wrote through
+            cache.add(entity_key(model, entity_id), values, _ttl(), tags, local=False)
+    return instance
+
+def _after_flush(session, flush_context):
+    changed = session.info.setdefault(SESSION_ENTITIES_CHANGED_KEY, set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, CACHED_MODELS) and instance.id is not None:
+            changed.add((type(instance), instance.id))
+
+def _after_commit(session):
+    # The session's copy may predate a concurrent commit to other columns, so changed rows are not
+    # written through. A tombstone replaces them instead: readers miss, and a reader that loaded the
+    # row before this commit cannot add it back until the tombstone expires.
+    changed = session.info.pop(SESSION_ENTITIES_CHANGED_KEY, None)
+    for model, entity_id in changed or ():
+        cache = _cache(model)
+        if cache is not None:
+            cache.set(entity_key(model, entity_id), None, ENTITY_TOMBSTONE_SECONDS,
+                      [bulk_tag(model.__tablename__)], local=False)
+
+def _after_transaction_end(session, transaction):
+    # Changes of a transaction that did not commit are dropped with it
+    if transaction.parent is None:
+        session.info.pop(SESSION_ENTITIES_CHANGED_KEY, None)
+
+def register_entity_cache_hooks():
+    """Retire cached rows of cached models once their changes commit (idempotent)"""
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_transaction_end', _after_transaction_end)
+
+def init_entity_cache(app):
+    """Serve repeated id lookups of leads, accounts and contacts from the application cache
+    
+    ORM commits retire the rows they change, which the next reads cache again; writes that bypass
+    the ORM retire every cached row of their table through its bulk tag. Rows are only cached
+    while CACHE_REDIS_URL names a Redis shared by every process.
+    """
+    register_entity_cache_hooks()
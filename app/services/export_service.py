@@ -0,0 +1,247 @@
+from app import db
+from app.models.crm import Lead, Account, Contact, Opportunity, Activity
+from flask import current_app
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, select
+import csv
+import io
+import json
+
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+DEFAULT_ROW_GROUP_SIZE = 50000
+
+EXPORT_MODELS = {
+    'leads': Lead,
+    'accounts': Account,
+    'contacts': Contact,
+    'opportunities': Opportunity,
+    'activities': Activity
+}
+
+LEAD_EXPORT_FIELDS = [
+    'id', 'first_name', 'last_name', 'email', 'phone', 'company',
+    'job_title', 'industry', 'source', 'status', 'score', 'budget',
+    'timeline', 'notes', 'created_at', 'updated_at'
+]
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file'
+}
+
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file object whose bytes are handed out as they are written"""
+    
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class ExportService:
+    """Service streaming CRM tables in batches so exports never hold the full table in memory"""
+    
+    def __init__(self, batch_size=None, row_group_size=None):
+        if batch_size is None:
+            batch_size = current_app.config.get('EXPORT_BATCH_SIZE', DEFAULT_EXPORT_BATCH_SIZE)
+        if row_group_size is None:
+            row_group_size = current_app.config.get('EXPORT_ROW_GROUP_SIZE', DEFAULT_ROW_GROUP_SIZE)
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+    
+    def build_query(self, data_type, filters=None, columns=None):
+        """Select the requested columns of a data type with the filters applied in SQL; returns (query, columns)"""
+        model = EXPORT_MODELS.get(data_type)
+        if model is None:
+            raise ValueError('Invalid data type')
+        
+        table_columns = model.__table__.columns
+        columns = list(columns or [column.key for column in table_columns])
+        unknown = [name for name in columns if name not in table_columns]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        
+        query = select(*[table_columns[name] for name in columns]).order_by(model.id)
+        return self._apply_filters(query, model, filters or {}), columns
+    
+    def iter_batches(self, query, converters=None, batch_size=None):
+        """Yield lists of row lists, fetched yield_per rows at a time from a server-side cursor
+        
+        converters is a list of (column index, function) pairs; by default values are made
+        JSON/CSV friendly.
+        """
+        if converters is None:
+            converters = self._converters(query, self._converter)
+        
+        result = db.session.connection().execute(
+            query.execution_options(yield_per=batch_size or self.batch_size)
+        )
+        try:
+            for partition in result.partitions():
+                rows = [list(row) for row in partition]
+                for index, converter in converters:
+                    for row in rows:
+                        if row[index] is not None:
+                            row[index] = converter(row[index])
+                yield rows
+        finally:
+            result.close()
+    
+    def iter_records(self, query, columns):
+        """Yield one dict per exported row"""
+        for batch in self.iter_batches(query):
+            for row in batch:
+                yield dict(zip(columns, row))
+    
+    def stream(self, query, columns, export_format):
+        """Generator of chunks in csv, ndjson, json (text) or parquet, arrow (bytes), one chunk per batch"""
+        if export_format in COLUMNAR_FORMATS:
+            return self._stream_columnar(query, columns, export_format)
+        if export_format == 'csv':
+            return self._stream_csv(query, columns)
+        if export_format == 'ndjson':
+            return self._stream_ndjson(query, columns)
+        if export_format == 'json':
+            return self._stream_json(query, columns)
+        raise ValueError(f'Unsupported export format: {export_format}')
+    
+    def _stream_csv(self, query, columns):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        # The header goes out before the query runs so the first byte is immediate
+        writer.writerow(columns)
+        yield self._drain(buffer)
+        
+        for batch in self.iter_batches(query):
+            writer.writerows(batch)
+            yield self._drain(buffer)
+    
+    def _stream_ndjson(self, query, columns):
+        for batch in self.iter_batches(query):
+            yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in batch)
+    
+    def _stream_json(self, query, columns):
+        # Same {"success": true, "data": [...]} envelope the JSON API returns, written incrementally
+        yield '{"success": true, "data": ['
+        separator = ''
+        for batch in self.iter_batches(query):
+            chunk = ','.join(json.dumps(dict(zip(columns, row))) for row in batch)
+            yield separator + chunk
+            separator = ','
+        yield ']}'
+    
+    def _stream_columnar(self, query, columns, export_format):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(f'{export_format} exports require pyarrow')
+        
+        schema = pa.schema([
+            pa.field(name, self._arrow_type(pa, column.type))
+            for name, column in zip(columns, query.selected_columns)
+        ])
+        converters = self._converters(query, self._arrow_converter)
+        return self._write_columnar(pa, pq, query, schema, converters, export_format)
+    
+    def _write_columnar(self, pa, pq, query, schema, converters, export_format):
+        # Each cursor batch of row_group_size rows becomes one Parquet row group / Arrow record batch
+        sink = _ByteSink()
+        if export_format == 'parquet':
+            writer = pq.ParquetWriter(sink, schema)
+        else:
+            writer = pa.ipc.new_file(sink, schema)
+        
+        try:
+            for batch in self.iter_batches(query, converters, self.row_group_size):
+                arrays = [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(zip(*batch), schema)
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+    
+    def _drain(self, buffer):
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return text
+    
+    def _converters(self, query, factory):
+        converters = []
+        for index, column in enumerate(query.selected_columns):
+            converter = factory(column.type)
+            if converter:
+                converters.append((index, converter))
+        return converters
+    
+    def _converter(self, column_type):
+        """Conversion to JSON/CSV friendly values for a column type, as the old exports did"""
+        if isinstance(column_type, (DateTime, Date)):
+            return lambda value: value.isoformat()
+        if isinstance(column_type, Numeric) and column_type.asdecimal:
+            return float
+        return None
+    
+    def _arrow_type(self, pa, column_type):
+        """Arrow type for a column type, so every row group shares one schema"""
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        if isinstance(column_type, DateTime):
+            return pa.timestamp('us')
+        if isinstance(column_type, Date):
+            return pa.date32()
+        if isinstance(column_type, Numeric) and column_type.asdecimal and column_type.precision:
+            return pa.decimal128(column_type.precision, column_type.scale or 0)
+        if isinstance(column_type, (Float, Numeric)):
+            return pa.float64()
+        return pa.string()
+    
+    def _arrow_converter(self, column_type):
+        """Conversion for values Arrow cannot take as-is under _arrow_type"""
+        if isinstance(column_type, Numeric) and column_type.asdecimal and not column_type.precision:
+            return float
+        return None
+    
+    def _apply_filters(self, query, model, filters):
+        """Apply the {field: value | {'operator': ..., 'value': ...}} filter syntax"""
+        for field, value in filters.items():
+            if field in model.__table__.columns:
+                column = model.__table__.columns[field]
+                if isinstance(value, dict):
+                    if 'operator' in value and 'value' in value:
+                        if value['operator'] == 'like':
+                            query = query.where(column.like(f"%{value['value']}%"))
+                        elif value['operator'] == 'in':
+                            query = query.where(column.in_(value['value']))
+                        else:
+                            query = query.where(column == value['value'])
+                else:
+                    query = query.where(column == value)
+        
+        return query
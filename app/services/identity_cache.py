@@ -0,0 +1,120 @@
+from app import db
+from app.models.crm import User
+from flask import current_app, g, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+import threading
+import time
+
+DEFAULT_USER_CACHE_TTL = 30
+MAX_CACHED_USERS = 10000
+USER_CACHE_EXTENSION_KEY = 'crm_user_cache'
+SESSION_USERS_CHANGED_KEY = 'crm_users_changed'
+
+class UserCache:
+    """Process-local cache of user rows, so the Flask-Login user loader needs no SELECT per request
+    
+    Column values are cached rather than User objects, which belong to one session; a hit is
+    attached to the current session as an already-loaded instance.
+    """
+    
+    def __init__(self, ttl=DEFAULT_USER_CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+    
+    def load(self, user_id):
+        """The user with this id in the current session, or None if there is none"""
+        key = inspect(User).identity_key_from_primary_key((user_id,))
+        user = db.session.identity_map.get(key)
+        if user is not None:
+            return user
+        
+        with self.lock:
+            cached = self.entries.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            user = User(**cached[0])
+            # Persistent and unmodified, as if just read from the database
+            make_transient_to_detached(user)
+            db.session.add(user)
+            return user
+        
+        user = db.session.get(User, user_id)
+        if user is not None:
+            values = {attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs}
+            with self.lock:
+                if len(self.entries) >= MAX_CACHED_USERS:
+                    self.entries.clear()
+                self.entries[user_id] = (values, time.monotonic())
+        return user
+    
+    def invalidate(self, user_ids=None):
+        """Forget some users, or all of them"""
+        with self.lock:
+            if user_ids is None:
+                self.entries.clear()
+            for user_id in user_ids or ():
+                self.entries.pop(user_id, None)
+
+def get_user_cache():
+    """This app's user cache"""
+    app = current_app._get_current_object()
+    cache = app.extensions.get(USER_CACHE_EXTENSION_KEY)
+    if cache is None:
+        cache = app.extensions[USER_CACHE_EXTENSION_KEY] = UserCache(
+            app.config.get('USER_CACHE_TTL', DEFAULT_USER_CACHE_TTL)
+        )
+    return cache
+
+def load_user(user_id):
+    """Flask-Login user loader served from the user cache"""
+    try:
+        return get_user_cache().load(int(user_id))
+    except (TypeError, ValueError):
+        return None
+
+def _after_flush(session, flush_context):
+    changed = {
+        instance.id for instance in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(instance, User)
+    }
+    if changed:
+        session.info.setdefault(SESSION_USERS_CHANGED_KEY, set()).update(changed)
+
+def _after_transaction_end(session, transaction):
+    # Dropped on rollback too: values this transaction flushed may have been cached before it ended
+    changed = session.info.pop(SESSION_USERS_CHANGED_KEY, None) if transaction.parent is None else None
+    if changed and has_app_context():
+        cache = current_app.extensions.get(USER_CACHE_EXTENSION_KEY)
+        if cache is not None:
+            cache.invalidate(changed)
+
+def register_identity_hooks():
+    """Invalidate cached users when a session changes them (idempotent)"""
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_transaction_end', _after_transaction_end)
+
+def init_identity_cache(app):
+    """Serve the user loader from the user cache and keep each request's loaded rows across its commits
+    
+    With REQUEST_IDENTITY_MAP on, a request's session does not expire its instances on commit, so
+    the session's identity map answers repeated primary-key lookups for the rest of the request
+    instead of reloading each row after every commit. Code that changes rows behind the session's
+    back (bulk UPDATEs, other connections) must expire what it changed, as the bulk services do.
+    """
+    register_identity_hooks()
+    
+    @app.before_request
+    def keep_instances_loaded_across_commits():
+        if app.config.get('REQUEST_IDENTITY_MAP', True):
+            session = db.session()
+            g.identity_map_expire_on_commit = session.expire_on_commit
+            session.expire_on_commit = False
+    
+    @app.teardown_request
+    def restore_expire_on_commit(exception=None):
+        previous = g.pop('identity_map_expire_on_commit', None)
+        if previous is not None:
+            db.session().expire_on_commit = previous
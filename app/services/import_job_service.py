@@ -0,0 +1,256 @@
+from app import db
+from app.models.crm_imports import ImportJob, ImportJobError
+from app.services.import_service import IMPORT_SERVICES, iter_csv_rows
+from app.services.upload_service import ChunkedUploadService, import_folder
+from flask import current_app
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from sqlalchemy import update, or_, and_
+import click
+import logging
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_IMPORT_WORKERS = 2
+DEFAULT_STALE_SECONDS = 300
+POOL_EXTENSION_KEY = 'crm_import_pool'
+
+_pool_lock = threading.Lock()
+
+class ImportJobService:
+    """Service for background import jobs whose state and checkpoints live in import_jobs"""
+    
+    def submit_file(self, entity, file, created_by=None):
+        """Save an uploaded CSV and queue a job importing it"""
+        try:
+            if entity not in IMPORT_SERVICES:
+                return {'success': False, 'error': f'Unsupported import type: {entity}'}
+            
+            path = self._job_path()
+            file.save(path)
+            return self._create_job(entity, path, file.filename, created_by)
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+    
+    def submit_upload(self, entity, upload_id, created_by=None):
+        """Queue a job importing a fully received chunked upload"""
+        try:
+            if entity not in IMPORT_SERVICES:
+                return {'success': False, 'error': f'Unsupported import type: {entity}'}
+            
+            path = self._job_path()
+            if not ChunkedUploadService().claim_upload(upload_id, path):
+                return {'success': False, 'error': 'Upload not found'}
+            return self._create_job(entity, path, f'{upload_id}.csv', created_by)
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+    
+    def get_job(self, job_id):
+        """Get a job's progress"""
+        try:
+            job = ImportJob.query.get(job_id)
+            if not job:
+                return {'success': False, 'error': 'Import job not found'}
+            
+            return {'success': True, 'data': self._job_data(job)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def get_job_errors(self, job_id, page=1, per_page=100):
+        """Get a page of a job's row errors"""
+        try:
+            if not ImportJob.query.get(job_id):
+                return {'success': False, 'error': 'Import job not found'}
+            
+            errors = ImportJobError.query.filter_by(job_id=job_id).order_by(ImportJobError.row).paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            
+            return {
+                'success': True,
+                'data': {
+                    'errors': [{'row': error.row, 'error': error.error} for error in errors.items],
+                    'total': errors.total,
+                    'pages': errors.pages,
+                    'current_page': errors.page,
+                    'per_page': errors.per_page
+                }
+            }
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def run_job(self, job_id):
+        """Claim a queued or abandoned job and run it from its last checkpoint"""
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, self._claimable(now))
+            .values(status='Running', heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return {'success': False, 'error': 'Import job is not available to run'}
+        
+        job = ImportJob.query.get(job_id)
+        job.started_at = job.started_at or now
+        db.session.commit()
+        
+        try:
+            with open(job.source_path, 'rb') as source:
+                def checkpoint(last_row, imported, errors):
+                    # Runs inside the chunk's transaction, so rows and progress commit together
+                    job.rows_processed = last_row
+                    job.imported_count += imported
+                    job.error_count += len(errors)
+                    job.processed_bytes = source.tell()
+                    job.heartbeat_at = datetime.utcnow()
+                    if errors:
+                        db.session.execute(ImportJobError.__table__.insert(), [
+                            {'job_id': job.id, 'row': error['row'], 'error': error['error']} for error in errors
+                        ])
+                
+                # Rows before the checkpoint were committed by an earlier run; skip them
+                rows = islice(iter_csv_rows(source), job.rows_processed, None)
+                result = IMPORT_SERVICES[job.entity]().import_rows(
+                    rows, start_row=job.rows_processed + 1, on_chunk=checkpoint
+                )
+            
+            if result['success']:
+                job.status = 'Completed'
+                job.processed_bytes = job.total_bytes
+            else:
+                job.status = 'Failed'
+                job.error_message = result['error']
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'Failed'
+            job.error_message = str(e)
+        
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        if os.path.exists(job.source_path):
+            os.remove(job.source_path)
+        
+        return {'success': job.status == 'Completed', 'data': self._job_data(job)}
+    
+    def recover_jobs(self):
+        """Ids of queued jobs and of running jobs whose worker stopped sending heartbeats"""
+        return [job_id for job_id, in db.session.query(ImportJob.id).filter(
+            self._claimable(datetime.utcnow())
+        ).order_by(ImportJob.id)]
+    
+    def dispatch(self, job_id):
+        """Hand a job to this process's worker pool, if it has one"""
+        pool = get_import_pool(current_app._get_current_object())
+        if pool is not None:
+            pool.submit(_run_job_in_app, current_app._get_current_object(), job_id)
+    
+    def _create_job(self, entity, path, filename, created_by):
+        job = ImportJob(
+            entity=entity,
+            status='Queued',
+            filename=filename,
+            source_path=path,
+            total_bytes=os.path.getsize(path),
+            created_by=created_by
+        )
+        db.session.add(job)
+        db.session.commit()
+        
+        self.dispatch(job.id)
+        return {'success': True, 'data': self._job_data(job), 'message': 'Import job queued'}
+    
+    def _claimable(self, now):
+        stale_seconds = current_app.config.get('IMPORT_JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+        return or_(
+            ImportJob.status == 'Queued',
+            and_(ImportJob.status == 'Running', ImportJob.heartbeat_at < now - timedelta(seconds=stale_seconds))
+        )
+    
+    def _job_path(self):
+        folder = import_folder()
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f'job-{uuid.uuid4().hex}.csv')
+    
+    def _job_data(self, job):
+        return {
+            'id': job.id,
+            'entity': job.entity,
+            'status': job.status,
+            'filename': job.filename,
+            'rows_processed': job.rows_processed,
+            'imported_count': job.imported_count,
+            'error_count': job.error_count,
+            'progress': round(job.processed_bytes / job.total_bytes * 100, 1) if job.total_bytes else 0,
+            'error_message': job.error_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+
+def _run_job_in_app(app, job_id):
+    with app.app_context():
+        try:
+            ImportJobService().run_job(job_id)
+        except Exception as e:
+            logging.error(f"Import job {job_id} failed: {str(e)}")
+
+def get_import_pool(app):
+    """This process's import worker pool, created on first use; None when IMPORT_WORKERS is 0"""
+    workers = app.config.get('IMPORT_WORKERS', DEFAULT_IMPORT_WORKERS)
+    if not workers:
+        return None
+    
+    with _pool_lock:
+        pool = app.extensions.get(POOL_EXTENSION_KEY)
+        if pool is None:
+            pool = app.extensions[POOL_EXTENSION_KEY] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='crm-import'
+            )
+            # A new process resumes jobs left behind by workers that stopped mid-import
+            try:
+                for job_id in ImportJobService().recover_jobs():
+                    pool.submit(_run_job_in_app, app, job_id)
+            except Exception as e:
+                logging.error(f"Import job recovery failed: {str(e)}")
+            try:
+                ChunkedUploadService().sweep_abandoned_uploads()
+            except Exception as e:
+                logging.error(f"Upload sweep failed: {str(e)}")
+        return pool
+
+@click.command('import-worker')
+@click.option('--once', is_flag=True, help='Run the jobs available now and exit')
+@click.option('--interval', default=5, help='Seconds between polls for new jobs')
+def import_worker_command(once, interval):
+    """Run queued and abandoned import jobs in a dedicated process, and delete abandoned uploads"""
+    service = ImportJobService()
+    uploads = ChunkedUploadService()
+    while True:
+        for job_id in service.recover_jobs():
+            result = service.run_job(job_id)
+            if 'data' in result:
+                click.echo(f"Import job {job_id}: {result['data']['status']}")
+        removed = uploads.sweep_abandoned_uploads()
+        if removed:
+            click.echo(f"Deleted {removed} abandoned uploads")
+        if once:
+            break
+        time.sleep(interval)
+
+def init_import_jobs(app):
+    """Register the import-worker CLI command and start the worker pool with the first request"""
+    app.cli.add_command(import_worker_command)
+    
+    @app.before_request
+    def start_import_workers():
+        if POOL_EXTENSION_KEY not in app.extensions:
+            get_import_pool(app)
@@ -0,0 +1,279 @@
+from app import db
+from app.models.crm import Lead, Account, Contact
+from app.analytics.counters import apply_row_deltas
+from app.analytics.rollups import queue_row_days
+from app.services.scoring_service import LeadRow, get_scoring_rules
+from flask import current_app
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+
+DEFAULT_IMPORT_CHUNK_SIZE = 1000
+
+def iter_csv_rows(stream, encoding='utf-8-sig'):
+    """Yield dict rows from a binary stream, decoding and parsing it incrementally"""
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        for row in csv.DictReader(text):
+            yield row
+    finally:
+        # Leave the underlying stream open for its owner to close
+        text.detach()
+
+class RowError(ValueError):
+    """A single import row failed validation"""
+
+class BulkImportService:
+    """Set-based importer: validates, de-duplicates and inserts rows one chunk per transaction"""
+    
+    model = None
+    required_fields = []
+    unique_field = None
+    duplicate_error = 'Record already exists'
+    
+    def __init__(self, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_IMPORT_CHUNK_SIZE)
+        self.chunk_size = chunk_size
+    
+    def import_rows(self, rows, start_row=1, on_chunk=None):
+        """Import an iterable of row dicts (e.g. a csv.DictReader); row numbers in the error report start at start_row
+        
+        on_chunk(last_row_number, imported_count, errors) runs inside each chunk's transaction
+        just before it commits, so callers can checkpoint progress atomically with the rows.
+        Errors handed to on_chunk are not also kept in the returned report.
+        """
+        try:
+            self.prepare()
+            imported_count = 0
+            error_count = 0
+            errors = []
+            
+            chunk = []
+            for row_number, row in enumerate(rows, start_row):
+                chunk.append((row_number, row))
+                if len(chunk) >= self.chunk_size:
+                    imported, chunk_errors = self.import_chunk(chunk, on_chunk)
+                    imported_count += imported
+                    error_count += len(chunk_errors)
+                    if on_chunk is None:
+                        errors.extend(chunk_errors)
+                    chunk = []
+            if chunk:
+                imported, chunk_errors = self.import_chunk(chunk, on_chunk)
+                imported_count += imported
+                error_count += len(chunk_errors)
+                if on_chunk is None:
+                    errors.extend(chunk_errors)
+            
+            return {
+                'success': True,
+                'data': {
+                    'imported_count': imported_count,
+                    'error_count': error_count,
+                    'errors': errors
+                }
+            }
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+    
+    def prepare(self):
+        """Load anything needed for every chunk, once per import"""
+        pass
+    
+    def build_values(self, row, now):
+        """Convert a row dict into column values, raising RowError for invalid rows"""
+        raise NotImplementedError
+    
+    def import_chunk(self, chunk, on_chunk=None):
+        """Insert one chunk of (row_number, row) pairs and commit; returns (imported, errors)"""
+        now = datetime.utcnow()
+        errors = []
+        candidates = []
+        for row_number, row in chunk:
+            try:
+                for field in self.required_fields:
+                    if field not in row or not row[field]:
+                        raise RowError(self.required_error(field))
+                candidates.append((row_number, self.build_values(row, now)))
+            except RowError as e:
+                errors.append({'row': row_number, 'error': str(e)})
+        
+        # One query finds every key of the chunk already in the table
+        column = getattr(self.model, self.unique_field)
+        keys = {values[self.unique_field] for _, values in candidates}
+        existing = set()
+        if keys:
+            existing = {key for key, in db.session.query(column).filter(column.in_(keys))}
+        
+        values_list = []
+        seen = set()
+        for row_number, values in candidates:
+            key = values[self.unique_field]
+            if key in existing or key in seen:
+                errors.append({'row': row_number, 'error': self.duplicate_error})
+                continue
+            seen.add(key)
+            values_list.append((row_number, values))
+        
+        last_row = chunk[-1][0]
+        try:
+            if values_list:
+                self._insert([values for _, values in values_list])
+            imported = len(values_list)
+        except Exception:
+            # A row the set-based checks could not catch failed; retry one row at a time to isolate it
+            db.session.rollback()
+            imported = self._insert_rows_individually(values_list, errors)
+        
+        errors.sort(key=lambda error: error['row'])
+        if on_chunk is not None:
+            on_chunk(last_row, imported, errors)
+        db.session.commit()
+        return imported, errors
+    
+    def required_error(self, field):
+        """Error reported for a missing required field"""
+        return f'{field} is required'
+    
+    def _insert(self, rows):
+        """executemany INSERT plus the counter and rollup bookkeeping the ORM hooks would do"""
+        connection = db.session.connection()
+        connection.execute(self.model.__table__.insert(), rows)
+        apply_row_deltas(connection, self.model, rows)
+        queue_row_days(connection, self.model, rows)
+    
+    def _insert_rows_individually(self, values_list, errors):
+        imported = 0
+        for row_number, values in values_list:
+            try:
+                with db.session.begin_nested():
+                    self._insert([values])
+                imported += 1
+            except Exception as e:
+                errors.append({'row': row_number, 'error': str(e)})
+        return imported
+    
+    def _number(self, row, field, cast):
+        """Parse an optional numeric field; blank values become None"""
+        value = row.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        try:
+            return cast(value)
+        except (TypeError, ValueError, InvalidOperation):
+            raise RowError(f'{field} must be a number')
+
+class LeadImportService(BulkImportService):
+    """Bulk lead importer with scoring applied before insert"""
+    
+    model = Lead
+    required_fields = ['first_name', 'last_name', 'email']
+    unique_field = 'email'
+    duplicate_error = 'Lead with this email already exists'
+    
+    def prepare(self):
+        """Compile the active scoring rules once for the whole import"""
+        self.scoring_rules = get_scoring_rules()
+    
+    def build_values(self, row, now):
+        """Map a CSV row onto lead columns with create_lead's defaults"""
+        values = {
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'email': row['email'],
+            'phone': row.get('phone'),
+            'company': row.get('company'),
+            'job_title': row.get('job_title'),
+            'industry': row.get('industry'),
+            'source': row.get('source', 'Manual'),
+            'status': row.get('status', 'New'),
+            'budget': self._number(row, 'budget', lambda value: Decimal(str(value))),
+            'timeline': row.get('timeline'),
+            'notes': row.get('notes'),
+            'assigned_to': self._number(row, 'assigned_to', int),
+            'created_at': now,
+            'updated_at': now
+        }
+        values['score'] = self.score(values)
+        return values
+    
+    def score(self, values):
+        """Score column values against the compiled rules, as score_lead does"""
+        lead = LeadRow({column.key: values.get(column.key) for column in Lead.__table__.columns})
+        try:
+            return self.scoring_rules.score(lead)
+        except Exception:
+            # score_lead leaves the default score when a rule cannot be evaluated
+            return 0
+
+class AccountImportService(BulkImportService):
+    """Bulk account importer"""
+    
+    model = Account
+    required_fields = ['name']
+    unique_field = 'name'
+    duplicate_error = 'Account with this name already exists'
+    
+    def required_error(self, field):
+        return 'Account name is required'
+    
+    def build_values(self, row, now):
+        """Map a CSV row onto account columns with create_account's defaults"""
+        return {
+            'name': row['name'],
+            'industry': row.get('industry'),
+            'website': row.get('website'),
+            'phone': row.get('phone'),
+            'email': row.get('email'),
+            'address': row.get('address'),
+            'city': row.get('city'),
+            'state': row.get('state'),
+            'country': row.get('country'),
+            'postal_code': row.get('postal_code'),
+            'annual_revenue': self._number(row, 'annual_revenue', lambda value: Decimal(str(value))),
+            'employee_count': self._number(row, 'employee_count', int),
+            'status': row.get('status', 'Active'),
+            'type': row.get('type'),
+            'parent_account_id': self._number(row, 'parent_account_id', int),
+            'territory_id': self._number(row, 'territory_id', int),
+            'assigned_to': self._number(row, 'assigned_to', int),
+            'created_at': now,
+            'updated_at': now
+        }
+
+class ContactImportService(BulkImportService):
+    """Bulk contact importer"""
+    
+    model = Contact
+    required_fields = ['first_name', 'last_name', 'email']
+    unique_field = 'email'
+    duplicate_error = 'Contact with this email already exists'
+    
+    def build_values(self, row, now):
+        """Map a CSV row onto contact columns with create_contact's defaults"""
+        return {
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'email': row['email'],
+            'phone': row.get('phone'),
+            'mobile': row.get('mobile'),
+            'job_title': row.get('job_title'),
+            'department': row.get('department'),
+            'account_id': self._number(row, 'account_id', int),
+            'lead_source': row.get('lead_source'),
+            'status': row.get('status', 'Active'),
+            'preferred_contact_method': row.get('preferred_contact_method'),
+            'notes': row.get('notes'),
+            'assigned_to': self._number(row, 'assigned_to', int),
+            'created_at': now,
+            'updated_at': now
+        }
+
+IMPORT_SERVICES = {
+    'leads': LeadImportService,
+    'accounts': AccountImportService,
+    'contacts': ContactImportService
+}
@@ -1,8 +1,13 @@
 from app import db
 from app.models.crm import Lead, Activity, Opportunity, User
-from app.models.crm_business_processes import LeadScoring, Campaign
+from app.models.crm_business_processes import Campaign
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_
+from app.analytics.vectorized import VectorizedReportEngine
+from app.services.scoring_service import LeadScoringService
+from app.services.pagination import keyset_paginate
+from app.services.entity_cache import get_entity
+from app.services.loading import apply_load_profile
 import json
 
 class LeadService:
@@ -50,10 +55,13 @@ class LeadService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def get_lead(self, lead_id):
+    def get_lead(self, lead_id, load=None):
         """Get a lead by ID"""
         try:
-            lead = Lead.query.get(lead_id)
+            if load is None:
+                lead = get_entity(Lead, lead_id)
+            else:
+                lead = apply_load_profile(Lead.query, Lead, load).get(lead_id)
             if not lead:
                 return {'success': False, 'error': 'Lead not found'}
             
@@ -61,15 +69,21 @@ class LeadService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_leads(self, filters=None, page=1, per_page=20):
+    def get_leads(self, filters=None, page=1, per_page=20, cursor=None, limit=None,
+                  sort='created_at', order='desc', with_total=False, load=None):
         """Get leads with optional filtering and pagination"""
         try:
-            query = Lead.query
+            query = apply_load_profile(Lead.query, Lead, load)
             
             # Apply filters
             if filters:
                 query = self._apply_filters(query, filters)
             
+            if cursor is not None:
+                data = keyset_paginate(query, Lead, cursor, limit or per_page, sort, order, filters, with_total)
+                data['leads'] = data.pop('items')
+                return {'success': True, 'data': data}
+            
             # Apply pagination
             leads = query.paginate(
                 page=page, 
@@ -102,6 +116,9 @@ class LeadService:
                 if hasattr(lead, field) and field not in ['id', 'created_at']:
                     setattr(lead, field, value)
             
+            # Re-evaluate just the scoring rules that read a changed field, in this same commit
+            LeadScoringService().rescore_changed(lead)
+            
             lead.updated_at = datetime.utcnow()
             db.session.commit()
             
@@ -163,15 +180,8 @@ class LeadService:
             if not lead:
                 return {'success': False, 'error': 'Lead not found'}
             
-            # Get active scoring rules
-            scoring_rules = LeadScoring.query.filter_by(is_active=True).all()
-            
-            total_score = 0
-            for rule in scoring_rules:
-                if rule.criteria:
-                    criteria = rule.criteria
-                    rule_score = self._calculate_rule_score(lead, criteria)
-                    total_score += rule_score
+            # Rules are compiled once and cached until a LeadScoring row changes
+            total_score = LeadScoringService().score(lead)
             
             lead.score = total_score
             db.session.commit()
@@ -181,6 +191,10 @@ class LeadService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
+    def rescore_all(self):
+        """Recompute every lead's score after scoring rules change"""
+        return LeadScoringService().rescore_all()
+    
     def nurture_lead(self, lead_id, nurturing_data):
         """Nurture a lead with automated activities"""
         try:
@@ -258,162 +272,31 @@ class LeadService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def import_leads(self, file_data):
+    def import_leads(self, file_data, start_row=1):
         """Import leads from file"""
-        try:
-            # This would typically handle CSV/Excel file parsing
-            # For now, we'll assume file_data is a list of dictionaries
-            imported_count = 0
-            errors = []
-            
-            for row in file_data:
-                try:
-                    result = self.create_lead(row)
-                    if result['success']:
-                        imported_count += 1
-                    else:
-                        errors.append(f"Row {row}: {result['error']}")
-                except Exception as e:
-                    errors.append(f"Row {row}: {str(e)}")
-            
-            return {
-                'success': True,
-                'data': {
-                    'imported_count': imported_count,
-                    'error_count': len(errors),
-                    'errors': errors
-                }
-            }
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        from app.services.import_service import LeadImportService
+        return LeadImportService().import_rows(file_data, start_row=start_row)
     
     def export_leads(self, filters=None):
         """Export leads to file"""
         try:
-            query = Lead.query
+            from app.services.export_service import ExportService, LEAD_EXPORT_FIELDS
+            export_service = ExportService()
+            query, columns = export_service.build_query('leads', filters, LEAD_EXPORT_FIELDS)
             
-            # Apply filters
-            if filters:
-                query = self._apply_filters(query, filters)
-            
-            leads = query.all()
-            
-            # Convert to export format
-            export_data = []
-            for lead in leads:
-                export_data.append({
-                    'id': lead.id,
-                    'first_name': lead.first_name,
-                    'last_name': lead.last_name,
-                    'email': lead.email,
-                    'phone': lead.phone,
-                    'company': lead.company,
-                    'job_title': lead.job_title,
-                    'industry': lead.industry,
-                    'source': lead.source,
-                    'status': lead.status,
-                    'score': lead.score,
-                    'budget': float(lead.budget) if lead.budget else None,
-                    'timeline': lead.timeline,
-                    'notes': lead.notes,
-                    'created_at': lead.created_at.isoformat() if lead.created_at else None,
-                    'updated_at': lead.updated_at.isoformat() if lead.updated_at else None
-                })
-            
-            return {'success': True, 'data': export_data}
+            return {'success': True, 'data': list(export_service.iter_records(query, columns))}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
     def generate_lead_reports(self):
         """Generate lead reports"""
         try:
-            leads = Lead.query.all()
-            
-            report = {
-                'total_leads': len(leads),
-                'by_status': {},
-                'by_source': {},
-                'by_industry': {},
-                'by_score_range': {
-                    '0-25': 0,
-                    '26-50': 0,
-                    '51-75': 0,
-                    '76-100': 0
-                },
-                'conversion_rate': 0,
-                'average_score': 0
-            }
-            
-            converted_count = 0
-            total_score = 0
-            
-            for lead in leads:
-                # By status
-                status = lead.status
-                if status not in report['by_status']:
-                    report['by_status'][status] = 0
-                report['by_status'][status] += 1
-                
-                # By source
-                source = lead.source or 'Unknown'
-                if source not in report['by_source']:
-                    report['by_source'][source] = 0
-                report['by_source'][source] += 1
-                
-                # By industry
-                industry = lead.industry or 'Unknown'
-                if industry not in report['by_industry']:
-                    report['by_industry'][industry] = 0
-                report['by_industry'][industry] += 1
-                
-                # By score range
-                score = lead.score or 0
-                if score <= 25:
-                    report['by_score_range']['0-25'] += 1
-                elif score <= 50:
-                    report['by_score_range']['26-50'] += 1
-                elif score <= 75:
-                    report['by_score_range']['51-75'] += 1
-                else:
-                    report['by_score_range']['76-100'] += 1
-                
-                # Conversion count
-                if lead.status == 'Converted':
-                    converted_count += 1
-                
-                total_score += score
-            
-            report['conversion_rate'] = (converted_count / len(leads) * 100) if leads else 0
-            report['average_score'] = (total_score / len(leads)) if leads else 0
+            report = VectorizedReportEngine().lead_report()
             
             return {'success': True, 'data': report}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def _calculate_rule_score(self, lead, criteria):
-        """Calculate score based on scoring criteria"""
-        score = 0
-        
-        for criterion in criteria:
-            field = criterion.get('field')
-            operator = criterion.get('operator')
-            value = criterion.get('value')
-            points = criterion.get('points', 0)
-            
-            if hasattr(lead, field):
-                field_value = getattr(lead, field)
-                
-                if operator == 'equals' and field_value == value:
-                    score += points
-                elif operator == 'contains' and value in str(field_value):
-                    score += points
-                elif operator == 'greater_than' and field_value > value:
-                    score += points
-                elif operator == 'less_than' and field_value < value:
-                    score += points
-        
-        return score
-    
     def _apply_filters(self, query, filters):
         """Apply filters to query"""
         for field, value in filters.items():
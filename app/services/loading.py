@@ -0,0 +1,112 @@
+from app import db
+from app.models.crm import Lead, Account, Contact, Opportunity, Activity, Quote
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
+
+# Relationships each view renders, per model: many-to-one references are joined into the main
+# query, collections are read with one SELECT ... WHERE ... IN (...) for the whole page
+LOAD_PROFILES = {
+    Lead: {
+        'list': lambda: [],
+        'detail': lambda: [
+            joinedload(Lead.user),
+            selectinload(Lead.activities),
+            selectinload(Lead.opportunities)
+        ]
+    },
+    Account: {
+        # The list only shows collection sizes, counted by COUNT_PROFILES
+        'list': lambda: [],
+        'detail': lambda: [
+            joinedload(Account.user),
+            joinedload(Account.parent),
+            joinedload(Account.territory),
+            selectinload(Account.child_accounts),
+            selectinload(Account.contacts),
+            selectinload(Account.opportunities),
+            selectinload(Account.activities)
+        ]
+    },
+    Contact: {
+        'list': lambda: [joinedload(Contact.account)],
+        'detail': lambda: [
+            joinedload(Contact.account),
+            joinedload(Contact.user),
+            selectinload(Contact.activities),
+            selectinload(Contact.opportunities)
+        ]
+    },
+    Opportunity: {
+        'list': lambda: [joinedload(Opportunity.account)],
+        'detail': lambda: [
+            joinedload(Opportunity.account),
+            joinedload(Opportunity.contact),
+            joinedload(Opportunity.lead),
+            joinedload(Opportunity.user),
+            selectinload(Opportunity.activities),
+            selectinload(Opportunity.quotes).selectinload(Quote.quote_items)
+        ]
+    },
+    Activity: {
+        'list': lambda: [],
+        'detail': lambda: [
+            joinedload(Activity.lead),
+            joinedload(Activity.account),
+            joinedload(Activity.contact),
+            joinedload(Activity.opportunity),
+            joinedload(Activity.user)
+        ]
+    },
+    Quote: {
+        'list': lambda: [joinedload(Quote.opportunity)],
+        'detail': lambda: [
+            joinedload(Quote.opportunity),
+            joinedload(Quote.creator),
+            selectinload(Quote.quote_items)
+        ]
+    }
+}
+
+# Collection sizes each view shows, per model: the attribute set on each row and the relationship
+# it counts, read with one grouped COUNT for the whole page instead of loading the collections
+COUNT_PROFILES = {
+    Account: {
+        'list': lambda: {'contact_count': Account.contacts, 'opportunity_count': Account.opportunities}
+    }
+}
+
+_built_profiles = {}
+
+def load_options(model, profile):
+    """Loader options for one of a model's view profiles ('list', 'detail'); none for profile None"""
+    if profile is None:
+        return []
+    
+    key = (model, profile)
+    if key not in _built_profiles:
+        profiles = LOAD_PROFILES.get(model, {})
+        if profile not in profiles:
+            raise ValueError(f'Unknown load profile for {model.__name__}: {profile}')
+        # Built on first use, once backrefs exist on the mapped classes; the options are immutable
+        _built_profiles[key] = profiles[profile]()
+    return _built_profiles[key]
+
+def apply_load_profile(query, model, profile):
+    """The query with a view profile's loader options applied"""
+    options = load_options(model, profile)
+    return query.options(*options) if options else query
+
+def attach_counts(rows, model, profile):
+    """Set a view profile's collection counts (see COUNT_PROFILES) on each of rows"""
+    counts = COUNT_PROFILES.get(model, {}).get(profile) if profile else None
+    if counts is None or not rows:
+        return
+    
+    for attribute, relationship in counts().items():
+        (local, remote), = relationship.property.local_remote_pairs
+        keys = {getattr(row, local.key) for row in rows}
+        found = dict(db.session.execute(
+            select(remote, func.count()).where(remote.in_(keys)).group_by(remote)
+        ).all())
+        for row in rows:
+            setattr(row, attribute, found.get(getattr(row, local.key), 0))
@@ -2,6 +2,9 @@ from app import db
 from app.models.crm import Opportunity, Account, Contact, Lead, Activity, Quote
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_
+from app.analytics.vectorized import VectorizedReportEngine
+from app.services.pagination import keyset_paginate
+from app.services.loading import apply_load_profile
 import json
 
 class OpportunityService:
@@ -40,10 +43,10 @@ class OpportunityService:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
     
-    def get_opportunity(self, opportunity_id):
+    def get_opportunity(self, opportunity_id, load=None):
         """Get an opportunity by ID"""
         try:
-            opportunity = Opportunity.query.get(opportunity_id)
+            opportunity = apply_load_profile(Opportunity.query, Opportunity, load).get(opportunity_id)
             if not opportunity:
                 return {'success': False, 'error': 'Opportunity not found'}
             
@@ -51,15 +54,21 @@ class OpportunityService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_opportunities(self, filters=None, page=1, per_page=20):
+    def get_opportunities(self, filters=None, page=1, per_page=20, cursor=None, limit=None,
+                          sort='created_at', order='desc', with_total=False, load=None):
         """Get opportunities with optional filtering and pagination"""
         try:
-            query = Opportunity.query
+            query = apply_load_profile(Opportunity.query, Opportunity, load)
             
             # Apply filters
             if filters:
                 query = self._apply_filters(query, filters)
             
+            if cursor is not None:
+                data = keyset_paginate(query, Opportunity, cursor, limit or per_page, sort, order, filters, with_total)
+                data['opportunities'] = data.pop('items')
+                return {'success': True, 'data': data}
+            
             # Apply pagination
             opportunities = query.paginate(
                 page=page, 
@@ -287,47 +296,7 @@ class OpportunityService:
     def generate_opportunity_reports(self):
         """Generate opportunity reports"""
         try:
-            opportunities = Opportunity.query.all()
-            
-            report = {
-                'total_opportunities': len(opportunities),
-                'by_stage': {},
-                'by_type': {},
-                'by_source': {},
-                'total_pipeline_value': 0,
-                'weighted_pipeline_value': 0,
-                'won_value': 0,
-                'lost_value': 0
-            }
-            
-            for opp in opportunities:
-                # By stage
-                stage = opp.stage
-                if stage not in report['by_stage']:
-                    report['by_stage'][stage] = {'count': 0, 'value': 0}
-                report['by_stage'][stage]['count'] += 1
-                if opp.amount:
-                    report['by_stage'][stage]['value'] += float(opp.amount)
-                    report['total_pipeline_value'] += float(opp.amount)
-                    report['weighted_pipeline_value'] += float(opp.amount) * (opp.probability or 0) / 100
-                
-                # By type
-                opp_type = opp.type or 'Unknown'
-                if opp_type not in report['by_type']:
-                    report['by_type'][opp_type] = 0
-                report['by_type'][opp_type] += 1
-                
-                # By source
-                source = opp.source or 'Unknown'
-                if source not in report['by_source']:
-                    report['by_source'][source] = 0
-                report['by_source'][source] += 1
-                
-                # Won/Lost values
-                if opp.stage == 'Closed Won' and opp.amount:
-                    report['won_value'] += float(opp.amount)
-                elif opp.stage == 'Closed Lost' and opp.amount:
-                    report['lost_value'] += float(opp.amount)
+            report = VectorizedReportEngine().opportunity_report()
             
             return {'success': True, 'data': report}
         except Exception as e:
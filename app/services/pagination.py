@@ -0,0 +1,154 @@
+from app import db
+from app.analytics.counters import CounterService
+from flask import current_app
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, tuple_
+import base64
+import json
+import time
+
+DEFAULT_MAX_LIMIT = 500
+DEFAULT_TOTAL_TTL = 60
+TOTALS_EXTENSION_KEY = 'crm_pagination_totals'
+MAX_CACHED_TOTALS = 1000
+
+# Unfiltered totals are read from the materialized counters instead of COUNT(*)
+COUNTER_TOTALS = {
+    'leads': 'leads',
+    'accounts': 'accounts',
+    'contacts': 'contacts',
+    'opportunities': 'opportunities',
+    'activities': 'activities'
+}
+
+def sortable_columns(model):
+    """Columns keyset pages may be sorted by: created_at and any indexed column"""
+    table = model.__table__
+    names = {'created_at'} if 'created_at' in table.columns else set()
+    for column in table.columns:
+        if column.primary_key or column.index or column.unique:
+            names.add(column.key)
+    for index in table.indexes:
+        names.add(index.columns.values()[0].key)
+    return names
+
+def encode_cursor(sort, order, value, last_id):
+    """Opaque cursor for the row after (value, last_id) in the given ordering"""
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, last_id], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, column):
+    """(sort, order, value, last_id) from a cursor, with the value converted back to the column's type"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort, order, value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if value is not None:
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+        return sort, order, value, int(last_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def keyset_paginate(query, model, cursor='', limit=20, sort='created_at', order='desc', filters=None, with_total=False):
+    """One page of query ordered by (sort, id), starting after the cursor
+    
+    Rows are found by seeking past the last (sort value, id) seen rather than by OFFSET, so a
+    deep page costs the same as the first. Returns the items, the cursor of the next page
+    (None on the last page) and, if requested, a total served from counters or a short-lived cache.
+    """
+    table = model.__table__
+    if sort not in sortable_columns(model):
+        raise ValueError(f'Cannot sort by {sort}')
+    if order not in ('asc', 'desc'):
+        raise ValueError(f'Invalid order: {order}')
+    max_limit = current_app.config.get('PAGINATION_MAX_LIMIT', DEFAULT_MAX_LIMIT)
+    limit = max(1, min(int(limit), max_limit))
+    
+    column = table.columns[sort]
+    id_column = table.columns['id']
+    position = None
+    if cursor:
+        cursor_sort, cursor_order, value, last_id = decode_cursor(cursor, column)
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise ValueError('Invalid cursor')
+        position = (value, last_id)
+    
+    # One extra row tells whether another page exists without counting
+    items = _seek(query, column, id_column, position, order == 'desc', limit + 1)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(sort, order, getattr(last, sort), last.id)
+    
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'limit': limit,
+        'sort': sort,
+        'order': order,
+        'total': _total(query, table.name, filters) if with_total else None
+    }
+
+def _seek(query, column, id_column, position, descending, count):
+    """Up to count rows after position in ORDER BY column, id, each read with an index range scan
+    
+    A nullable sort column is walked as two segments, its NULL rows and its valued rows, in the
+    order the dialect sorts NULLs, so neither needs an OR that would defeat the index.
+    """
+    direction = (lambda clause: clause.desc()) if descending else (lambda clause: clause.asc())
+    after = (lambda left, right: left < right) if descending else (lambda left, right: left > right)
+    
+    segments = ['values']
+    if column.nullable:
+        # SQLite and MySQL sort NULL below every value, PostgreSQL above
+        nulls_low = db.session.get_bind().dialect.name != 'postgresql'
+        segments.insert(0 if nulls_low != descending else 1, 'nulls')
+    if position is not None:
+        segments = segments[segments.index('nulls' if position[0] is None else 'values'):]
+    
+    rows = []
+    for segment in segments:
+        if segment == 'nulls':
+            segment_query = query.filter(column.is_(None))
+            if position is not None and position[0] is None:
+                segment_query = segment_query.filter(after(id_column, position[1]))
+            segment_query = segment_query.order_by(direction(id_column))
+        elif column is id_column:
+            segment_query = query
+            if position is not None:
+                segment_query = segment_query.filter(after(id_column, position[1]))
+            segment_query = segment_query.order_by(direction(id_column))
+        else:
+            segment_query = query.filter(column.isnot(None))
+            if position is not None and position[0] is not None:
+                segment_query = segment_query.filter(after(tuple_(column, id_column), position))
+            segment_query = segment_query.order_by(direction(column), direction(id_column))
+        
+        rows.extend(segment_query.limit(count - len(rows)).all())
+        if len(rows) >= count:
+            break
+    return rows
+
+def _total(query, name, filters):
+    if not filters and name in COUNTER_TOTALS:
+        counters = CounterService().get_counters([COUNTER_TOTALS[name]])
+        return counters.get((COUNTER_TOTALS[name], ''), (0, 0))[0]
+    
+    app = current_app._get_current_object()
+    totals = app.extensions.setdefault(TOTALS_EXTENSION_KEY, {})
+    key = (name, json.dumps(filters, sort_keys=True, default=str))
+    ttl = app.config.get('PAGINATION_TOTAL_TTL', DEFAULT_TOTAL_TTL)
+    cached = totals.get(key)
+    if cached is not None and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    
+    total = query.order_by(None).count()
+    if len(totals) >= MAX_CACHED_TOTALS:
+        totals.clear()
+    totals[key] = (total, time.monotonic())
+    return total
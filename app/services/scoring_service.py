@@ -0,0 +1,328 @@
+from app import db
+from app.models.crm import Lead
+from app.models.crm_business_processes import LeadScoring
+from flask import current_app
+from datetime import datetime
+from sqlalchemy import Integer, Numeric, String, Text, bindparam, case, event, func, inspect, literal, or_, select, update
+from sqlalchemy.orm import Session
+import click
+import time
+
+DEFAULT_RULES_TTL = 60
+DEFAULT_RESCORE_CHUNK_SIZE = 5000
+RULES_EXTENSION_KEY = 'crm_scoring_rules'
+SESSION_RULES_CHANGED_KEY = 'crm_scoring_rules_changed'
+
+# Lead attributes that are not columns, with the columns they are computed from
+DERIVED_FIELDS = {'full_name': ('first_name', 'last_name')}
+
+_MISSING = object()
+
+class LeadRow:
+    """Lightweight stand-in for a Lead built from column values, for scoring rows that are not ORM objects"""
+    
+    full_name = Lead.__dict__['full_name']
+    
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+def compile_criterion(criterion):
+    """Compile one {'field', 'operator', 'value', 'points'} criterion into a function of a lead"""
+    field = criterion.get('field')
+    operator = criterion.get('operator')
+    value = criterion.get('value')
+    points = criterion.get('points', 0)
+    
+    if operator == 'equals':
+        matches = lambda field_value: field_value == value
+    elif operator == 'contains':
+        matches = lambda field_value: value in str(field_value)
+    elif operator == 'greater_than':
+        matches = lambda field_value: field_value > value
+    elif operator == 'less_than':
+        matches = lambda field_value: field_value < value
+    else:
+        return None
+    
+    def score(lead):
+        field_value = getattr(lead, field, _MISSING)
+        if field_value is _MISSING:
+            return 0
+        return points if matches(field_value) else 0
+    
+    return score
+
+class CompiledScoringRules:
+    """Active lead scoring rules compiled once into Python closures and, where possible, one SQL expression"""
+    
+    def __init__(self, criteria_lists):
+        self.criteria = [criterion for criteria in criteria_lists for criterion in criteria]
+        self.rules = [
+            [scorer for scorer in map(compile_criterion, criteria) if scorer]
+            for criteria in criteria_lists
+        ]
+        self.scorers = [scorer for scorers in self.rules for scorer in scorers]
+        
+        # Dependency index: lead column -> positions of the rules that read it
+        self.dependencies = {}
+        self.unindexed = set()
+        for position, criteria in enumerate(criteria_lists):
+            for criterion in criteria:
+                field = criterion.get('field')
+                if field in Lead.__table__.columns:
+                    columns = (field,)
+                else:
+                    columns = DERIVED_FIELDS.get(field)
+                if columns is None:
+                    # Not something an update can be traced to; re-evaluate on any change
+                    self.unindexed.add(position)
+                    continue
+                for column in columns:
+                    self.dependencies.setdefault(column, set()).add(position)
+    
+    def score(self, lead):
+        """Total points a lead (or LeadRow) earns; raises like the rules did when a comparison is invalid"""
+        return sum(scorer(lead) for scorer in self.scorers)
+    
+    def affected_rules(self, fields):
+        """Positions of the rules whose outcome can change when the given columns change"""
+        positions = set(self.unindexed) if fields else set()
+        for field in fields:
+            positions |= self.dependencies.get(field, set())
+        return positions
+    
+    def score_rules(self, lead, positions):
+        """Points a lead earns from the given rules only"""
+        return sum(scorer(lead) for position in positions for scorer in self.rules[position])
+    
+    def sql_score(self, dialect):
+        """(score expression, skip condition) over the leads table, or None when a criterion needs Python
+        
+        Rows matching the skip condition are ones the Python rules cannot score (a comparison
+        against NULL), which keep their current score just as score_lead leaves them.
+        """
+        terms = []
+        skips = []
+        for criterion in self.criteria:
+            compiled = self._sql_criterion(criterion, dialect)
+            if compiled is None:
+                return None
+            if compiled is True:
+                continue
+            term, skip = compiled
+            terms.append(term)
+            if skip is not None:
+                skips.append(skip)
+        
+        score = sum(terms[1:], terms[0]) if terms else literal(0)
+        return score, or_(*skips) if skips else None
+    
+    def _sql_criterion(self, criterion, dialect):
+        """(CASE term, skip condition), True for a criterion that never scores, or None"""
+        field = criterion.get('field')
+        operator = criterion.get('operator')
+        value = criterion.get('value')
+        points = criterion.get('points', 0)
+        
+        if operator not in ('equals', 'contains', 'greater_than', 'less_than'):
+            return True
+        if not isinstance(points, (int, float)) or isinstance(points, bool) or not isinstance(field, str):
+            return None
+        if field not in Lead.__table__.columns:
+            return True if not hasattr(Lead, field) else None
+        
+        column = Lead.__table__.columns[field]
+        text_column = isinstance(column.type, (String, Text))
+        number_column = isinstance(column.type, (Integer, Numeric))
+        number_value = isinstance(value, (int, float)) and not isinstance(value, bool)
+        
+        if operator == 'equals':
+            if value is None:
+                condition = column.is_(None)
+            elif (text_column and isinstance(value, str)) or (number_column and isinstance(value, int) and not isinstance(value, bool)):
+                # Float equality is left to Python, where Decimal('0.10') != 0.1
+                condition = column == value
+            else:
+                return None
+            return case((condition, points), else_=0), None
+        
+        if operator == 'contains':
+            # str(None) is 'None', and the match is case-sensitive
+            if not text_column or not isinstance(value, str):
+                return None
+            if dialect == 'sqlite':
+                position = func.instr(func.coalesce(column, 'None'), value)
+            elif dialect == 'postgresql':
+                position = func.strpos(func.coalesce(column, 'None'), value)
+            else:
+                return None
+            return case((position > 0, points), else_=0), None
+        
+        if not number_column or not number_value:
+            return None
+        condition = column > value if operator == 'greater_than' else column < value
+        return case((condition, points), else_=0), column.is_(None)
+
+def get_scoring_rules():
+    """The compiled active scoring rules, recompiled after a LeadScoring change or SCORING_RULES_TTL"""
+    app = current_app._get_current_object()
+    cached = app.extensions.get(RULES_EXTENSION_KEY)
+    ttl = app.config.get('SCORING_RULES_TTL', DEFAULT_RULES_TTL)
+    if cached is not None and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    
+    criteria_lists = [
+        rule.criteria for rule in LeadScoring.query.filter_by(is_active=True).order_by(LeadScoring.id)
+        if rule.criteria
+    ]
+    rules = CompiledScoringRules(criteria_lists)
+    app.extensions[RULES_EXTENSION_KEY] = (rules, time.monotonic())
+    return rules
+
+def invalidate_scoring_rules():
+    """Drop this process's compiled rules so the next score recompiles them"""
+    current_app.extensions.pop(RULES_EXTENSION_KEY, None)
+
+class LeadScoringService:
+    """Service applying compiled scoring rules to one lead or the whole leads table"""
+    
+    def score(self, lead):
+        """Points a lead earns under the active rules"""
+        return get_scoring_rules().score(lead)
+    
+    def rescore_changed(self, lead):
+        """Adjust a lead's pending score for its pending attribute changes, before the caller commits
+        
+        Only rules that read a changed column are evaluated, against the old and the new values,
+        so updates to fields no rule references cost nothing. Returns True if the score was set.
+        """
+        state = inspect(lead)
+        changed = {
+            column.key for column in Lead.__table__.columns
+            if column.key in state.attrs and state.attrs[column.key].history.has_changes()
+        }
+        if not changed or 'score' in changed:
+            # An explicit score in the update wins over the rules
+            return False
+        
+        rules = get_scoring_rules()
+        positions = rules.affected_rules(changed)
+        if not positions:
+            return False
+        
+        try:
+            previous = self._previous_values(state, changed)
+            if lead.score is None or previous is None:
+                score = rules.score(lead)
+            else:
+                previous = LeadRow(previous)
+                score = lead.score - rules.score_rules(previous, positions) + rules.score_rules(lead, positions)
+        except Exception:
+            # As in score_lead, a rule that cannot be evaluated leaves the score alone
+            return False
+        
+        if score != lead.score:
+            lead.score = score
+        return True
+    
+    def _previous_values(self, state, changed):
+        """Column values before the pending changes, or None if an old value was not loaded"""
+        values = {}
+        for column in Lead.__table__.columns:
+            history = state.attrs[column.key].history
+            if column.key not in changed:
+                values[column.key] = state.attrs[column.key].value
+            elif history.deleted:
+                values[column.key] = history.deleted[0]
+            else:
+                # Set while expired or previously None; only a full rescore is safe
+                return None
+        return values
+    
+    def rescore_all(self, chunk_size=None):
+        """Recompute every lead's score with set-based UPDATEs; only changed scores are written"""
+        try:
+            rules = get_scoring_rules()
+            connection = db.session.connection()
+            compiled = rules.sql_score(connection.dialect.name)
+            if compiled is not None:
+                score, skip = compiled
+                query = update(Lead).where(Lead.score.is_distinct_from(score))
+                if skip is not None:
+                    query = query.where(~skip)
+                updated = connection.execute(query.values(score=score, updated_at=datetime.utcnow())).rowcount
+                mode = 'sql'
+            else:
+                updated = self._rescore_in_python(rules, connection, chunk_size)
+                mode = 'python'
+            
+            db.session.commit()
+            db.session.expire_all()
+            return {'success': True, 'data': {'updated': updated, 'mode': mode}}
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+    
+    def _rescore_in_python(self, rules, connection, chunk_size):
+        """Score rows read in chunks and write the changed ones back with one executemany per chunk"""
+        if chunk_size is None:
+            chunk_size = current_app.config.get('RESCORE_CHUNK_SIZE', DEFAULT_RESCORE_CHUNK_SIZE)
+        
+        table = Lead.__table__
+        statement = update(table).where(table.c.id == bindparam('lead_id')).values(
+            score=bindparam('new_score'), updated_at=bindparam('now')
+        )
+        updated = 0
+        last_id = 0
+        while True:
+            # Keyset over id so the UPDATEs never disturb the rows still to be read
+            rows = connection.execute(
+                select(table).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+            ).mappings().all()
+            if not rows:
+                return updated
+            last_id = rows[-1]['id']
+            
+            now = datetime.utcnow()
+            changes = []
+            for values in rows:
+                try:
+                    score = rules.score(LeadRow(values))
+                except Exception:
+                    # score_lead leaves the previous score when a rule cannot be evaluated
+                    continue
+                if score != values['score']:
+                    changes.append({'lead_id': values['id'], 'new_score': score, 'now': now})
+            if changes:
+                connection.execute(statement, changes)
+                updated += len(changes)
+
+def _after_flush(session, flush_context):
+    if any(isinstance(instance, LeadScoring) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info[SESSION_RULES_CHANGED_KEY] = True
+
+def _after_transaction_end(session, transaction):
+    # Drop on commit and on rollback: either way the rules this session saw may not be the committed ones
+    if transaction.parent is None and session.info.pop(SESSION_RULES_CHANGED_KEY, False):
+        invalidate_scoring_rules()
+
+def register_scoring_hooks():
+    """Invalidate compiled rules when a session changes LeadScoring rows (idempotent)"""
+    if event.contains(Session, 'after_flush', _after_flush):
+        return
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_transaction_end', _after_transaction_end)
+
+@click.command('rescore-leads')
+def rescore_leads_command():
+    """Recompute every lead's score from the active scoring rules"""
+    result = LeadScoringService().rescore_all()
+    if result['success']:
+        click.echo(f"Rescored leads ({result['data']['mode']}): {result['data']['updated']} changed")
+    else:
+        raise click.ClickException(result['error'])
+
+def init_scoring(app):
+    """Register the rule invalidation hooks and the rescore-leads CLI command"""
+    register_scoring_hooks()
+    app.cli.add_command(rescore_leads_command)
@@ -0,0 +1,128 @@
+from flask import current_app
+import os
+import re
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not serialized across requests
+    fcntl = None
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+COPY_BUFFER_SIZE = 64 * 1024
+DEFAULT_UPLOAD_MAX_AGE = 24 * 60 * 60
+DEFAULT_UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+
+def import_folder():
+    """Directory holding uploads and queued import files, outside the static folder"""
+    return current_app.config.get('IMPORT_UPLOAD_FOLDER') or os.path.join(current_app.instance_path, 'imports')
+
+def _copy_at_most(source, target, limit):
+    """Copy source into target; False, with the excess left unwritten, once more than limit bytes arrive"""
+    copied = 0
+    while True:
+        data = source.read(COPY_BUFFER_SIZE)
+        if not data:
+            return True
+        copied += len(data)
+        if copied > limit:
+            return False
+        target.write(data)
+
+class ChunkedUploadService:
+    """Service assembling uploads sent as a series of chunks below MAX_CONTENT_LENGTH"""
+    
+    def create_upload(self):
+        """Start a new chunked upload"""
+        try:
+            upload_id = uuid.uuid4().hex
+            os.makedirs(import_folder(), exist_ok=True)
+            open(self._path(upload_id), 'wb').close()
+            
+            return {'success': True, 'data': {'upload_id': upload_id, 'offset': 0}}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def append_chunk(self, upload_id, offset, stream):
+        """Append a chunk read from stream; offset must equal the bytes received so far
+        
+        A chunk that would take the upload past IMPORT_UPLOAD_MAX_BYTES is refused and not kept.
+        """
+        try:
+            path = self._path(upload_id)
+            if not os.path.exists(path):
+                return {'success': False, 'error': 'Upload not found'}
+            
+            with open(path, 'ab') as upload:
+                # Held until the chunk is written, so a retry overlapping the original request
+                # checks its offset against the size the original left
+                if fcntl is not None:
+                    fcntl.flock(upload.fileno(), fcntl.LOCK_EX)
+                
+                # A mismatched offset means a lost or repeated chunk; report where to resume
+                size = os.fstat(upload.fileno()).st_size
+                if offset != size:
+                    return {'success': False, 'error': 'Offset mismatch', 'data': {'offset': size}}
+                
+                max_bytes = current_app.config.get('IMPORT_UPLOAD_MAX_BYTES', DEFAULT_UPLOAD_MAX_BYTES)
+                if not _copy_at_most(stream, upload, max_bytes - size):
+                    upload.flush()
+                    upload.truncate(size)
+                    return {'success': False, 'error': 'Upload too large',
+                            'data': {'offset': size, 'max_bytes': max_bytes}}
+                upload.flush()
+                size = os.fstat(upload.fileno()).st_size
+            
+            return {'success': True, 'data': {'upload_id': upload_id, 'offset': size}}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def open_upload(self, upload_id):
+        """Open an assembled upload for reading, or None if it does not exist"""
+        path = self._path(upload_id)
+        if not os.path.exists(path):
+            return None
+        return open(path, 'rb')
+    
+    def claim_upload(self, upload_id, destination):
+        """Move an assembled upload to destination, or return False if it does not exist"""
+        path = self._path(upload_id)
+        if not os.path.exists(path):
+            return False
+        os.replace(path, destination)
+        return True
+    
+    def discard_upload(self, upload_id):
+        """Delete an upload's data"""
+        path = self._path(upload_id)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    def sweep_abandoned_uploads(self, max_age=None):
+        """Delete uploads that received no chunk for max_age seconds; returns how many were deleted"""
+        if max_age is None:
+            max_age = current_app.config.get('IMPORT_UPLOAD_MAX_AGE', DEFAULT_UPLOAD_MAX_AGE)
+        folder = import_folder()
+        if not os.path.isdir(folder):
+            return 0
+        
+        cutoff = time.time() - max_age
+        removed = 0
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if not (name.endswith('.part') and UPLOAD_ID_PATTERN.match(name[:-len('.part')])):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Completed or discarded meanwhile
+                continue
+        return removed
+    
+    def _path(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise ValueError('Invalid upload id')
+        return os.path.join(import_folder(), f'{upload_id}.part')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Dashboard statistics benchmark for CRM application
+Compares the legacy per-counter COUNT(*) queries with the aggregated stats query
+and the materialized crm_counters read path
+Usage: python -m benchmarks.crm_stats_benchmark [--leads 1000000] [--runs 5]
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models.crm import Lead, Account, Contact, Opportunity, Activity, Quote
+from app.services.crm_service import CRMService, CRM_STATS_DEFINITIONS
+from config import Config
+
+LEAD_STATUSES = ['New', 'Contacted', 'Qualified', 'Nurturing', 'Converted', 'Lost']
+OPPORTUNITY_STAGES = ['Prospecting', 'Qualification', 'Proposal', 'Negotiation', 'Closed Won', 'Closed Lost']
+ACTIVITY_STATUSES = ['Planned', 'In Progress', 'Completed', 'Cancelled']
+BATCH_SIZE = 50000
+
+def legacy_crm_stats():
+    """Reference implementation: one COUNT(*) per counter"""
+    return {
+        'total_leads': Lead.query.count(),
+        'total_accounts': Account.query.count(),
+        'total_contacts': Contact.query.count(),
+        'total_opportunities': Opportunity.query.count(),
+        'total_activities': Activity.query.count(),
+        'total_quotes': Quote.query.count(),
+        'active_leads': Lead.query.filter(Lead.status.in_(['New', 'Qualified', 'Nurturing'])).count(),
+        'won_opportunities': Opportunity.query.filter(Opportunity.stage == 'Closed Won').count(),
+        'pending_activities': Activity.query.filter(Activity.status == 'Planned').count()
+    }
+
+def aggregated_crm_stats(service):
+    """Single-scan-per-table aggregate implementation"""
+    stats = {}
+    for model, counters in CRM_STATS_DEFINITIONS:
+        stats.update(service._aggregate_counters(model, counters))
+    return stats
+
+def seed_database(lead_count):
+    """Bulk insert leads plus a proportional number of opportunities and activities"""
+    now = datetime.utcnow()
+    rng = random.Random(42)
+    
+    def insert_batches(table, total, make_row):
+        for start in range(0, total, BATCH_SIZE):
+            rows = [make_row(i) for i in range(start, min(start + BATCH_SIZE, total))]
+            db.session.execute(table.insert(), rows)
+        db.session.commit()
+    
+    insert_batches(Lead.__table__, lead_count, lambda i: {
+        'first_name': 'Bench', 'last_name': f'Lead{i}', 'email': f'bench{i}@example.com',
+        'status': rng.choice(LEAD_STATUSES), 'score': rng.randint(0, 100),
+        'created_at': now, 'updated_at': now
+    })
+    insert_batches(Opportunity.__table__, lead_count // 10, lambda i: {
+        'name': f'Bench Opportunity {i}', 'stage': rng.choice(OPPORTUNITY_STAGES),
+        'amount': rng.randint(1000, 100000), 'created_at': now, 'updated_at': now
+    })
+    insert_batches(Activity.__table__, lead_count // 5, lambda i: {
+        'subject': f'Bench Activity {i}', 'type': 'Call', 'status': rng.choice(ACTIVITY_STATUSES),
+        'created_at': now, 'updated_at': now
+    })
+
+def measure(func, runs):
+    """Return (query count per call, best latency in ms, result)"""
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        timings = []
+        result = None
+        for _ in range(runs):
+            statements.clear()
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return len(statements), min(timings), result
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CRM dashboard statistics')
+    parser.add_argument('--leads', type=int, default=1000000, help='Number of leads to seed')
+    parser.add_argument('--runs', type=int, default=5, help='Timed runs per implementation')
+    args = parser.parse_args()
+    
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+    
+    try:
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            db.create_all()
+            
+            print(f"Seeding {args.leads} leads...")
+            start = time.perf_counter()
+            seed_database(args.leads)
+            print(f"Seeded in {time.perf_counter() - start:.1f}s")
+            
+            service = CRMService()
+            # Bulk inserts bypass the ORM hooks, so populate the counters explicitly
+            service.counter_service.rebuild_counters()
+            
+            legacy_queries, legacy_ms, legacy_stats = measure(legacy_crm_stats, args.runs)
+            implementations = [
+                ('aggregated',) + measure(lambda: aggregated_crm_stats(service), args.runs),
+                ('counters',) + measure(lambda: service.get_crm_stats()['data'], args.runs)
+            ]
+            
+            print(f"{'implementation':<16}{'queries':>10}{'best ms':>12}{'speedup':>10}")
+            print(f"{'legacy':<16}{legacy_queries:>10}{legacy_ms:>12.1f}{1:>10.2f}")
+            for name, queries, best_ms, stats in implementations:
+                if stats != legacy_stats:
+                    raise SystemExit(f"{name} result mismatch: {stats} != {legacy_stats}")
+                print(f"{name:<16}{queries:>10}{best_ms:>12.1f}{legacy_ms / best_ms:>10.2f}")
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
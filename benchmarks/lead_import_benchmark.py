@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Lead import throughput benchmark for CRM application
+Compares the legacy per-row create_lead import with the chunked bulk importer
+Usage: python -m benchmarks.lead_import_benchmark [--rows 100000] [--legacy-rows 2000] [--chunk-size 1000]
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models.crm import Lead
+from app.models.crm_business_processes import LeadScoring
+from app.services.lead_service import LeadService
+from app.services.import_service import LeadImportService
+from config import Config
+
+SOURCES = ['Website', 'Referral', 'Trade Show', 'Cold Call', '']
+INDUSTRIES = ['Technology', 'Finance', 'Healthcare', 'Retail', '']
+
+def make_rows(count, prefix, duplicate_ratio=0.02):
+    """CSV-like row dicts with a share of repeated emails and invalid rows"""
+    rng = random.Random(7)
+    rows = []
+    for i in range(count):
+        email = f'{prefix}{i}@example.com'
+        if i and rng.random() < duplicate_ratio:
+            email = f'{prefix}{rng.randrange(i)}@example.com'
+        rows.append({
+            'first_name': 'Import',
+            'last_name': f'Lead{i}',
+            'email': email if i % 500 else '',
+            'company': f'Company {i % 1000}',
+            'industry': rng.choice(INDUSTRIES),
+            'source': rng.choice(SOURCES),
+            'budget': str(rng.randint(1000, 50000))
+        })
+    return rows
+
+def legacy_import(rows):
+    """Reference implementation: create_lead (and its score_lead) once per row"""
+    service = LeadService()
+    imported_count = 0
+    errors = []
+    for row in rows:
+        result = service.create_lead(row)
+        if result['success']:
+            imported_count += 1
+        else:
+            errors.append(result['error'])
+    return {'imported_count': imported_count, 'error_count': len(errors)}
+
+def bulk_import(rows, chunk_size):
+    result = LeadImportService(chunk_size=chunk_size).import_rows(rows)
+    if not result['success']:
+        raise SystemExit(result['error'])
+    return result['data']
+
+def measure(func):
+    """Return (statements, seconds, result) for one call"""
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        start = time.perf_counter()
+        result = func()
+        return len(statements), time.perf_counter() - start, result
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark lead imports')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows for the bulk importer')
+    parser.add_argument('--legacy-rows', type=int, default=2000, help='Rows for the per-row importer')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Bulk importer chunk size')
+    args = parser.parse_args()
+    
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+    
+    try:
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            db.create_all()
+            db.session.add(LeadScoring(name='Industry', criteria=[
+                {'field': 'industry', 'operator': 'equals', 'value': 'Technology', 'points': 20},
+                {'field': 'source', 'operator': 'contains', 'value': 'Referral', 'points': 15}
+            ]))
+            db.session.commit()
+            
+            runs = [
+                ('legacy', args.legacy_rows, lambda rows: legacy_import(rows)),
+                ('bulk', args.rows, lambda rows: bulk_import(rows, args.chunk_size))
+            ]
+            
+            print(f"{'implementation':<16}{'rows':>10}{'imported':>10}{'errors':>8}{'stmts/row':>11}{'rows/s':>11}")
+            for name, count, func in runs:
+                rows = make_rows(count, name)
+                statements, seconds, result = measure(lambda: func(rows))
+                print(f"{name:<16}{count:>10}{result['imported_count']:>10}{result['error_count']:>8}"
+                      f"{statements / count:>11.3f}{count / seconds:>11.0f}")
+            
+            if Lead.query.filter(Lead.score > 0).count() == 0:
+                raise SystemExit('scoring rules were not applied')
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -21,4 +21,112 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     
     # Pagination
-    POSTS_PER_PAGE = 20 
\ No newline at end of file
+    POSTS_PER_PAGE = 20
+    
+    # Serve dashboard totals from the materialized crm_counters table
+    CRM_COUNTERS_ENABLED = True
+    
+    # Rows per column batch read by the vectorized report engine
+    ANALYTICS_CHUNK_SIZE = 50000
+    
+    # Rows validated, inserted and committed together by bulk imports
+    IMPORT_CHUNK_SIZE = 1000
+    
+    # Where chunked import uploads are assembled; defaults to <instance>/imports
+    IMPORT_UPLOAD_FOLDER = os.environ.get('IMPORT_UPLOAD_FOLDER')
+    # Seconds without a chunk after which an unfinished upload is deleted by the import workers
+    IMPORT_UPLOAD_MAX_AGE = 24 * 60 * 60
+    # Largest total size of a chunked upload; chunks past it are refused
+    IMPORT_UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+    
+    # Background import worker threads per process (0 leaves jobs to `flask import-worker`)
+    IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+    # Seconds without a checkpoint before a running import job is resumed elsewhere
+    IMPORT_JOB_STALE_SECONDS = 300
+    
+    # Rows fetched per server-side cursor batch by streaming exports
+    EXPORT_BATCH_SIZE = 1000
+    # Rows per Parquet row group / Arrow record batch in columnar exports
+    EXPORT_ROW_GROUP_SIZE = 50000
+    
+    # Lead ids updated or deleted per statement by bulk actions
+    BULK_ACTION_CHUNK_SIZE = 500
+    
+    # Seconds compiled scoring rules are reused before being reloaded (rule edits in this process reload at once)
+    SCORING_RULES_TTL = 60
+    # Leads read per batch when a rescore cannot run as a single SQL UPDATE
+    RESCORE_CHUNK_SIZE = 5000
+    
+    # Largest ?limit= a cursor-paginated list accepts
+    PAGINATION_MAX_LIMIT = 500
+    # Seconds a filtered list total is reused before it is counted again
+    PAGINATION_TOTAL_TTL = 60
+    
+    # Profile each request's statements per endpoint, flag N+1 patterns and capture them for the
+    # index advisor (see /monitoring/performance and /monitoring/performance/indexes)
+    QUERY_PROFILING_ENABLED = True
+    # Executions of one statement fingerprint in a request above which it is flagged as N+1
+    QUERY_N_PLUS_ONE_THRESHOLD = 10
+    
+    # Seconds the user loader reuses a user row (changes made through the ORM drop it at once)
+    USER_CACHE_TTL = 30
+    # Keep rows loaded by a request across its commits instead of reloading them after each one
+    REQUEST_IDENTITY_MAP = True
+    
+    # Redis shared by every worker behind the in-process cache tier (unset: in-process tier only)
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL')
+    # Entries each process keeps, and seconds it reuses them and the table versions before asking Redis again
+    CACHE_LOCAL_MAX_ENTRIES = 1024
+    CACHE_LOCAL_TTL = 5
+    
+    # Serve repeated id lookups of leads, accounts and contacts from Redis, retired on commit (off without CACHE_REDIS_URL)
+    ENTITY_CACHE_ENABLED = True
+    ENTITY_CACHE_TTL = 300
+    
+    # Engine and gunicorn settings tuned together per deployment; PERFORMANCE_PROFILE picks one,
+    # otherwise it follows the database URL. SQLALCHEMY_ENGINE_OPTIONS set here override a profile.
+    PERFORMANCE_PROFILE = os.environ.get('PERFORMANCE_PROFILE')
+    PERFORMANCE_PROFILES = {
+        # SQLite: one writer at a time, so few workers with threads; WAL lets readers run alongside it
+        'development': {
+            'engine_options': {
+                'pool_size': 5,
+                'max_overflow': 5,
+                'pool_timeout': 30,
+                # Seconds a connection waits for another's write lock before "database is locked"
+                'connect_args': {'timeout': 15}
+            },
+            'sqlite_pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 268435456,
+                'cache_size': -65536,
+                'busy_timeout': 15000
+            },
+            'gunicorn': {'workers': 2, 'threads': 4, 'timeout': 60}
+        },
+        # PostgreSQL: every worker holds up to pool_size + max_overflow connections, so
+        # workers * 10 must stay under the server's max_connections
+        'production': {
+            'engine_options': {
+                'pool_size': 5,
+                'max_overflow': 5,
+                'pool_timeout': 10,
+                'pool_recycle': 1800,
+                'pool_pre_ping': True,
+                'connect_args': {'options': '-c statement_timeout=30000'}
+            },
+            'gunicorn': {'workers': min((os.cpu_count() or 1) * 2 + 1, 9), 'threads': 2, 'timeout': 60}
+        }
+    }
+
+def performance_profile(config):
+    """(name, settings) of the performance profile selected by a config mapping"""
+    name = config.get('PERFORMANCE_PROFILE')
+    if not name:
+        uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+        name = 'development' if uri.startswith('sqlite') else 'production'
+    profiles = config.get('PERFORMANCE_PROFILES') or {}
+    if name not in profiles:
+        raise ValueError(f'Unknown performance profile: {name}')
+    return name, profiles[name]
\ No newline at end of file
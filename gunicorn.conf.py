@@ -0,0 +1,16 @@
+"""
+Gunicorn settings for the CRM application
+Workers and threads come from the same performance profile as the database engine options
+"""
+
+import os
+from config import Config, performance_profile
+
+profile_name, profile = performance_profile(vars(Config))
+settings = profile.get('gunicorn', {})
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', settings.get('workers', 2)))
+threads = int(os.environ.get('GUNICORN_THREADS', settings.get('threads', 1)))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', settings.get('timeout', 30)))
@@ -0,0 +1,67 @@
+"""Add indexes for CRM filters, reports and keyset pagination
+
+Revision ID: 3f1c9a2b7d10
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (table, index name, columns) as declared in app/models/crm.py
+INDEXES = [
+    ('leads', 'ix_leads_status_created_at', ['status', 'created_at']),
+    ('leads', 'ix_leads_assigned_to_status', ['assigned_to', 'status']),
+    ('leads', 'ix_leads_source', ['source']),
+    ('leads', 'ix_leads_created_at_id', ['created_at', 'id']),
+    ('accounts', 'ix_accounts_name', ['name']),
+    ('accounts', 'ix_accounts_assigned_to_status', ['assigned_to', 'status']),
+    ('accounts', 'ix_accounts_parent_account_id', ['parent_account_id']),
+    ('accounts', 'ix_accounts_territory_id', ['territory_id']),
+    ('accounts', 'ix_accounts_created_at_id', ['created_at', 'id']),
+    ('contacts', 'ix_contacts_account_id', ['account_id']),
+    ('contacts', 'ix_contacts_assigned_to_status', ['assigned_to', 'status']),
+    ('contacts', 'ix_contacts_created_at_id', ['created_at', 'id']),
+    ('opportunities', 'ix_opportunities_stage_expected_close_date', ['stage', 'expected_close_date', 'amount']),
+    ('opportunities', 'ix_opportunities_stage_actual_close_date', ['stage', 'actual_close_date']),
+    ('opportunities', 'ix_opportunities_assigned_to_stage', ['assigned_to', 'stage']),
+    ('opportunities', 'ix_opportunities_account_id', ['account_id']),
+    ('opportunities', 'ix_opportunities_contact_id', ['contact_id']),
+    ('opportunities', 'ix_opportunities_lead_id', ['lead_id']),
+    ('opportunities', 'ix_opportunities_created_at_id', ['created_at', 'id']),
+    ('activities', 'ix_activities_lead_id', ['lead_id']),
+    ('activities', 'ix_activities_account_id', ['account_id']),
+    ('activities', 'ix_activities_contact_id', ['contact_id']),
+    ('activities', 'ix_activities_opportunity_id', ['opportunity_id']),
+    ('activities', 'ix_activities_assigned_to_status', ['assigned_to', 'status']),
+    ('activities', 'ix_activities_created_at_id', ['created_at', 'id']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Databases built with db.create_all() after this change already have these indexes
+    for table, name, columns in INDEXES:
+        existing = _existing_indexes(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        existing = _existing_indexes(table)
+        if existing is not None and name in existing:
+            op.drop_index(name, table_name=table)
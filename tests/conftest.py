@@ -1,6 +1,8 @@
 import pytest
 import tempfile
 import os
+from contextlib import contextmanager
+from sqlalchemy import event
 from app import create_app, db
 from app.models.crm import User, Lead, Account, Contact, Opportunity, Activity, Quote, Territory
 from app.models.crm_business_processes import Workflow, Campaign, LeadScoring, AutomationRule
@@ -42,6 +44,39 @@ def runner(app):
     """A test runner for the app's Click commands."""
     return app.test_cli_runner()
 
+@pytest.fixture
+def sql_statements(app):
+    """Record the statements the app's engine executes: `with sql_statements() as statements:`
+    
+    With parameters=True each entry is a (statement, parameters) pair.
+    """
+    with app.app_context():
+        engine = db.engine
+    
+    @contextmanager
+    def record(parameters=False):
+        statements = []
+        
+        def append(conn, cursor, statement, statement_parameters, context, executemany):
+            statements.append((statement, statement_parameters) if parameters else statement)
+        
+        event.listen(engine, 'before_cursor_execute', append)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', append)
+    return record
+
+@pytest.fixture
+def shared_redis(app):
+    """Back the app's cache with a Redis stand-in that other apps built in the test can share."""
+    from app.optimization.caching import LocalRedis
+    
+    app.cache_manager.redis_client = LocalRedis(shared=True)
+    # Versions counted in-process while the test data was created are read from it from now on
+    app.cache_manager.versions.clear()
+    return app.cache_manager.redis_client
+
 @pytest.fixture
 def auth_client(client):
     """A test client with authenticated user."""
@@ -235,16 +235,16 @@ class TestModelRelationships:
         """Test account-contacts relationship."""
         with app.app_context():
             account = Account.query.first()
-            assert account.contacts.count() >= 1
+            assert len(account.contacts) >= 1
     
     def test_lead_activities_relationship(self, app):
         """Test lead-activities relationship."""
         with app.app_context():
             lead = Lead.query.first()
-            assert lead.activities.count() >= 1
+            assert len(lead.activities) >= 1
     
     def test_opportunity_activities_relationship(self, app):
         """Test opportunity-activities relationship."""
         with app.app_context():
             opportunity = Opportunity.query.first()
-            assert opportunity.activities.count() >= 1 
\ No newline at end of file
+            assert len(opportunity.activities) >= 1 
\ No newline at end of file
@@ -1,5 +1,5 @@
 import pytest
-from app.models.crm import Lead, Account, Contact, Opportunity, Activity
+from app.models.crm import Lead, Account, Contact, Opportunity, Activity, Quote
 
 class TestCRMRoutes:
     """Test cases for CRM routes."""
@@ -28,6 +28,50 @@ class TestCRMRoutes:
         assert response.status_code == 200
         assert b'leads' in response.data.lower()
     
+    def test_rendered_lists_ignore_cursor_paging(self, app, auth_client):
+        """Test ?cursor= only pages JSON responses; a rendered list keeps its page/per_page paging."""
+        import json
+        import time
+        from app import db
+        
+        last_name = f'Cursor{int(time.time() * 1000)}'
+        with app.app_context():
+            for number in range(2):
+                db.session.add(Lead(first_name='Page', last_name=last_name, email=f'{last_name}.{number}@example.com'))
+            db.session.commit()
+        
+        filters = json.dumps({'last_name': last_name})
+        response = auth_client.get(f'/crm/leads?cursor=&limit=1&filters={filters}')
+        
+        assert response.status_code == 200
+        assert f'{last_name}.0@example.com'.encode() in response.data
+        assert f'{last_name}.1@example.com'.encode() in response.data
+    
+    def test_json_lists_page_by_cursor(self, app, auth_client):
+        """Test following next_cursor through /crm/leads returns each matching lead once, as JSON."""
+        import json
+        import time
+        from app import db
+        
+        last_name = f'Keyset{int(time.time() * 1000)}'
+        with app.app_context():
+            for number in range(3):
+                db.session.add(Lead(first_name='Page', last_name=last_name, email=f'{last_name}.{number}@example.com'))
+            db.session.commit()
+        
+        filters = json.dumps({'last_name': last_name})
+        emails, cursor = [], ''
+        while cursor is not None:
+            response = auth_client.get('/crm/leads', query_string={'cursor': cursor, 'limit': 2, 'filters': filters},
+                                       headers={'Accept': 'application/json'})
+            body = response.get_json()
+            assert body['success'] is True
+            assert len(body['data']['leads']) <= 2
+            emails.extend(lead['email'] for lead in body['data']['leads'])
+            cursor = body['data']['next_cursor']
+        
+        assert sorted(emails) == [f'{last_name}.{number}@example.com' for number in range(3)]
+    
     def test_create_lead_form_accessible(self, auth_client):
         """Test that create lead form is accessible."""
         response = auth_client.get('/crm/leads/create')
@@ -243,4 +287,345 @@ class TestCRMRoutes:
         """Test that settings are accessible when authenticated."""
         response = auth_client.get('/crm/settings')
         assert response.status_code == 200
-        assert b'settings' in response.data.lower() 
\ No newline at end of file
+        assert b'settings' in response.data.lower() 
+
+class TestLeadImportRoutes:
+    """Test cases for lead import routes."""
+    
+    def test_import_leads_streams_csv_upload(self, app, client):
+        """Test multipart CSV import parses rows and reports failures."""
+        import io
+        import uuid
+        email = f'stream.one.{uuid.uuid4().hex[:8]}@example.com'
+        csv_data = (
+            '\ufefffirst_name,last_name,email,notes\n'
+            f'Stream,One,{email},"multi\nline"\n'
+            'Stream,Two,,\n'
+        ).encode('utf-8')
+        
+        response = client.post('/crm/leads/import', data={
+            'file': (io.BytesIO(csv_data), 'leads.csv')
+        }, content_type='multipart/form-data')
+        
+        result = response.get_json()
+        assert result['success']
+        assert result['data']['imported_count'] == 1
+        assert result['data']['errors'] == [{'row': 2, 'error': 'email is required'}]
+        with app.app_context():
+            assert Lead.query.filter_by(email=email).one().notes == 'multi\nline'
+    
+    def test_chunked_upload_import(self, app, client, tmp_path):
+        """Test a CSV sent in chunks is assembled, resumable and imported."""
+        import uuid
+        suffix = uuid.uuid4().hex[:8]
+        csv_data = f'first_name,last_name,email\nChunk,One,chunk.one.{suffix}@example.com\nChunk,Two,chunk.two.{suffix}@example.com\n'.encode()
+        app.config.update({'IMPORT_UPLOAD_FOLDER': str(tmp_path), 'IMPORT_UPLOAD_MAX_BYTES': len(csv_data)})
+        
+        upload_id = client.post('/crm/leads/import/uploads').get_json()['data']['upload_id']
+        first = client.put(f'/crm/leads/import/uploads/{upload_id}?offset=0', data=csv_data[:40])
+        assert first.get_json()['data']['offset'] == 40
+        
+        stale = client.put(f'/crm/leads/import/uploads/{upload_id}?offset=0', data=csv_data[:40])
+        assert stale.status_code == 409
+        assert stale.get_json()['data']['offset'] == 40
+        
+        client.put(f'/crm/leads/import/uploads/{upload_id}?offset=40', data=csv_data[40:])
+        too_large = client.put(f'/crm/leads/import/uploads/{upload_id}?offset={len(csv_data)}', data=b'\n')
+        assert too_large.status_code == 413
+        result = client.post(f'/crm/leads/import/uploads/{upload_id}/complete').get_json()
+        
+        assert result['data']['imported_count'] == 2
+        assert list(tmp_path.iterdir()) == []
+        with app.app_context():
+            assert Lead.query.filter_by(email=f'chunk.two.{suffix}@example.com').count() == 1
+    
+    def test_background_import_job_progress_and_errors(self, app, client, runner, tmp_path):
+        """Test a queued contact import runs in the worker and reports progress and errors."""
+        import io
+        import uuid
+        app.config.update({'IMPORT_UPLOAD_FOLDER': str(tmp_path), 'IMPORT_WORKERS': 0, 'IMPORT_CHUNK_SIZE': 2})
+        suffix = uuid.uuid4().hex[:8]
+        csv_data = (
+            'first_name,last_name,email\n'
+            f'Job,One,job.one.{suffix}@example.com\n'
+            'Job,Two,\n'
+            f'Job,Three,job.three.{suffix}@example.com\n'
+        ).encode()
+        
+        response = client.post('/crm/imports', data={
+            'entity': 'contacts',
+            'file': (io.BytesIO(csv_data), 'contacts.csv')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 202
+        job_id = response.get_json()['data']['id']
+        assert client.get(f'/crm/imports/{job_id}').get_json()['data']['status'] == 'Queued'
+        
+        runner.invoke(args=['import-worker', '--once'])
+        
+        job = client.get(f'/crm/imports/{job_id}').get_json()['data']
+        assert job['status'] == 'Completed'
+        assert (job['rows_processed'], job['imported_count'], job['error_count'], job['progress']) == (3, 2, 1, 100)
+        errors = client.get(f'/crm/imports/{job_id}/errors').get_json()['data']['errors']
+        assert errors == [{'row': 2, 'error': 'email is required'}]
+        assert list(tmp_path.iterdir()) == []
+
+class TestExportRoutes:
+    """Test cases for streaming export routes."""
+    
+    def test_export_leads_streams_csv(self, app, client):
+        """Test lead CSV export streams a header and every matching lead."""
+        import csv
+        import io
+        app.config['EXPORT_BATCH_SIZE'] = 1
+        
+        response = client.get('/crm/leads/export')
+        
+        assert response.is_streamed
+        assert response.mimetype == 'text/csv'
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        with app.app_context():
+            assert [row['email'] for row in rows] == [lead.email for lead in Lead.query.order_by(Lead.id)]
+            assert 'first_name' in rows[0] and 'assigned_to' not in rows[0]
+    
+    def test_export_data_json_and_ndjson(self, app, client):
+        """Test table export keeps the JSON envelope and streams filtered NDJSON."""
+        import json
+        
+        result = client.get('/crm/export/accounts').get_json()
+        ndjson = client.get('/crm/export/leads?format=ndjson&filters=' + json.dumps({'status': 'New'}))
+        
+        lines = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()]
+        with app.app_context():
+            assert result['success']
+            assert len(result['data']) == Account.query.count()
+            assert '_sa_instance_state' not in result['data'][0]
+            assert len(lines) == Lead.query.filter_by(status='New').count()
+            assert all(line['status'] == 'New' for line in lines)
+        assert client.get('/crm/export/unknown').get_json()['error'] == 'Invalid data type'
+    
+    def test_export_data_parquet_and_arrow(self, app, client):
+        """Test columnar exports project columns, push filters down and write one row group per batch."""
+        import io
+        import json
+        pa = pytest.importorskip('pyarrow')
+        import pyarrow.parquet as pq
+        app.config['EXPORT_ROW_GROUP_SIZE'] = 1
+        
+        query = '&columns=id,email,budget,created_at&filters=' + json.dumps({'status': 'New'})
+        parquet = client.get('/crm/export/leads?format=parquet' + query)
+        assert parquet.mimetype == 'application/vnd.apache.parquet'
+        parquet_file = pq.ParquetFile(io.BytesIO(parquet.data))
+        arrow = client.get('/crm/export/leads?format=arrow' + query)
+        arrow_table = pa.ipc.open_file(io.BytesIO(arrow.data)).read_all()
+        
+        table = parquet_file.read()
+        with app.app_context():
+            leads = Lead.query.filter_by(status='New').order_by(Lead.id).all()
+            assert table.column_names == ['id', 'email', 'budget', 'created_at']
+            assert table.column('email').to_pylist() == [lead.email for lead in leads]
+            assert parquet_file.num_row_groups == len(leads)
+            assert arrow_table.equals(table)
+        assert client.get('/crm/export/leads?format=parquet&columns=password').get_json()['success'] is False
+
+
+class TestPageQueries:
+    """Test cases for the queries page renders issue."""
+    
+    def test_list_and_detail_pages_use_a_fixed_number_of_queries(self, app, client, sql_statements):
+        """Test page renders load their relationships up front, so queries do not grow with the rows shown."""
+        import uuid
+        from app import db
+        
+        def count_queries(url):
+            with sql_statements() as statements:
+                response = client.get(url)
+            assert response.status_code == 200
+            assert b'"success":false' not in response.data
+            return len(statements)
+        
+        pages = ['/crm/accounts/list', '/crm/quotes/list', '/crm/leads/list', '/crm/accounts/1', '/crm/leads/1/detail']
+        # The first requests also run once-per-process start-up queries and fill the caches
+        for url in pages:
+            client.get(url)
+        before = [count_queries(url) for url in pages]
+        
+        suffix = uuid.uuid4().hex[:8]
+        with app.app_context():
+            for number in range(5):
+                account = Account(name=f'Eager Account {number} {suffix}')
+                db.session.add(account)
+                db.session.flush()
+                for position in range(3):
+                    db.session.add(Contact(first_name='Eager', last_name=f'{number}-{position}',
+                                           email=f'eager{number}.{position}.{suffix}@example.com', account_id=account.id))
+                    opportunity = Opportunity(name=f'Eager Deal {number}-{position} {suffix}', account_id=account.id)
+                    db.session.add(opportunity)
+                    db.session.flush()
+                    db.session.add(Quote(quote_number=f'Q-EAGER-{number}-{position}-{suffix}', opportunity_id=opportunity.id))
+            for position in range(3):
+                db.session.add(Activity(subject=f'Eager Call {position}', type='Call', account_id=1, lead_id=1))
+            db.session.commit()
+        
+        assert [count_queries(url) for url in pages] == before
+
+
+class TestPoolMetrics:
+    """Test cases for the engine performance profile and pool metrics."""
+    
+    def test_pool_metrics_and_sqlite_pragmas_follow_the_profile(self, app, client):
+        """Test the development profile tunes SQLite connections and the pool reports its usage."""
+        from sqlalchemy import text
+        from app import db
+        
+        with app.app_context():
+            pragmas = {name: db.session.execute(text(f'PRAGMA {name}')).scalar()
+                       for name in ('journal_mode', 'synchronous', 'cache_size')}
+            db.session.remove()
+        
+        metrics = client.get('/monitoring/pool').get_json()['data']
+        
+        assert app.config['PERFORMANCE_PROFILE'] == 'development'
+        assert pragmas == {'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -65536}
+        assert metrics['pool_class'] == 'TimedQueuePool'
+        assert metrics['pool_size'] == 5
+        assert metrics['checked_out'] + metrics['checked_in'] == metrics['open_connections']
+        assert metrics['wait']['checkouts'] == metrics['checkouts'] >= 1
+
+
+@pytest.mark.usefixtures('shared_redis')
+class TestConditionalRequests:
+    """Test cases for ETag and Last-Modified validation of CRM JSON responses."""
+    
+    def test_unchanged_json_is_answered_with_not_modified(self, app, client):
+        """Test JSON polls get 304 until a committed write changes the tables behind them."""
+        import time
+        from app import db
+        
+        headers = {'Accept': 'application/json'}
+        response = client.get('/crm/leads/reports', headers=headers)
+        etag = response.headers['ETag']
+        
+        assert response.status_code == 200
+        assert 'Accept' in response.headers['Vary']
+        
+        unchanged = client.get('/crm/leads/reports', headers={**headers, 'If-None-Match': etag})
+        assert unchanged.status_code == 304
+        assert unchanged.data == b''
+        assert unchanged.headers['ETag'] == etag
+        
+        with app.app_context():
+            lead = Lead(first_name='Conditional', last_name='Poll', email=f'conditional.{time.time()}@example.com')
+            db.session.add(lead)
+            db.session.commit()
+        
+        changed = client.get('/crm/leads/reports', headers={**headers, 'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+        assert changed.get_json()['success'] is True
+        
+        # Last-Modified is only sent once the data has been served for a whole second
+        assert 'Last-Modified' not in changed.headers
+        time.sleep(1.1)
+        dated = client.get('/crm/leads/reports', headers=headers)
+        assert dated.headers['ETag'] == changed.headers['ETag']
+        last_modified = dated.headers['Last-Modified']
+        assert client.get('/crm/leads/reports', headers={**headers, 'If-Modified-Since': last_modified}).status_code == 304
+        assert client.get('/crm/leads/reports', headers={**headers, 'If-Modified-Since': 'Thu, 01 Jan 2015 00:00:00 GMT'}).status_code == 200
+        
+        # Pages rendered for browsers are not validated
+        assert 'ETag' not in client.get('/crm/leads/reports').headers
+    
+    def test_writes_that_keep_count_and_latest_timestamp_still_change_the_validators(self, app, client):
+        """Test a commit carrying an older updated_at than the table's newest row still invalidates polls."""
+        import time
+        from datetime import datetime
+        from app import db
+        
+        with app.app_context():
+            lead = Lead(first_name='Older', last_name='Stamp', email=f'older.stamp.{time.time()}@example.com')
+            db.session.add_all([lead, Lead(first_name='Newer', last_name='Stamp', email=f'newer.stamp.{time.time()}@example.com')])
+            db.session.commit()
+            lead_id = lead.id
+        
+        headers = {'Accept': 'application/json'}
+        client.get('/crm/leads/reports', headers=headers)
+        time.sleep(1.1)
+        before = client.get('/crm/leads/reports', headers=headers)
+        
+        with app.app_context():
+            # Stamped before the newest row, as a transaction that started earlier but committed later would be
+            lead = db.session.get(Lead, lead_id)
+            lead.status = 'Qualified'
+            lead.updated_at = datetime(2020, 1, 1)
+            db.session.commit()
+        
+        assert client.get('/crm/leads/reports', headers={**headers, 'If-None-Match': before.headers['ETag']}).status_code == 200
+        assert client.get('/crm/leads/reports', headers={**headers, 'If-Modified-Since': before.headers['Last-Modified']}).status_code == 200
+    
+    def test_commits_in_another_instance_change_the_validators(self, app, client, shared_redis):
+        """Test a commit made by another instance sharing Redis ends 304s, and that without Redis no validators are sent."""
+        import time
+        from app import create_app, db
+        
+        other = create_app()
+        other.cache_manager.redis_client = shared_redis
+        # Read the shared versions on every request instead of reusing them for CACHE_LOCAL_TTL
+        app.cache_manager.local_ttl = 0
+        
+        headers = {'Accept': 'application/json'}
+        etag = client.get('/crm/leads/reports', headers=headers).headers['ETag']
+        assert client.get('/crm/leads/reports', headers={**headers, 'If-None-Match': etag}).status_code == 304
+        
+        with other.app_context():
+            db.session.add(Lead(first_name='Other', last_name='Instance', email=f'other.instance.{time.time()}@example.com'))
+            db.session.commit()
+        
+        assert client.get('/crm/leads/reports', headers={**headers, 'If-None-Match': etag}).status_code == 200
+        
+        # Each instance only counts its own commits without a shared Redis
+        app.cache_manager.redis_client = None
+        response = client.get('/crm/leads/reports', headers=headers)
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+
+
+class TestQueryProfiling:
+    """Test cases for the per-endpoint statement profiler wired up by create_app."""
+    
+    def test_repeated_statements_in_a_request_are_flagged_as_n_plus_one(self, app, client):
+        """Test a request running a query per row shows up as an N+1 flag in the performance report."""
+        from app import db
+        
+        with app.app_context():
+            for number in range(12):
+                db.session.add(Account(name=f'Profiled Account {number}'))
+            db.session.commit()
+        
+        @app.route('/test/account-contacts')
+        def account_contacts():
+            # One lazy load of contacts per account
+            return {'contacts': sum(len(account.contacts) for account in Account.query.all())}
+        
+        assert client.get('/test/account-contacts').status_code == 200
+        report = client.get('/monitoring/performance').get_json()['data']
+        
+        flags = [flag for flag in report['n_plus_one_queries'] if flag['endpoint'] == 'account_contacts']
+        assert len(flags) == 1
+        assert 'FROM contacts' in flags[0]['fingerprint']
+        assert flags[0]['max_executions'] >= 12
+        endpoint = next(item for item in report['endpoint_queries'] if item['endpoint'] == 'account_contacts')
+        assert endpoint['requests'] == 1
+    
+    def test_index_advisor_recommends_indexes_for_live_statements(self, app, client):
+        """Test statements run by real requests are explained and an index is recommended for their scans."""
+        @app.route('/test/leads-by-title/<title>')
+        def leads_by_title(title):
+            return {'leads': len(Lead.query.filter(Lead.job_title == title).all())}
+        
+        for title in ('CTO', 'CEO', 'VP Sales'):
+            assert client.get(f'/test/leads-by-title/{title}').status_code == 200
+        recommendations = client.get('/monitoring/performance/indexes?top=50').get_json()['data']
+        
+        advice = next(item for item in recommendations if item['table'] == 'leads' and item['columns'] == ['job_title'])
+        assert advice['calls'] == 3
+        assert advice['statement'] == 'CREATE INDEX IF NOT EXISTS ix_leads_job_title ON leads (job_title)'
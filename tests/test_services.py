@@ -4,7 +4,13 @@ from app.services.account_service import AccountService
 from app.services.contact_service import ContactService
 from app.services.opportunity_service import OpportunityService
 from app.services.activity_service import ActivityService
-from app.models.crm import Lead, Account, Contact, Opportunity, Activity, User
+from app.services.crm_service import CRMService
+from app.analytics.counters import CounterService
+from app.analytics.rollups import RollupService
+from app.analytics.vectorized import VectorizedReportEngine
+from app.models.crm_analytics import CRMCounter, CRMRollupQueue
+from app.models.crm import Lead, Account, Contact, Opportunity, Activity, Quote, User
+from app import db
 
 class TestLeadService:
     """Test cases for LeadService."""
@@ -114,6 +120,191 @@ class TestLeadService:
             
             assert new_leads is not None
             assert len(new_leads) >= 1
+    
+    def test_import_leads_in_chunks_reports_row_errors(self, app):
+        """Test bulk lead import de-duplicates, scores and reports failing rows."""
+        import uuid
+        
+        suffix = uuid.uuid4().hex[:8]
+        industry = f'Robotics {suffix}'
+        with app.app_context():
+            from app.models.crm_business_processes import LeadScoring
+            from app.services.import_service import LeadImportService
+            # Scoring rules apply to every lead, so the rule is removed again for the tests that follow
+            rule = LeadScoring(name='Import Rule', is_active=True, criteria=[
+                {'field': 'industry', 'operator': 'equals', 'value': industry, 'points': 40}
+            ])
+            db.session.add(rule)
+            db.session.commit()
+            try:
+                existing = Lead.query.first()
+                total_before = CRMService().get_crm_stats()['data']['total_leads']
+                
+                rows = [
+                    {'first_name': 'Bulk', 'last_name': 'One', 'email': f'bulk.one.{suffix}@example.com', 'industry': industry},
+                    {'first_name': 'Bulk', 'last_name': 'Two', 'email': f'bulk.two.{suffix}@example.com', 'budget': '2500'},
+                    {'first_name': 'Bulk', 'last_name': 'Dup', 'email': f'bulk.one.{suffix}@example.com'},
+                    {'first_name': 'Bulk', 'last_name': 'Old', 'email': existing.email},
+                    {'first_name': 'Bulk', 'last_name': 'NoMail', 'email': ''},
+                    {'first_name': 'Bulk', 'last_name': 'Budget', 'email': f'bulk.budget.{suffix}@example.com', 'budget': 'lots'},
+                    {'first_name': 'Bulk', 'last_name': 'Three', 'email': f'bulk.three.{suffix}@example.com'}
+                ]
+                result = LeadImportService(chunk_size=2).import_rows(rows)
+                
+                assert result['success']
+                assert result['data']['imported_count'] == 3
+                assert result['data']['errors'] == [
+                    {'row': 3, 'error': 'Lead with this email already exists'},
+                    {'row': 4, 'error': 'Lead with this email already exists'},
+                    {'row': 5, 'error': 'email is required'},
+                    {'row': 6, 'error': 'budget must be a number'}
+                ]
+                assert Lead.query.filter_by(email=f'bulk.one.{suffix}@example.com').one().score == 40
+                assert Lead.query.filter_by(email=f'bulk.two.{suffix}@example.com').one().source == 'Manual'
+                assert CRMService().get_crm_stats()['data']['total_leads'] == total_before + 3
+            finally:
+                db.session.delete(rule)
+                db.session.commit()
+    
+    def test_bulk_actions_run_per_chunk_and_keep_counters(self, app, sql_statements):
+        """Test bulk qualify and delete use a fixed number of statements per chunk and keep counters exact."""
+        import uuid
+        
+        suffix = uuid.uuid4().hex[:8]
+        with app.app_context():
+            from app.services.bulk_service import BulkLeadService
+            CounterService().get_counters(['leads'])
+            leads = [Lead(first_name='Bulk', last_name=f'Action{i}', email=f'bulk.action{i}.{suffix}@example.com', status='New')
+                     for i in range(6)]
+            db.session.add_all(leads)
+            db.session.commit()
+            ids = [lead.id for lead in leads]
+            activity = Activity(subject='Call', type='Call', lead_id=ids[0])
+            db.session.add(activity)
+            db.session.commit()
+            
+            with sql_statements() as statements:
+                qualified = BulkLeadService(chunk_size=3).run('qualify', ids + [999999, 'x'], user_id=1)
+            
+            assert qualified['success']
+            assert qualified['data']['succeeded'] == ids
+            assert qualified['data']['failed'] == {'999999': 'Lead not found', 'x': 'Invalid lead id'}
+            assert len(statements) <= 3 * 8
+            assert {lead.status for lead in Lead.query.filter(Lead.id.in_(ids))} == {'Qualified'}
+            assert Activity.query.filter(Activity.lead_id.in_(ids), Activity.created_by == 1).count() == 6
+            
+            deleted = BulkLeadService(chunk_size=4).run('delete', ids[:4])
+            
+            assert deleted['data']['processed'] == 4
+            assert Lead.query.filter(Lead.id.in_(ids)).count() == 2
+            assert db.session.get(Activity, activity.id).lead_id is None
+            counters = CounterService().get_counters(['leads', 'leads.status'])
+            CounterService().rebuild_counters()
+            assert CounterService().get_counters(['leads', 'leads.status']) == counters
+    
+    def test_scoring_rules_are_cached_and_rescored_in_sql(self, app):
+        """Test compiled scoring rules are reused until a rule changes and rescore_all matches score_lead."""
+        with app.app_context():
+            from app.models.crm_business_processes import LeadScoring
+            from app.services.scoring_service import get_scoring_rules
+            service = LeadService()
+            rule = LeadScoring(name='Rescore Rule', is_active=True, criteria=[
+                {'field': 'industry', 'operator': 'equals', 'value': 'Technology', 'points': 20},
+                {'field': 'source', 'operator': 'contains', 'value': 'Web', 'points': 5}
+            ])
+            db.session.add(rule)
+            db.session.commit()
+            # Scoring rules apply to every lead, so the rule is removed again for the tests that follow
+            try:
+                rules = get_scoring_rules()
+                assert get_scoring_rules() is rules
+                
+                rule.criteria = rule.criteria + [{'field': 'budget', 'operator': 'greater_than', 'value': 100, 'points': 7}]
+                db.session.commit()
+                assert get_scoring_rules() is not rules
+                
+                result = service.rescore_all()
+                
+                assert result['success']
+                assert result['data']['mode'] == 'sql'
+                for lead in Lead.query.filter(Lead.budget.isnot(None)).all():
+                    expected = lead.score
+                    assert service.score_lead(lead.id)['data']['score'] == expected
+            finally:
+                db.session.delete(rule)
+                db.session.commit()
+    
+    def test_update_lead_rescores_only_for_referenced_fields(self, app):
+        """Test update_lead re-evaluates scoring rules only when a field they read changes."""
+        import uuid
+        
+        with app.app_context():
+            from app.models.crm_business_processes import LeadScoring
+            from app.services.scoring_service import get_scoring_rules
+            service = LeadService()
+            rule = LeadScoring(name='Update Rule', is_active=True, criteria=[
+                {'field': 'industry', 'operator': 'equals', 'value': 'Aerospace', 'points': 11}
+            ])
+            db.session.add(rule)
+            db.session.commit()
+            email = f'up.date.{uuid.uuid4().hex[:8]}@example.com'
+            lead = service.create_lead({'first_name': 'Up', 'last_name': 'Date', 'email': email, 'budget': 500})['data']
+            base_score = lead.score
+            rules = get_scoring_rules()
+            
+            scored = []
+            original_score_rules = rules.score_rules
+            rules.score_rules = lambda row, positions: scored.append(positions) or original_score_rules(row, positions)
+            try:
+                service.update_lead(lead.id, {'notes': 'Called twice'})
+                assert scored == []
+                
+                service.update_lead(lead.id, {'industry': 'Aerospace'})
+                assert Lead.query.get(lead.id).score == base_score + 11
+                assert len(scored) == 2
+                
+                service.update_lead(lead.id, {'industry': 'Retail'})
+                assert Lead.query.get(lead.id).score == base_score
+            finally:
+                rules.score_rules = original_score_rules
+                # Scoring rules apply to every lead, so the rule is removed again for the tests that follow
+                db.session.delete(rule)
+                db.session.commit()
+    
+    def test_get_leads_keyset_pages_cover_every_lead_once(self, app, sql_statements):
+        """Test cursor paging walks (created_at, id) order without skipping rows or counting."""
+        import uuid
+        
+        suffix = uuid.uuid4().hex[:8]
+        with app.app_context():
+            from datetime import datetime
+            service = LeadService()
+            created = datetime(2024, 1, 1)
+            db.session.add_all([
+                Lead(first_name='Page', last_name=f'Tie{i}-{suffix}', email=f'page.tie{i}.{suffix}@example.com', created_at=created)
+                for i in range(5)
+            ])
+            db.session.commit()
+            expected = [lead.id for lead in Lead.query.order_by(Lead.created_at.desc(), Lead.id.desc())]
+            
+            with sql_statements(parameters=True) as statements:
+                seen = []
+                cursor = ''
+                while cursor is not None:
+                    result = service.get_leads(cursor=cursor, limit=2)
+                    assert result['success']
+                    seen.extend(lead.id for lead in result['data']['leads'])
+                    cursor = result['data']['next_cursor']
+            
+            assert seen == expected
+            assert not any('count(' in statement.lower() for statement, _ in statements)
+            assert all(parameters[-1] == 0 for statement, parameters in statements if 'OFFSET' in statement)
+            
+            filtered = service.get_leads(filters={'last_name': f'Tie1-{suffix}'}, cursor='', with_total=True)
+            assert filtered['data']['total'] == 1
+            assert service.get_leads(cursor='', with_total=True)['data']['total'] == Lead.query.count()
+            assert not service.get_leads(cursor='not-a-cursor')['success']
+            assert not service.get_leads(cursor='', sort='notes')['success']
 
 class TestAccountService:
     """Test cases for AccountService."""
@@ -222,6 +413,45 @@ class TestAccountService:
             
             assert tech_accounts is not None
             assert len(tech_accounts) >= 1
+    
+    def test_get_account_detail_profile_loads_relationships_up_front(self, app, sql_statements):
+        """Test the detail load profile leaves nothing for the page to lazy load."""
+        with app.app_context():
+            account_id = Account.query.first().id
+            db.session.remove()
+            
+            account = AccountService().get_account(account_id, load='detail')['data']
+            with sql_statements() as statements:
+                related = (account.user, account.parent, account.territory, list(account.child_accounts),
+                           list(account.contacts), list(account.opportunities), list(account.activities))
+            
+            assert len(related[4]) >= 1
+            assert statements == []
+            assert AccountService().get_account(account_id, load='summary')['success'] is False
+    
+    def test_get_accounts_list_profile_counts_collections(self, app, sql_statements):
+        """Test the list load profile counts contacts and opportunities without loading them."""
+        import uuid
+        with app.app_context():
+            suffix = uuid.uuid4().hex[:8]
+            counted, empty = Account(name=f'Counted {suffix}'), Account(name=f'Uncounted {suffix}')
+            db.session.add_all([counted, empty])
+            db.session.flush()
+            for position in range(2):
+                db.session.add(Contact(first_name='Counted', last_name=str(position),
+                                       email=f'counted{position}.{suffix}@example.com', account_id=counted.id))
+            db.session.add(Opportunity(name=f'Counted Deal {suffix}', account_id=counted.id))
+            db.session.commit()
+            db.session.remove()
+            
+            filters = {'name': {'operator': 'like', 'value': suffix}}
+            accounts = AccountService().get_accounts(filters=filters, load='list')['data']['accounts']
+            with sql_statements() as statements:
+                counts = {account.name: (account.contact_count, account.opportunity_count) for account in accounts}
+            
+            assert counts == {f'Counted {suffix}': (2, 1), f'Uncounted {suffix}': (0, 0)}
+            assert statements == []
+            assert 'contacts' not in accounts[0].__dict__
 
 class TestContactService:
     """Test cases for ContactService."""
@@ -552,4 +782,799 @@ class TestActivityService:
             planned_activities = service.get_activities_by_status('Planned')
             
             assert planned_activities is not None
-            assert len(planned_activities) >= 1 
\ No newline at end of file
+            assert len(planned_activities) >= 1
+
+class TestCRMService:
+    """Test cases for CRMService."""
+    
+    def test_get_crm_stats_matches_individual_counts(self, app):
+        """Test aggregated stats agree with per-counter COUNT queries."""
+        with app.app_context():
+            service = CRMService()
+            
+            result = service.get_crm_stats()
+            
+            assert result['success']
+            assert result['data'] == {
+                'total_leads': Lead.query.count(),
+                'total_accounts': Account.query.count(),
+                'total_contacts': Contact.query.count(),
+                'total_opportunities': Opportunity.query.count(),
+                'total_activities': Activity.query.count(),
+                'total_quotes': Quote.query.count(),
+                'active_leads': Lead.query.filter(Lead.status.in_(['New', 'Qualified', 'Nurturing'])).count(),
+                'won_opportunities': Opportunity.query.filter(Opportunity.stage == 'Closed Won').count(),
+                'pending_activities': Activity.query.filter(Activity.status == 'Planned').count()
+            }
+    
+    def test_get_crm_stats_scans_each_table_once(self, app, sql_statements):
+        """Test stats issue one aggregate query per table."""
+        app.config['CRM_COUNTERS_ENABLED'] = False
+        with app.app_context():
+            service = CRMService()
+            with sql_statements() as statements:
+                service.get_crm_stats()
+            
+            assert len(statements) == 6
+    
+    def test_counters_follow_lead_and_opportunity_changes(self, app):
+        """Test materialized counters stay equal to live counts after writes."""
+        with app.app_context():
+            service = CRMService()
+            lead_service = LeadService()
+            
+            service.get_crm_stats()
+            created = lead_service.create_lead({
+                'first_name': 'Counter',
+                'last_name': 'Lead',
+                'email': 'counter.lead@example.com',
+                'status': 'New'
+            })
+            lead_service.update_lead(created['data'].id, {'status': 'Converted'})
+            opportunity = Opportunity.query.first()
+            opportunity.stage = 'Closed Won'
+            db.session.commit()
+            
+            stats = service.get_crm_stats()['data']
+            pipeline = {row['stage']: row['count'] for row in service.get_sales_pipeline()['data']}
+            
+            assert stats['total_leads'] == Lead.query.count()
+            assert stats['active_leads'] == Lead.query.filter(Lead.status.in_(['New', 'Qualified', 'Nurturing'])).count()
+            assert stats['won_opportunities'] == Opportunity.query.filter_by(stage='Closed Won').count()
+            assert pipeline['Closed Won'] == stats['won_opportunities']
+            
+            lead_service.delete_lead(created['data'].id)
+            assert service.get_crm_stats()['data']['total_leads'] == Lead.query.count()
+    
+    def test_rebuild_counters_command_repairs_drift(self, app, runner):
+        """Test flask rebuild-counters restores counters after out-of-band writes."""
+        with app.app_context():
+            CounterService().rebuild_counters()
+            CRMCounter.query.filter_by(name='leads', key='').update({'count': 12345})
+            db.session.commit()
+        
+        result = runner.invoke(args=['rebuild-counters'])
+        
+        assert 'Rebuilt' in result.output
+        with app.app_context():
+            assert CRMService().get_crm_stats()['data']['total_leads'] == Lead.query.count()
+    
+    def test_counters_are_aggregated_without_writes_until_rebuilt(self, app, sql_statements):
+        """Test reads before the first rebuild aggregate the source tables and leave crm_counters untouched."""
+        from app.analytics.counters import INITIALIZED_COUNTER
+        
+        with app.app_context():
+            CounterService().rebuild_counters()
+            built = CounterService().get_counters(['leads', 'leads.status'])
+            CRMCounter.query.filter_by(name=INITIALIZED_COUNTER[0], key=INITIALIZED_COUNTER[1]).delete()
+            CRMCounter.query.filter_by(name='leads', key='').update({'count': 12345})
+            db.session.commit()
+            rows = CRMCounter.query.count()
+            
+            with sql_statements() as statements:
+                CounterService().get_counters(['leads', 'leads.status'])
+            
+            assert CounterService().get_counters(['leads', 'leads.status']) == built
+            assert not any(statement.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')) for statement in statements)
+            assert CRMCounter.query.count() == rows
+            assert CRMCounter.query.filter_by(name='leads', key='').one().count == 12345
+            
+            CounterService().rebuild_counters()
+            assert CounterService().get_counters(['leads', 'leads.status']) == built
+    
+    def test_generate_crm_reports_aggregates_in_sql(self, app):
+        """Test SQL-aggregated reports match counts computed from the rows."""
+        with app.app_context():
+            from datetime import date
+            db.session.add(Opportunity(name='Won Deal', stage='Closed Won', amount=1000,
+                                       actual_close_date=date(2024, 3, 15)))
+            db.session.add(Opportunity(name='Won Deal 2', stage='Closed Won', amount=500,
+                                       actual_close_date=date(2024, 3, 2)))
+            db.session.commit()
+            RollupService().refresh_rollups()
+            
+            reports = CRMService().generate_crm_reports('all')['data']
+            
+            leads = Lead.query.all()
+            assert reports['leads']['total_leads'] == len(leads)
+            assert sum(reports['leads']['by_source'].values()) == len(leads)
+            
+            opportunities = Opportunity.query.all()
+            assert reports['opportunities']['total_opportunities'] == len(opportunities)
+            assert reports['opportunities']['total_pipeline_value'] == sum(float(o.amount or 0) for o in opportunities)
+            
+            won = [o for o in opportunities if o.stage == 'Closed Won']
+            assert reports['sales']['total_sales'] == len(won)
+            march = [o for o in won if o.amount and o.actual_close_date and o.actual_close_date.strftime('%Y-%m') == '2024-03']
+            assert reports['sales']['by_month']['2024-03'] == {
+                'count': len(march),
+                'revenue': sum(float(o.amount) for o in march)
+            }
+            
+            assert reports['activities']['by_type'].get('Call', 0) == Activity.query.filter_by(type='Call').count()
+    
+    def test_rollups_refresh_incrementally_from_queued_days(self, app):
+        """Test rollups queue changed days and match live counts after a refresh."""
+        with app.app_context():
+            from datetime import date
+            service = RollupService()
+            service.refresh_rollups()
+            
+            def won_in_may():
+                return [o for o in Opportunity.query.filter_by(stage='Closed Won').all()
+                        if o.amount and o.actual_close_date and o.actual_close_date.strftime('%Y-%m') == '2023-05']
+            
+            opportunity = Opportunity(name='Rollup Deal', stage='Prospecting', amount=700,
+                                      actual_close_date=date(2023, 5, 20))
+            db.session.add(opportunity)
+            db.session.commit()
+            opportunity.stage = 'Closed Won'
+            db.session.commit()
+            
+            assert CRMRollupQueue.query.filter_by(metric='opportunities.won', period='2023-05-20').count() == 1
+            result = service.refresh_rollups()
+            assert result['success'] and not result['data']['full']
+            assert CRMRollupQueue.query.count() == 0
+            
+            won = won_in_may()
+            months = service.get_rollup('opportunities.won')
+            assert months['2023-05'][''][0] == len(won)
+            days = service.get_rollup('opportunities.won', start=date(2023, 5, 20), end=date(2023, 5, 21), grain='day')
+            assert days['2023-05-20'][''][0] == len([o for o in won if o.actual_close_date == date(2023, 5, 20)])
+            
+            summary = CRMService().get_activity_summary(days=36500)['data']
+            assert summary['total_activities'] == Activity.query.count()
+            assert summary['pending_activities'] == Activity.query.filter_by(status='Planned').count()
+    
+    def test_days_changed_since_the_last_refresh_are_read_live(self, app):
+        """Test an update to a row dated before the refresh cutoff shows up before the next refresh."""
+        import uuid
+        from datetime import datetime
+        
+        with app.app_context():
+            service = RollupService()
+            subject = f'Rollup Call {uuid.uuid4().hex[:8]}'
+            activity = Activity(subject=subject, type='Call', status='Planned', created_at=datetime(2022, 7, 14, 9))
+            db.session.add(activity)
+            db.session.commit()
+            assert service.refresh_rollups()['success']
+            
+            def statuses():
+                return service.get_totals('activities.created', 'status', start=datetime(2022, 7, 1), end=datetime(2022, 8, 1))
+            
+            def live():
+                rows = Activity.query.filter(Activity.created_at >= datetime(2022, 7, 1), Activity.created_at < datetime(2022, 8, 1))
+                counts = {}
+                for row in rows:
+                    counts[row.status] = counts.get(row.status, 0) + 1
+                return counts
+            
+            assert {key: count for key, (count, amount) in statuses().items()} == live()
+            
+            activity.status = 'Completed'
+            db.session.commit()
+            assert CRMRollupQueue.query.filter_by(metric='activities.created', period='2022-07-14').count() == 1
+            
+            assert {key: count for key, (count, amount) in statuses().items()} == live()
+            months = service.get_rollup('activities.created', 'status', start=datetime(2022, 7, 1), end=datetime(2022, 8, 1))
+            assert months['2022-07'].get('Planned', (0,))[0] == live().get('Planned', 0)
+            
+            db.session.delete(activity)
+            db.session.commit()
+
+class TestVectorizedReportEngine:
+    """Test cases for VectorizedReportEngine."""
+    
+    def test_lead_report_matches_rows_across_chunks(self, app):
+        """Test chunked lead report agrees with counts computed from ORM rows."""
+        with app.app_context():
+            leads = Lead.query.all()
+            
+            report = VectorizedReportEngine(chunk_size=2).lead_report()
+            
+            assert report['total_leads'] == len(leads)
+            assert report['by_status'] == {
+                status: sum(1 for lead in leads if lead.status == status)
+                for status in {lead.status for lead in leads}
+            }
+            assert sum(report['by_score_range'].values()) == len(leads)
+            assert report['by_score_range']['76-100'] == sum(1 for lead in leads if (lead.score or 0) > 75)
+    
+    def test_service_reports_use_engine(self, app):
+        """Test service report methods return the engine's report."""
+        with app.app_context():
+            result = OpportunityService().generate_opportunity_reports()
+            
+            assert result['success']
+            assert result['data'] == VectorizedReportEngine().opportunity_report()
+            assert result['data']['total_opportunities'] == Opportunity.query.count()
+
+
+class TestImportJobService:
+    """Test cases for ImportJobService."""
+    
+    def test_abandoned_job_resumes_from_checkpoint(self, app, tmp_path):
+        """Test a running job without heartbeats is recovered and skips committed rows."""
+        import uuid
+        from datetime import datetime, timedelta
+        from app.models.crm_imports import ImportJob
+        from app.services.import_job_service import ImportJobService
+        app.config.update({'IMPORT_WORKERS': 0, 'IMPORT_CHUNK_SIZE': 1})
+        prefix = f'Resume {uuid.uuid4().hex[:8]}'
+        source = tmp_path / 'accounts.csv'
+        source.write_text(f'name,industry\n{prefix} A,Tech\n{prefix} B,Tech\n{prefix} C,Tech\n')
+        
+        with app.app_context():
+            abandoned = ImportJob(entity='accounts', status='Running', source_path=str(source),
+                                  total_bytes=source.stat().st_size, rows_processed=1, imported_count=1,
+                                  heartbeat_at=datetime.utcnow() - timedelta(hours=1))
+            active = ImportJob(entity='accounts', status='Running', source_path=str(source),
+                               heartbeat_at=datetime.utcnow())
+            db.session.add_all([abandoned, active])
+            db.session.commit()
+            service = ImportJobService()
+            
+            recovered = service.recover_jobs()
+            assert abandoned.id in recovered
+            assert active.id not in recovered
+            
+            result = service.run_job(abandoned.id)
+            
+            assert result['data']['status'] == 'Completed'
+            assert result['data']['imported_count'] == 3
+            assert Account.query.filter(Account.name.like(f'{prefix} %')).count() == 2
+            assert service.run_job(active.id)['success'] is False
+            
+            # Otherwise recovered by a later run once its heartbeat is old, with its file gone
+            db.session.delete(active)
+            db.session.commit()
+    
+    def test_overlapping_chunk_retry_is_appended_once(self, app, tmp_path):
+        """Test a retry sent while the original chunk is still being written is refused, not appended."""
+        import io
+        import threading
+        from app.services.upload_service import ChunkedUploadService
+        app.config['IMPORT_UPLOAD_FOLDER'] = str(tmp_path)
+        
+        class SlowStream(io.BytesIO):
+            """A request body that stalls after its first read until released"""
+            def __init__(self, data, started, release):
+                super().__init__(data)
+                self.started, self.release = started, release
+            
+            def read(self, size=-1):
+                chunk = super().read(4)
+                if chunk:
+                    self.started.set()
+                    self.release.wait(5)
+                return chunk
+        
+        with app.app_context():
+            service = ChunkedUploadService()
+            upload_id = service.create_upload()['data']['upload_id']
+            started, release = threading.Event(), threading.Event()
+            results = {}
+            
+            def send(name, stream):
+                with app.app_context():
+                    results[name] = service.append_chunk(upload_id, 0, stream)
+            
+            original = threading.Thread(target=send, args=('original', SlowStream(b'a,b\n1,2\n', started, release)))
+            original.start()
+            started.wait(5)
+            retry = threading.Thread(target=send, args=('retry', io.BytesIO(b'a,b\n1,2\n')))
+            retry.start()
+            # Let the retry reach its offset check while the original is mid-chunk
+            retry.join(0.2)
+            release.set()
+            original.join()
+            retry.join()
+            
+            assert results['original']['data']['offset'] == 8
+            assert results['retry']['success'] is False
+            assert results['retry']['data']['offset'] == 8
+            with service.open_upload(upload_id) as upload:
+                assert upload.read() == b'a,b\n1,2\n'
+    
+    def test_abandoned_uploads_are_swept(self, app, tmp_path):
+        """Test unfinished uploads older than IMPORT_UPLOAD_MAX_AGE are deleted and recent ones kept."""
+        import os
+        import time
+        from app.services.upload_service import ChunkedUploadService
+        app.config.update({'IMPORT_UPLOAD_FOLDER': str(tmp_path), 'IMPORT_UPLOAD_MAX_AGE': 3600})
+        
+        with app.app_context():
+            service = ChunkedUploadService()
+            abandoned = service.create_upload()['data']['upload_id']
+            recent = service.create_upload()['data']['upload_id']
+            (tmp_path / 'job-queued.csv').write_text('name\n')
+            stale = time.time() - 7200
+            os.utime(tmp_path / f'{abandoned}.part', (stale, stale))
+            os.utime(tmp_path / 'job-queued.csv', (stale, stale))
+            
+            assert service.sweep_abandoned_uploads() == 1
+            assert sorted(path.name for path in tmp_path.iterdir()) == sorted([f'{recent}.part', 'job-queued.csv'])
+    
+    def test_chunks_past_the_upload_size_limit_are_refused(self, app, tmp_path):
+        """Test a chunk taking an upload past IMPORT_UPLOAD_MAX_BYTES is refused and leaves the upload as it was."""
+        import io
+        from app.services.upload_service import ChunkedUploadService
+        app.config.update({'IMPORT_UPLOAD_FOLDER': str(tmp_path), 'IMPORT_UPLOAD_MAX_BYTES': 10})
+        
+        with app.app_context():
+            service = ChunkedUploadService()
+            upload_id = service.create_upload()['data']['upload_id']
+            assert service.append_chunk(upload_id, 0, io.BytesIO(b'a,b\n1,2\n'))['data']['offset'] == 8
+            
+            refused = service.append_chunk(upload_id, 8, io.BytesIO(b'3,4\n'))
+            assert refused['success'] is False
+            assert refused['error'] == 'Upload too large'
+            assert refused['data'] == {'offset': 8, 'max_bytes': 10}
+            
+            assert service.append_chunk(upload_id, 8, io.BytesIO(b'3\n'))['data']['offset'] == 10
+            with service.open_upload(upload_id) as upload:
+                assert upload.read() == b'a,b\n1,2\n3\n'
+
+
+class TestDatabaseOptimizer:
+    """Test cases for the query-log index advisor."""
+    
+    def test_advise_indexes_from_captured_full_scans(self, app):
+        """Test captured statements that scan a table yield a ranked, applicable index."""
+        from app.optimization.performance_optimizer import DatabaseOptimizer, QueryLog, fingerprint_statement
+        
+        with app.app_context():
+            query_log = QueryLog()
+            query_log.attach(db.engine)
+            try:
+                for industry in ('Technology', 'Finance', 'Retail'):
+                    Lead.query.filter(Lead.industry == industry).order_by(Lead.created_at.desc()).all()
+                Lead.query.filter(Lead.status == 'New').all()
+            finally:
+                query_log.detach(db.engine)
+            
+            assert len([entry for entry in query_log.top(50) if 'WHERE leads.industry' in entry['fingerprint']]) == 1
+            assert fingerprint_statement("SELECT 1 WHERE a IN (?, ?, ?) AND b = 'x'") == 'SELECT ? WHERE a IN (?) AND b = ?'
+            
+            optimizer = DatabaseOptimizer(db.engine.url.render_as_string())
+            recommendations = optimizer.advise_indexes(query_log)
+            
+            assert [item['columns'] for item in recommendations] == [['industry', 'created_at']]
+            assert recommendations[0]['calls'] == 3
+            assert recommendations[0]['statement'].startswith('CREATE INDEX IF NOT EXISTS ix_leads_industry_created_at')
+            
+            try:
+                optimizer.create_indexes(recommendations)
+                assert optimizer.advise_indexes(query_log) == []
+            finally:
+                # Otherwise the index stays in the persistent test database and is not advised again
+                db.session.execute(db.text(f"DROP INDEX IF EXISTS {recommendations[0]['index_name']}"))
+                db.session.commit()
+    
+    def test_query_profiler_attributes_statements_and_flags_n_plus_one(self, app):
+        """Test profiled statements are grouped by fingerprint per endpoint and repeats are flagged."""
+        from flask import request
+        from app.optimization.performance_optimizer import PerformanceMonitor, QueryProfiler
+        
+        with app.app_context():
+            monitor = PerformanceMonitor()
+            profiler = QueryProfiler(monitor, n_plus_one_threshold=3)
+            lead_ids = [lead.id for lead in Lead.query.all()]
+            profiler.attach(db.engine)
+            try:
+                with app.test_request_context('/crm/leads'):
+                    for lead_id in lead_ids * 4:
+                        db.session.execute(db.select(Lead.email).where(Lead.id == lead_id)).all()
+                    endpoint_name = request.endpoint
+                    profiler.finish_request(endpoint_name)
+            finally:
+                profiler.detach(db.engine)
+            
+            executions = len(lead_ids) * 4
+            frequent = monitor.get_most_frequent_queries(1)[0]
+            assert frequent['count'] == executions
+            assert 'leads.id = ?' in frequent['query']
+            
+            endpoint = monitor.get_endpoint_query_report()[0]
+            assert endpoint['requests'] == 1
+            assert endpoint['max_queries_per_request'] == executions
+            assert sum(endpoint['latency_histogram'].values()) == endpoint['queries']
+            
+            flags = monitor.get_n_plus_one_queries()
+            assert len(flags) == 1
+            assert flags[0]['endpoint'] == endpoint_name
+            assert flags[0]['max_executions'] == executions
+
+
+class TestIdentityCache:
+    """Test cases for the user cache and the request-scoped identity map."""
+    
+    def test_user_loader_reads_a_user_once_until_it_changes(self, app, sql_statements):
+        """Test the user loader reuses cached rows across sessions and drops them on a user update."""
+        import uuid
+        from app.services.identity_cache import load_user
+        
+        with app.app_context():
+            # A user of its own, as the shared testuser must keep its Admin role for other tests
+            username = f'cached-{uuid.uuid4().hex[:8]}'
+            user = User(username=username, email=f'{username}@example.com', role='Sales')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            
+            def load_in_new_sessions():
+                for _ in range(3):
+                    db.session.remove()
+                    user = load_user(str(user_id))
+                    assert user.username == username
+                    assert user in db.session
+            
+            with sql_statements() as statements:
+                load_in_new_sessions()
+            assert len(statements) == 1
+            assert load_user('missing') is None
+            
+            user = db.session.get(User, user_id)
+            user.role = 'Manager'
+            db.session.commit()
+            
+            with sql_statements() as statements:
+                load_in_new_sessions()
+            assert len(statements) == 1
+            assert load_user(str(user_id)).role == 'Manager'
+    
+    def test_request_identity_map_keeps_rows_loaded_across_commits(self, app, sql_statements):
+        """Test a request does not reload a lead it just committed when it looks it up again."""
+        with app.test_request_context('/crm/leads'):
+            app.preprocess_request()
+            service = LeadService()
+            lead = Lead.query.first()
+            assert service.update_lead(lead.id, {'notes': 'Identity map'})['success']
+            
+            with sql_statements() as statements:
+                service.get_lead(lead.id), lead.first_name, lead.notes
+            
+            assert statements == []
+
+
+class TestCacheManager:
+    """Test cases for the two-tier cache."""
+    
+    def test_local_tier_answers_hot_reads_without_redis(self, app):
+        """Test repeated reads are served in-process and Redis is only asked on a local miss."""
+        from app.optimization.caching import CacheManager, LocalRedis
+        
+        redis_client = LocalRedis()
+        cache = CacheManager(redis_client=redis_client, local_max_entries=2)
+        cache.set('dashboard', {'leads': 3}, tags=['leads'])
+        commands = redis_client.commands
+        
+        for _ in range(5):
+            assert cache.get('dashboard', tags=['leads']) == {'leads': 3}
+        assert redis_client.commands == commands
+        assert cache.stats['local_hits'] == 5
+        
+        # Least recently used entries leave the local tier but are still found in Redis
+        cache.set('forecast', [1], tags=['opportunities'])
+        cache.set('reports', [2])
+        assert cache.get('dashboard', tags=['leads']) == {'leads': 3}
+        assert cache.stats['redis_hits'] == 1
+    
+    def test_committed_writes_retire_entries_tagged_with_their_table(self, app):
+        """Test a committed lead update moves the leads tag to a new version, and a rollback does not."""
+        from app.optimization.caching import CacheManager, LocalRedis
+        
+        with app.app_context():
+            other_process = CacheManager(redis_client=LocalRedis(), local_ttl=0)
+            cache = CacheManager(redis_client=other_process.redis_client)
+            cache.attach(db.engine)
+            try:
+                cache.set('dashboard', {'leads': 'before'}, tags=['leads', 'opportunities'])
+                version = cache.tag_versions(['leads'])['leads']
+                
+                lead = Lead.query.first()
+                lead.notes = 'Rolled back'
+                db.session.flush()
+                db.session.rollback()
+                assert cache.tag_versions(['leads'])['leads'] == version
+                
+                assert LeadService().update_lead(lead.id, {'notes': f'Cache tags {lead.notes}'})['success']
+                
+                assert cache.tag_versions(['leads'])['leads'] == version + 1
+                assert cache.get('dashboard', tags=['leads', 'opportunities']) is None
+                assert other_process.get('dashboard', tags=['leads', 'opportunities']) is None
+                assert cache.tag_versions(['opportunities'])['opportunities'] == 0
+            finally:
+                cache.detach(db.engine)
+    
+    def test_clear_pattern_scans_both_tiers(self, app):
+        """Test clear_pattern removes matching entries from the local tier and Redis."""
+        from app.optimization.caching import CacheManager, LocalRedis
+        
+        cache = CacheManager(redis_client=LocalRedis())
+        cache.set('crm:dashboard', 1)
+        cache.set('crm:forecast', 2, tags=['opportunities'])
+        cache.set('other', 3)
+        
+        assert cache.clear_pattern('crm:*')
+        assert cache.get('crm:dashboard') is None
+        assert cache.get('crm:forecast', tags=['opportunities']) is None
+        assert cache.get('other') == 3
+    
+    def test_serializer_round_trips_service_values(self, app):
+        """Test Decimal, datetime, ORM rows and non-string keys survive serialization."""
+        from datetime import date, datetime
+        from decimal import Decimal
+        from app.optimization.caching import serialize, deserialize
+        
+        with app.app_context():
+            lead = Lead.query.first()
+            value = {
+                'amount': Decimal('1234.50'),
+                'created': datetime(2024, 1, 2, 3, 4, 5),
+                'day': date(2024, 1, 2),
+                'by_status': {None: 1, 'New': 2},
+                'lead': lead
+            }
+            
+            restored = deserialize(serialize(value))
+            
+            assert restored['amount'] == Decimal('1234.50')
+            assert restored['created'] == datetime(2024, 1, 2, 3, 4, 5)
+            assert restored['day'] == date(2024, 1, 2)
+            assert restored['by_status'] == {None: 1, 'New': 2}
+            assert restored['lead']['id'] == lead.id
+            assert restored['lead']['email'] == lead.email
+    
+    def test_cache_keys_are_stable_digests_of_bound_arguments(self, app):
+        """Test keys leave out self, normalize keyword use and do not depend on the process hash seed."""
+        import hashlib
+        from app.optimization.caching import cache_key
+        
+        forecast = CRMService.get_sales_forecast.__wrapped__
+        key = cache_key('crm', forecast, (CRMService(), 3))
+        
+        assert key == cache_key('crm', forecast, (CRMService(),), {'months': 3})
+        assert key != cache_key('crm', forecast, (CRMService(), 6))
+        assert key == (
+            'crm:app.services.crm_service.CRMService.get_sales_forecast:'
+            + hashlib.blake2b(b'{"months":3}', digest_size=16).hexdigest()
+        )
+    
+    def test_analytics_results_are_cached_until_their_tables_change(self, app, sql_statements):
+        """Test a repeated forecast runs no SQL, and committing an opportunity recomputes it."""
+        from datetime import date
+        
+        with app.app_context():
+            service = CRMService()
+            first = service.get_sales_forecast(months=1200)
+            
+            with sql_statements() as statements:
+                service.get_sales_forecast(1200)
+            assert statements == []
+            assert service.get_sales_forecast(1200) == first
+            
+            opportunity = Opportunity(name='Cached Forecast', stage='Proposal', amount=1000,
+                                      probability=50, expected_close_date=date.today())
+            db.session.add(opportunity)
+            db.session.commit()
+            try:
+                result = service.get_sales_forecast(1200)['data']
+                assert result['opportunity_count'] == first['data']['opportunity_count'] + 1
+                assert result['forecast_amount'] == pytest.approx(first['data']['forecast_amount'] + 500)
+            finally:
+                db.session.delete(opportunity)
+                db.session.commit()
+    
+    def test_concurrent_misses_compute_once(self, app):
+        """Test callers missing the same key together wait for one computation."""
+        import threading
+        import time
+        from app.optimization.caching import CacheManager, LocalRedis
+        
+        cache = CacheManager(redis_client=LocalRedis())
+        calls, results = [], []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'forecast': 42}
+        
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute('forecast', compute, 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert results == [{'forecast': 42}] * 8
+        # Each caller that found the lock taken waited once, however many times it polled
+        assert cache.stats['lock_waits'] == 7
+    
+    def test_unlock_leaves_a_lock_retaken_by_another_holder(self, app):
+        """Test releasing an expired lock does not delete the lock another worker has taken since."""
+        from app.optimization.caching import CacheManager, LocalRedis, LOCK_KEY_PREFIX
+        
+        redis = LocalRedis()
+        cache = CacheManager(redis_client=redis)
+        lock_key = LOCK_KEY_PREFIX + 'forecast'
+        
+        token = cache._try_lock(lock_key)
+        redis.set(lock_key, 'other-worker')
+        cache._unlock(lock_key, token)
+        assert redis.get(lock_key) == b'other-worker'
+        
+        token = cache._try_lock(lock_key)
+        assert token is None
+        redis.delete(lock_key)
+        token = cache._try_lock(lock_key)
+        cache._unlock(lock_key, token)
+        assert redis.get(lock_key) is None
+    
+    def test_expired_and_expiring_entries_refresh_in_the_background(self, app, monkeypatch):
+        """Test stale and early-expiring entries are served while one background refresh replaces them."""
+        import time
+        from app.optimization import caching
+        
+        cache = caching.CacheManager(redis_client=caching.LocalRedis())
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'new'
+        
+        def refresh_once():
+            first = cache.get_or_compute('report', compute, 60, stale_ttl=60)
+            second = cache.get_or_compute('report', compute, 60, stale_ttl=60)
+            for thread in list(cache.refreshing.values()):
+                thread.join()
+            return first, second
+        
+        # Past expiry, within the stale window
+        cache.set('report', ['old', time.time() - 1, 0.0], 60)
+        assert refresh_once() == ('old', 'old')
+        assert cache.get_or_compute('report', compute, 60, stale_ttl=60) == 'new'
+        assert len(calls) == 1
+        
+        # Not yet expired, but close enough to expiry for its compute time to trigger an early refresh
+        cache.set('report', ['early', time.time() + 5, 1.0], 60)
+        monkeypatch.setattr(caching.random, 'random', lambda: 0.999999)
+        assert refresh_once() == ('early', 'early')
+        assert cache.get('report')[0] == 'new'
+        assert len(calls) == 2
+        assert cache.stats['stale_refreshes'] == 1
+        assert cache.stats['early_refreshes'] == 1
+
+
+@pytest.mark.usefixtures('shared_redis')
+class TestEntityCache:
+    """Test cases for the entity cache."""
+    
+    def test_repeat_lead_reads_skip_the_database_until_the_lead_changes(self, app, sql_statements):
+        """Test get_lead serves cached rows in new sessions and sees committed updates at once."""
+        with app.app_context():
+            service = LeadService()
+            lead_id = Lead.query.first().id
+            
+            def read_in_new_sessions():
+                for _ in range(3):
+                    db.session.remove()
+                    lead = service.get_lead(lead_id)['data']
+                    assert lead in db.session and lead not in db.session.dirty
+            
+            with sql_statements() as statements:
+                read_in_new_sessions()
+            assert len(statements) == 1
+            
+            db.session.remove()
+            notes = f'Entity cache {Lead.query.get(lead_id).notes}'
+            assert service.update_lead(lead_id, {'notes': notes})['success']
+            
+            # The committed change retired the cached row, so the next session reads it again
+            db.session.remove()
+            with sql_statements() as statements:
+                service.get_lead(lead_id)['data'].notes
+            assert len(statements) == 1
+            db.session.remove()
+            assert service.get_lead(lead_id)['data'].notes == notes
+    
+    def test_commit_from_a_stale_session_does_not_cache_its_stale_row(self, app):
+        """Test a session that loaded a lead before another session's commit cannot cache its old copy."""
+        from sqlalchemy.orm import Session
+        from app.services.entity_cache import get_entity
+        
+        with app.app_context():
+            lead = LeadService().create_lead({
+                'first_name': 'Stale', 'last_name': 'Session', 'email': 'stale.old@example.com', 'status': 'New'
+            })['data']
+            lead_id = lead.id
+            db.session.remove()
+            
+            stale = get_entity(Lead, lead_id)
+            with Session(db.engine) as other:
+                other.get(Lead, lead_id).email = 'stale.new@example.com'
+                other.commit()
+            stale.status = 'Qualified'
+            db.session.commit()
+            
+            # The database holds both changes; a reader loading the lead right after cannot cache it either
+            for _ in range(2):
+                db.session.remove()
+                lead = get_entity(Lead, lead_id)
+                assert (lead.email, lead.status) == ('stale.new@example.com', 'Qualified')
+            
+            db.session.delete(lead)
+            db.session.commit()
+    
+    def test_bulk_updates_and_deletes_retire_cached_rows(self, app):
+        """Test writes that bypass the ORM and ORM deletes drop the cached rows they touch."""
+        from app.services.bulk_service import BulkLeadService
+        
+        with app.app_context():
+            service = LeadService()
+            lead = service.create_lead({
+                'first_name': 'Entity', 'last_name': 'Cache', 'email': 'entity.cache@example.com', 'status': 'New'
+            })['data']
+            lead_id = lead.id
+            
+            db.session.remove()
+            assert service.get_lead(lead_id)['data'].status == 'New'
+            
+            assert BulkLeadService().run('qualify', [lead_id], user_id=1)['success']
+            db.session.remove()
+            assert service.get_lead(lead_id)['data'].status == 'Qualified'
+            
+            assert service.delete_lead(lead_id)['success']
+            db.session.remove()
+            assert not service.get_lead(lead_id)['success']
+    
+    def test_commits_in_another_instance_retire_rows_at_once(self, app, shared_redis, sql_statements):
+        """Test a lead updated by another instance sharing Redis is not served stale, and that nothing is cached without Redis."""
+        from app import create_app
+        
+        other = create_app()
+        other.cache_manager.redis_client = shared_redis
+        
+        with app.app_context():
+            service = LeadService()
+            lead_id = Lead.query.first().id
+            db.session.remove()
+            notes = f'Other instance {service.get_lead(lead_id)["data"].notes}'
+            
+            with other.app_context():
+                assert LeadService().update_lead(lead_id, {'notes': notes})['success']
+            
+            db.session.remove()
+            assert service.get_lead(lead_id)['data'].notes == notes
+            
+            # Each instance would only see its own commits without a shared Redis
+            app.cache_manager.redis_client = None
+            with sql_statements() as statements:
+                for _ in range(2):
+                    db.session.remove()
+                    service.get_lead(lead_id)
+            assert len(statements) == 2